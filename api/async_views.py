@@ -0,0 +1,131 @@
+"""
+Native async views for the list and retrieve endpoints, enabled with
+``ASYNC_READS`` when the project runs under ASGI.
+
+DRF views are sync, so under ASGI every request holds a thread while it
+waits on Redis and the database. These views serve JSON reads on the event
+loop instead: cache entries are read with ``redis.asyncio`` and misses are
+computed with the async ORM. Anything else (writes, other renderers such as
+the browsable API, errors) is handed to the regular DRF view, so responses
+are the same whichever path serves them.
+"""
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import Http404
+from django.utils.cache import patch_vary_headers
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import AllowAny
+
+from .cache import bypassing
+from .replicas import is_pinned, replica_reads
+from .warming import record_hit
+
+# Router actions of each kind of route
+ACTIONS = {
+    False: {"get": "list", "post": "create"},
+    True: {
+        "get": "retrieve",
+        "put": "update",
+        "patch": "partial_update",
+        "delete": "destroy",
+    },
+}
+
+
+class AsyncReadView(View):
+    """
+    Serve ``GET`` on the list or detail route of ``viewset_class`` with the
+    viewset's ``alist`` or ``aretrieve``, and delegate everything else to the
+    viewset's DRF view.
+
+    Authentication and permissions are not run on the async path, so it is
+    only used for viewsets that allow any request.
+    """
+
+    viewset_class = None
+    basename = None
+    detail = False
+    drf_view = None
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        viewset_class = initkwargs.get("viewset_class", cls.viewset_class)
+        detail = initkwargs.get("detail", cls.detail)
+        drf_view = viewset_class.as_view(
+            ACTIONS[detail],
+            basename=initkwargs.get("basename", cls.basename),
+            detail=detail,
+            suffix="Instance" if detail else "List",
+        )
+
+        def render_drf_view(request, *args, **kwargs):
+            # Render in the worker thread too, off the event loop.
+            return drf_view(request, *args, **kwargs).render()
+
+        initkwargs["drf_view"] = sync_to_async(render_drf_view)
+        # Like DRF views; delegated writes are checked by DRF itself.
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        if request.method != "GET":
+            return await self.drf_view(request, *args, **kwargs)
+        return await self.get(request, *args, **kwargs)
+
+    async def get(self, request, *args, **kwargs):
+        viewset = self.get_viewset(request, *args, **kwargs)
+        try:
+            if not self.can_serve(viewset):
+                return await self.drf_view(request, *args, **kwargs)
+            pinned = is_pinned(request)
+            bypass = pinned and bool(settings.DATABASE_REPLICAS)
+            with replica_reads(not pinned), bypassing(bypass):
+                if self.detail:
+                    response = await viewset.aretrieve(request, kwargs["pk"])
+                else:
+                    response = await viewset.alist(request)
+        except (APIException, Http404):
+            # Let DRF render the error the usual way.
+            return await self.drf_view(request, *args, **kwargs)
+
+        # The headers DRF adds to every response of the view
+        headers = dict(viewset.default_response_headers)
+        vary = headers.pop("Vary", None)
+        for name, value in headers.items():
+            response[name] = value
+        if vary:
+            patch_vary_headers(response, [vary])
+        record_hit(request)
+        return response
+
+    def get_viewset(self, request, *args, **kwargs):
+        """
+        Return a viewset set up for the request the way its DRF view would
+        be, short of running ``initial()``.
+        """
+        viewset = self.viewset_class(
+            basename=self.basename,
+            detail=self.detail,
+            action_map=ACTIONS[self.detail],
+            action=ACTIONS[self.detail]["get"],
+        )
+        viewset.args = args
+        viewset.kwargs = kwargs
+        viewset.format_kwarg = None
+        viewset.request = viewset.initialize_request(request, *args, **kwargs)
+        return viewset
+
+    def can_serve(self, viewset):
+        """
+        Return whether the request can be answered on the async path: a
+        public viewset and a plain JSON response.
+        """
+        if any(
+            not isinstance(permission, AllowAny)
+            for permission in viewset.get_permissions()
+        ):
+            return False
+        renderer, media_type = viewset.perform_content_negotiation(viewset.request)
+        return renderer.format == "json" and ";" not in media_type
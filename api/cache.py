@@ -0,0 +1,677 @@
+"""
+Cache key versioning and invalidation.
+
+Collection entries (list pages, an author's books) are keyed under the
+current generation of every resource they depend on. A write bumps those
+generations with one atomic ``INCR`` each; entries built under an older
+generation are never read again and simply age out.
+
+Single-row entries are recorded in one Redis set per tag they depend on.
+Invalidating a tag deletes exactly the entries that were recorded under it,
+so a write only evicts the detail responses that embed the changed row.
+
+Expensive entries are read through ``get_or_compute``, which lets only one
+worker at a time recompute a missing entry while the others keep serving the
+previous value.
+
+When ``CACHE_L1_ENABLED`` is set, reads go through a small per-process LRU
+before Redis. Invalidated keys are published on ``CACHE_INVALIDATION_CHANNEL``
+so every process evicts them from its own LRU; the short ``CACHE_L1_TIMEOUT``
+bounds staleness if a message is ever lost.
+
+Inside ``refreshing()``, used by the cache warmer, entries that are missing
+or expire within the given number of seconds are read as misses, so the
+views recompute and store them again before user requests find them cold.
+Inside ``bypassing()``, used for clients whose reads must see their own
+writes, every entry is read as a miss and recomputed without waiting on the
+lock or falling back to a stale value.
+
+The ``a``-prefixed functions are the async counterparts of the read path,
+used by the async views. They talk to Redis through ``redis.asyncio`` and
+read and write the same keys and value encoding as django-redis, so sync
+and async workers share one cache.
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis import asyncio as aioredis
+from redis.exceptions import LockError
+
+from .metrics import current_metrics
+
+AUTHORS = "authors"
+BOOKS = "books"
+
+HIT = "HIT"
+MISS = "MISS"
+STALE = "STALE"
+
+# Returned by ``cache.get(key, MISSING)`` on a miss, so that cached empty or
+# falsy values are told apart from absent ones.
+MISSING = object()
+
+# Cached in place of a response for primary keys that do not exist.
+NOT_FOUND = "__not_found__"
+
+# Seconds ahead of expiry within which entries are refreshed, or None
+_refresh_ahead = ContextVar("refresh_ahead", default=None)
+# Whether entries are read as misses and recomputed
+_bypass = ContextVar("bypass", default=False)
+
+
+def author_books(pk):
+    return f"author_books:{pk}"
+
+
+def author_tag(pk):
+    return f"author:{pk}"
+
+
+def book_tag(pk):
+    return f"book:{pk}"
+
+
+class LocalCache:
+    """
+    Thread-safe, size-bounded LRU with a per-entry expiry.
+    """
+
+    def __init__(self, max_entries, timeout):
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=MISSING):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout=None):
+        timeout = self.timeout if timeout is None else min(timeout, self.timeout)
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + timeout)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete_many(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+_local_cache = None
+_subscriber_pid = None
+_subscriber_lock = threading.Lock()
+
+
+def _on_invalidation(message):
+    local = _local_cache
+    if local is not None:
+        local.delete_many(json.loads(message["data"]))
+
+
+def _on_subscriber_error(error, pubsub, thread):
+    # Messages may have been missed while disconnected, so drop everything.
+    local = _local_cache
+    if local is not None:
+        local.clear()
+    time.sleep(1)
+
+
+def _start_subscriber():
+    global _subscriber_pid
+    with _subscriber_lock:
+        if _subscriber_pid == os.getpid():
+            return
+        pubsub = get_redis_connection("default").pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{settings.CACHE_INVALIDATION_CHANNEL: _on_invalidation})
+        pubsub.run_in_thread(
+            sleep_time=1, daemon=True, exception_handler=_on_subscriber_error
+        )
+        _subscriber_pid = os.getpid()
+
+
+def get_local_cache():
+    """
+    Return this process's L1 cache, or None if it is disabled.
+    """
+    global _local_cache
+    if not settings.CACHE_L1_ENABLED:
+        return None
+    if _local_cache is None:
+        _local_cache = LocalCache(
+            settings.CACHE_L1_MAX_ENTRIES, settings.CACHE_L1_TIMEOUT
+        )
+    if _subscriber_pid != os.getpid():
+        _start_subscriber()
+    return _local_cache
+
+
+@contextmanager
+def refreshing(ahead=0):
+    """
+    Treat the entries read inside the block that are missing or expire
+    within ``ahead`` seconds as misses, bypassing the L1 cache.
+    """
+    token = _refresh_ahead.set(ahead)
+    try:
+        yield
+    finally:
+        _refresh_ahead.reset(token)
+
+
+def is_refreshing():
+    return _refresh_ahead.get() is not None
+
+
+@contextmanager
+def bypassing(enabled=True):
+    """
+    Treat every entry read inside the block as a miss if ``enabled`` is
+    true. Recomputed entries are still stored.
+    """
+    token = _bypass.set(enabled)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def get_cached(key, default=MISSING):
+    """
+    Return the cached value for the key from L1 or Redis.
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        return _get_cached(key, default)
+    started = time.perf_counter()
+    value = _get_cached(key, MISSING)
+    result = MISS if value is MISSING else HIT
+    metrics.add_cache(key, result, time.perf_counter() - started)
+    return default if value is MISSING else value
+
+
+def _get_cached(key, default):
+    if _bypass.get():
+        return default
+    ahead = _refresh_ahead.get()
+    if ahead is not None:
+        # The TTL of a missing key is 0, and None if it never expires.
+        ttl = cache.ttl(key)
+        if ttl is not None and ttl <= ahead:
+            return default
+        return cache.get(key, default)
+    local = get_local_cache()
+    if local is not None:
+        value = local.get(key)
+        if value is not MISSING:
+            return value
+    value = cache.get(key, MISSING)
+    if value is MISSING:
+        return default
+    if local is not None:
+        local.set(key, value)
+    return value
+
+
+def _generation_key(namespace):
+    return cache.make_key(f"generation:{namespace}")
+
+
+def _tag_key(tag):
+    return cache.make_key(f"tag:{tag}")
+
+
+def _initial_generation():
+    # Seeding from the clock keeps a generation that was evicted from Redis
+    # from restarting below a value that older entries were keyed under.
+    return time.time_ns() // 1000
+
+
+def get_generations(*namespaces):
+    """
+    Return the current generation of each namespace, creating missing ones.
+    """
+    keys = [_generation_key(namespace) for namespace in namespaces]
+    connection = get_redis_connection("default")
+    generations = connection.mget(keys)
+    if None in generations:
+        pipeline = connection.pipeline()
+        for key in keys:
+            pipeline.set(key, _initial_generation(), nx=True)
+        pipeline.mget(keys)
+        generations = pipeline.execute()[-1]
+    return [int(generation) for generation in generations]
+
+
+def bump_generations(*namespaces):
+    """
+    Atomically increment the generation of each namespace.
+    """
+    pipeline = get_redis_connection("default").pipeline()
+    for namespace in set(namespaces):
+        key = _generation_key(namespace)
+        pipeline.set(key, _initial_generation(), nx=True)
+        pipeline.incr(key)
+    pipeline.execute()
+
+
+def versioned_key(prefix, namespaces, suffix=""):
+    """
+    Build a cache key that embeds the current generation of each namespace.
+    """
+    generations = ".".join(str(value) for value in get_generations(*namespaces))
+    key = f"{prefix}_v{generations}"
+    return f"{key}_{suffix}" if suffix else key
+
+
+def set_tagged(key, value, tags, timeout=None):
+    """
+    Cache a value and record the key under each of the given tags.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_TIMEOUT
+    cache.set(key, value, timeout)
+    local = get_local_cache()
+    if local is not None:
+        local.set(key, value, timeout)
+
+    pipeline = get_redis_connection("default").pipeline()
+    for tag in set(tags):
+        pipeline.sadd(_tag_key(tag), key)
+        pipeline.expire(_tag_key(tag), timeout)
+    pipeline.execute()
+
+
+def invalidate_tags(*tags):
+    """
+    Delete every cache entry recorded under any of the given tags.
+    """
+    if not tags:
+        return
+    tag_keys = [_tag_key(tag) for tag in set(tags)]
+
+    pipeline = get_redis_connection("default").pipeline()
+    for tag_key in tag_keys:
+        pipeline.smembers(tag_key)
+    pipeline.delete(*tag_keys)
+    *members, _ = pipeline.execute()
+
+    keys = sorted({key.decode() for tag_members in members for key in tag_members})
+    if keys:
+        cache.delete_many(keys)
+        evict_local(keys)
+
+
+def evict_local(keys):
+    """
+    Evict keys from the L1 cache of every process.
+    """
+    if not settings.CACHE_L1_ENABLED:
+        return
+    if _local_cache is not None:
+        _local_cache.delete_many(keys)
+    get_redis_connection("default").publish(
+        settings.CACHE_INVALIDATION_CHANNEL, json.dumps(keys)
+    )
+
+
+def _is_fresh(entry, now):
+    """
+    Return whether an entry is still fresh, refreshing it early at random as
+    it gets close to expiry when ``CACHE_EARLY_REFRESH_BETA`` is enabled.
+    """
+    beta = settings.CACHE_EARLY_REFRESH_BETA
+    if beta <= 0:
+        return now < entry["expires"]
+    jitter = entry["delta"] * beta * math.log(1 - random.random())
+    return now - jitter < entry["expires"]
+
+
+def _wait_for(key, lock):
+    """
+    Wait for the worker holding the lock to fill the key.
+    """
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry
+        if not lock.locked():
+            return None
+    return None
+
+
+def get_or_compute(key, compute, timeout=None, stale_key=None):
+    """
+    Return ``(value, status)`` for the key, calling ``compute`` on a miss.
+
+    Only the worker holding a short Redis lock on the key recomputes it.
+    While it does, the other workers serve the expired entry, or the latest
+    value stored under ``stale_key``, as long as it is within
+    ``CACHE_STALE_GRACE`` seconds of its expiry. ``compute`` may return
+    ``None`` to skip caching.
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        return _get_or_compute(key, compute, timeout, stale_key)
+    started = time.perf_counter()
+    computing = 0.0
+
+    def timed_compute():
+        nonlocal computing
+        begun = time.perf_counter()
+        try:
+            return compute()
+        finally:
+            computing += time.perf_counter() - begun
+
+    value, status = _get_or_compute(key, timed_compute, timeout, stale_key)
+    # The cache latency, without the time spent computing the value
+    metrics.add_cache(key, status, time.perf_counter() - started - computing)
+    return value, status
+
+
+def _get_or_compute(key, compute, timeout, stale_key):
+    if timeout is None:
+        timeout = settings.CACHE_TIMEOUT
+    if _bypass.get():
+        return _compute(key, compute, timeout, stale_key, get_local_cache()), MISS
+    now = time.time()
+    ahead = _refresh_ahead.get()
+    local = get_local_cache() if ahead is None else None
+    if local is not None:
+        entry = local.get(key, None)
+        if entry is not None and _is_fresh(entry, now):
+            return entry["value"], HIT
+
+    entries = cache.get_many([key, stale_key] if stale_key else [key])
+    entry = entries.get(key)
+    if entry is not None and _is_fresh(entry, now + (ahead or 0)):
+        if local is not None:
+            local.set(key, entry)
+        return entry["value"], HIT
+
+    lock = cache.lock(f"lock:{key}", timeout=settings.CACHE_LOCK_TIMEOUT)
+    if not lock.acquire(blocking=False):
+        if entry is not None and now < entry["expires"]:
+            return entry["value"], HIT
+        previous = entry or entries.get(stale_key)
+        if previous is not None:
+            if now < previous["expires"] + settings.CACHE_STALE_GRACE:
+                return previous["value"], STALE
+        entry = _wait_for(key, lock)
+        if entry is not None:
+            return entry["value"], HIT
+        return compute(), MISS
+
+    try:
+        return _compute(key, compute, timeout, stale_key, local), MISS
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            pass
+
+
+def _compute(key, compute, timeout, stale_key, local):
+    """
+    Compute the value of the key and store its entry, unless it is None.
+    """
+    started = time.monotonic()
+    value = compute()
+    if value is not None:
+        entry = {
+            "value": value,
+            "expires": time.time() + timeout,
+            "delta": time.monotonic() - started,
+        }
+        entries = {key: entry, stale_key: entry} if stale_key else {key: entry}
+        cache.set_many(entries, timeout + settings.CACHE_STALE_GRACE)
+        if local is not None:
+            local.set(key, entry)
+    return value
+
+
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """
+    Return the ``redis.asyncio`` client of the running event loop.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        config = settings.CACHES["default"]
+        options = config.get("OPTIONS", {})
+        client = aioredis.Redis.from_url(
+            config["LOCATION"],
+            socket_connect_timeout=options.get("SOCKET_CONNECT_TIMEOUT"),
+            socket_timeout=options.get("SOCKET_TIMEOUT"),
+            **options.get("CONNECTION_POOL_KWARGS", {}),
+        )
+        _async_clients[loop] = client
+    return client
+
+
+def _decode(value):
+    return cache.client.decode(value)
+
+
+def _encode(value):
+    return cache.client.encode(value)
+
+
+async def aget_cached(key, default=MISSING):
+    """
+    Async version of ``get_cached``.
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        return await _aget_cached(key, default)
+    started = time.perf_counter()
+    value = await _aget_cached(key, MISSING)
+    result = MISS if value is MISSING else HIT
+    metrics.add_cache(key, result, time.perf_counter() - started)
+    return default if value is MISSING else value
+
+
+async def _aget_cached(key, default):
+    if _bypass.get():
+        return default
+    local = get_local_cache()
+    if local is not None:
+        value = local.get(key)
+        if value is not MISSING:
+            return value
+    value = await get_async_redis().get(cache.make_key(key))
+    if value is None:
+        return default
+    value = _decode(value)
+    if local is not None:
+        local.set(key, value)
+    return value
+
+
+async def aget_generations(*namespaces):
+    """
+    Async version of ``get_generations``.
+    """
+    keys = [_generation_key(namespace) for namespace in namespaces]
+    connection = get_async_redis()
+    generations = await connection.mget(keys)
+    if None in generations:
+        pipeline = connection.pipeline()
+        for key in keys:
+            pipeline.set(key, _initial_generation(), nx=True)
+        pipeline.mget(keys)
+        generations = (await pipeline.execute())[-1]
+    return [int(generation) for generation in generations]
+
+
+async def aversioned_key(prefix, namespaces, suffix=""):
+    """
+    Async version of ``versioned_key``.
+    """
+    generations = ".".join(str(value) for value in await aget_generations(*namespaces))
+    key = f"{prefix}_v{generations}"
+    return f"{key}_{suffix}" if suffix else key
+
+
+async def aset_tagged(key, value, tags, timeout=None):
+    """
+    Async version of ``set_tagged``.
+    """
+    if timeout is None:
+        timeout = settings.CACHE_TIMEOUT
+    local = get_local_cache()
+    if local is not None:
+        local.set(key, value, timeout)
+
+    pipeline = get_async_redis().pipeline()
+    pipeline.set(cache.make_key(key), _encode(value), ex=timeout)
+    for tag in set(tags):
+        pipeline.sadd(_tag_key(tag), key)
+        pipeline.expire(_tag_key(tag), timeout)
+    await pipeline.execute()
+
+
+async def _await_for(key, lock):
+    """
+    Async version of ``_wait_for``.
+    """
+    connection = get_async_redis()
+    deadline = time.monotonic() + settings.CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+        entry = await connection.get(cache.make_key(key))
+        if entry is not None:
+            return _decode(entry)
+        if not await lock.locked():
+            return None
+    return None
+
+
+async def aget_or_compute(key, compute, timeout=None, stale_key=None):
+    """
+    Async version of ``get_or_compute``, where ``compute`` is a coroutine
+    function. It takes the same lock as the sync version.
+    """
+    metrics = current_metrics()
+    if metrics is None:
+        return await _aget_or_compute(key, compute, timeout, stale_key)
+    started = time.perf_counter()
+    computing = 0.0
+
+    async def timed_compute():
+        nonlocal computing
+        begun = time.perf_counter()
+        try:
+            return await compute()
+        finally:
+            computing += time.perf_counter() - begun
+
+    value, status = await _aget_or_compute(key, timed_compute, timeout, stale_key)
+    metrics.add_cache(key, status, time.perf_counter() - started - computing)
+    return value, status
+
+
+async def _aget_or_compute(key, compute, timeout, stale_key):
+    if timeout is None:
+        timeout = settings.CACHE_TIMEOUT
+    local = get_local_cache()
+    if _bypass.get():
+        return await _acompute(key, compute, timeout, stale_key, local), MISS
+    now = time.time()
+    if local is not None:
+        entry = local.get(key, None)
+        if entry is not None and _is_fresh(entry, now):
+            return entry["value"], HIT
+
+    connection = get_async_redis()
+    keys = [key, stale_key] if stale_key else [key]
+    values = await connection.mget([cache.make_key(name) for name in keys])
+    entries = {
+        name: _decode(value) for name, value in zip(keys, values) if value is not None
+    }
+    entry = entries.get(key)
+    if entry is not None and _is_fresh(entry, now):
+        if local is not None:
+            local.set(key, entry)
+        return entry["value"], HIT
+
+    lock = connection.lock(
+        cache.make_key(f"lock:{key}"), timeout=settings.CACHE_LOCK_TIMEOUT
+    )
+    if not await lock.acquire(blocking=False):
+        if entry is not None and now < entry["expires"]:
+            return entry["value"], HIT
+        previous = entry or entries.get(stale_key)
+        if previous is not None:
+            if now < previous["expires"] + settings.CACHE_STALE_GRACE:
+                return previous["value"], STALE
+        entry = await _await_for(key, lock)
+        if entry is not None:
+            return entry["value"], HIT
+        return await compute(), MISS
+
+    try:
+        return await _acompute(key, compute, timeout, stale_key, local), MISS
+    finally:
+        try:
+            await lock.release()
+        except LockError:
+            pass
+
+
+async def _acompute(key, compute, timeout, stale_key, local):
+    """
+    Async version of ``_compute``.
+    """
+    started = time.monotonic()
+    value = await compute()
+    if value is not None:
+        entry = {
+            "value": value,
+            "expires": time.time() + timeout,
+            "delta": time.monotonic() - started,
+        }
+        pipeline = get_async_redis().pipeline()
+        for name in [key, stale_key] if stale_key else [key]:
+            pipeline.set(
+                cache.make_key(name),
+                _encode(entry),
+                ex=timeout + settings.CACHE_STALE_GRACE,
+            )
+        await pipeline.execute()
+        if local is not None:
+            local.set(key, entry)
+    return value
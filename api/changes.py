@@ -0,0 +1,76 @@
+"""
+Change log of authors and books, served at ``/api/changes/``.
+
+Every create, update and delete of an author or book adds a ``Change`` row:
+the signal handlers in ``signals.py`` write it for saves and deletes, and
+the bulk endpoints for their ``bulk_create`` and ``bulk_update`` batches.
+The viewsets run each write in a transaction, so a change is logged if and
+only if it commits.
+
+Clients that mirror the catalog read the log from the id of the last change
+they have seen, so a sync costs one row per change rather than a read of
+the whole catalog. Ids are allocated when a change is written but become
+visible when it commits, so with concurrent writers an id can appear after
+a larger one. The endpoint therefore only serves changes written more than
+``CHANGE_LOG_SETTLE_SECONDS`` ago. A client following the log never skips a
+change as long as every write transaction commits within that window; a
+transaction that takes longer can commit changes behind a cursor that has
+already moved past them. API writes are short, so the window only has to
+cover slow commits, long imports and writes made from the shell.
+"""
+
+import threading
+from contextlib import contextmanager
+from .models import Change
+
+_batch = threading.local()
+
+
+@contextmanager
+def batch_changes():
+    """
+    Collect the changes logged inside the block, such as one per cascaded
+    delete, and insert them with one query on exit. Nothing is logged if
+    the block raises.
+    """
+    if getattr(_batch, "pending", None) is not None:
+        yield
+        return
+    _batch.pending = pending = []
+    try:
+        yield
+    finally:
+        _batch.pending = None
+    if pending:
+        Change.objects.bulk_create(pending)
+
+
+def get_change(instance, action):
+    """
+    Return the unsaved change log entry of an action on an author or book.
+    """
+    data = None
+    if action != Change.DELETE:
+        data = {
+            field.attname: field.value_from_object(instance)
+            for field in instance._meta.concrete_fields
+        }
+    return Change(
+        resource=instance._meta.model_name,
+        object_id=instance.pk,
+        action=action,
+        data=data,
+    )
+
+
+def log_changes(instances, action):
+    """
+    Record the same action on each instance with a single insert, or add
+    them to the current ``batch_changes()`` block.
+    """
+    changes = [get_change(instance, action) for instance in instances]
+    pending = getattr(_batch, "pending", None)
+    if pending is None:
+        Change.objects.bulk_create(changes)
+    else:
+        pending.extend(changes)
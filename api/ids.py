@@ -0,0 +1,80 @@
+"""
+Primary keys of authors and books.
+
+Ids are UUIDs stored in 16 bytes: in the native ``uuid`` column type where
+the database has one, and as a ``BLOB`` on SQLite, where Django's
+``UUIDField`` would store 32 hex characters. Halving the key size shrinks
+the primary key and foreign key indexes, so more of them stay in the page
+cache and every join on ``author_id`` compares fewer bytes.
+
+New ids are random (version 4) by default. With ``ID_VERSION=7`` they are
+time-ordered (version 7): a millisecond timestamp followed by random bits,
+so new rows are appended at the end of the primary key index instead of at
+a random position. Existing ids are never rewritten, since clients and the
+change log refer to them.
+"""
+
+import os
+import time
+from uuid import UUID, uuid4
+
+from django.conf import settings
+from django.db import models
+
+
+def uuid7(random=None):
+    """
+    Return a version 7 UUID: 48 bits of Unix time in milliseconds, then the
+    version, 74 random bits and the variant. The random bits are taken from
+    ``random``, an integer of at least 74 bits, when given.
+    """
+    milliseconds = time.time_ns() // 1_000_000
+    if random is None:
+        random = int.from_bytes(os.urandom(10))
+    value = (milliseconds & (1 << 48) - 1) << 80
+    value |= 0x7 << 76
+    value |= (random >> 62 & 0xFFF) << 64
+    value |= 0b10 << 62
+    value |= random & (1 << 62) - 1
+    return UUID(int=value)
+
+
+def new_id():
+    """
+    Return a new primary key, of version ``ID_VERSION``.
+    """
+    if settings.ID_VERSION == 7:
+        return uuid7()
+    return uuid4()
+
+
+class CompactUUIDField(models.UUIDField):
+    """
+    ``UUIDField`` stored as 16 bytes on SQLite. Values are ``UUID`` objects
+    in Python either way.
+    """
+
+    def get_internal_type(self):
+        # Keeps the backends from applying their text UUID conversions.
+        return "CompactUUIDField"
+
+    def db_type(self, connection):
+        if connection.vendor == "sqlite":
+            return "blob"
+        return connection.data_types["UUIDField"]
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if connection.vendor != "sqlite":
+            return super().get_db_prep_value(value, connection, prepared)
+        if value is None:
+            return None
+        if not isinstance(value, UUID):
+            value = self.to_python(value)
+        return value.bytes
+
+    def from_db_value(self, value, expression, connection):
+        if value is None or isinstance(value, UUID):
+            return value
+        if isinstance(value, bytes):
+            return UUID(bytes=value)
+        return UUID(value)
@@ -0,0 +1,320 @@
+import json
+import platform
+import random
+import statistics
+import time
+from io import StringIO
+
+import django
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (
+    CaptureQueriesContext,
+    setup_databases,
+    setup_test_environment,
+    teardown_databases,
+    teardown_test_environment,
+)
+from api.cache import get_local_cache
+from api.models import Author, Book
+
+# Maximum number of queries of one request, by endpoint and cache state
+QUERY_BUDGETS = {
+    ("book_list", "cold"): 1,
+    ("book_list", "warm"): 0,
+    ("book_retrieve", "cold"): 1,
+    ("book_retrieve", "warm"): 0,
+    ("author_books", "cold"): 2,
+    ("author_books", "warm"): 0,
+    # Writes: one read, then the write and its change log entry in a
+    # transaction (BEGIN and COMMIT included)
+    ("book_create", "cold"): 5,
+    ("book_create", "warm"): 5,
+    ("book_update", "cold"): 5,
+    ("book_update", "warm"): 5,
+}
+
+ENDPOINTS = ["book_list", "book_retrieve", "author_books", "book_create", "book_update"]
+
+# Untimed requests run before each measurement
+WARMUP = 10
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the API endpoints at several data scales, with a cold and "
+        "a warm cache, check their query budgets, and compare the results "
+        "with a baseline. Runs against throwaway test databases and its own "
+        "cache key prefix, so it does not touch existing data."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--scales",
+            nargs="+",
+            type=int,
+            default=[100, 1000],
+            help="Numbers of authors to seed, one run each (default: 100 1000)",
+        )
+        parser.add_argument(
+            "--books-per-author",
+            type=int,
+            default=10,
+            help="Books seeded per author (default: 10)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=200,
+            help="Timed requests per endpoint and cache state (default: 200)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed of the data and requests (default: 42)",
+        )
+        parser.add_argument(
+            "--output",
+            help="Write the results to this JSON file",
+        )
+        parser.add_argument(
+            "--baseline",
+            help="Compare the results with this JSON file from a previous run",
+        )
+        parser.add_argument(
+            "--tolerance",
+            type=float,
+            default=0.25,
+            help=(
+                "Fraction by which p50 and p99 may exceed the baseline before "
+                "it counts as a regression (default: 0.25)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        for option in ("books_per_author", "requests"):
+            if options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive.")
+        if any(scale <= 0 for scale in options["scales"]):
+            raise CommandError("--scales must be positive.")
+        baseline = None
+        if options["baseline"]:
+            with open(options["baseline"]) as file:
+                baseline = json.load(file)
+
+        caches = {
+            alias: {**config, "KEY_PREFIX": "benchmark"}
+            for alias, config in settings.CACHES.items()
+        }
+        results = []
+        # DEBUG would log every query and slow requests down
+        setup_test_environment(debug=False)
+        try:
+            with override_settings(CACHES=caches, METRICS_ENABLED=False):
+                for scale in options["scales"]:
+                    results.extend(self.run_scale(scale, options))
+        finally:
+            teardown_test_environment()
+
+        report = {
+            "environment": {
+                "python": platform.python_version(),
+                "django": django.get_version(),
+                "database": connection.vendor,
+                "requests": options["requests"],
+                "books_per_author": options["books_per_author"],
+                "seed": options["seed"],
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                json.dump(report, file, indent=2)
+                file.write("\n")
+            self.stdout.write(f"Results written to {options['output']}")
+
+        failures = self.check_budgets(results)
+        if baseline is not None:
+            failures += self.compare(results, baseline, options["tolerance"])
+        if failures:
+            for failure in failures:
+                self.stderr.write(failure)
+            raise CommandError(f"{len(failures)} benchmark checks failed.")
+        self.stdout.write(self.style.SUCCESS("All benchmark checks passed."))
+
+    def run_scale(self, scale, options):
+        """
+        Seed a fresh database with ``scale`` authors and benchmark every
+        endpoint against it.
+        """
+        old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            self.stdout.write(
+                f"Seeding {scale} authors with {options['books_per_author']} "
+                "books each..."
+            )
+            call_command(
+                "seed_data",
+                authors=scale,
+                books_per_author=options["books_per_author"],
+                seed=options["seed"],
+                workers=1,
+                stdout=StringIO(),
+            )
+            self.client = Client()
+            self.rng = random.Random(options["seed"])
+            self.author_ids = [
+                str(pk) for pk in Author.objects.values_list("pk", flat=True)[:1000]
+            ]
+            self.book_ids = [
+                str(pk) for pk in Book.objects.values_list("pk", flat=True)[:1000]
+            ]
+
+            self.stdout.write(
+                f"{'endpoint':<16}{'cache':<7}{'req/s':>9}{'p50':>10}{'p99':>10}"
+                f"{'queries':>9}"
+            )
+            results = []
+            for endpoint in ENDPOINTS:
+                for cache_state in ("cold", "warm"):
+                    result = self.measure(endpoint, cache_state, options["requests"])
+                    result["scale"] = scale
+                    results.append(result)
+                    self.stdout.write(
+                        f"{endpoint:<16}{cache_state:<7}"
+                        f"{result['throughput']:>9.0f}"
+                        f"{result['p50_ms']:>8.2f}ms{result['p99_ms']:>8.2f}ms"
+                        f"{result['queries']:>9}"
+                    )
+            return results
+        finally:
+            cache.delete_pattern("*")
+            teardown_databases(old_config, verbosity=0)
+
+    def make_request(self, endpoint):
+        """
+        Return the ``(method, path, data)`` of a request to the endpoint,
+        and the paths to read beforehand to warm the cache.
+        """
+        book_id = self.rng.choice(self.book_ids)
+        author_id = self.rng.choice(self.author_ids)
+        list_path = "/api/books/?page_size=50"
+        detail_path = f"/api/books/{book_id}/"
+        if endpoint == "book_list":
+            return ("get", list_path, None), [list_path]
+        if endpoint == "book_retrieve":
+            return ("get", detail_path, None), [detail_path]
+        if endpoint == "author_books":
+            path = f"/api/authors/{author_id}/books/"
+            return ("get", path, None), [path]
+        if endpoint == "book_create":
+            data = {
+                "title": "Benchmark",
+                "description": "Created by the benchmark.",
+                "publish_date": "2020-01-01",
+                "author_id": author_id,
+            }
+            return ("post", "/api/books/", data), [list_path]
+        data = {"title": f"Benchmark {self.rng.random()}"}
+        return ("patch", detail_path, data), [list_path, detail_path]
+
+    def send(self, method, path, data):
+        if data is None:
+            response = getattr(self.client, method)(path)
+        else:
+            response = getattr(self.client, method)(
+                path, data, content_type="application/json"
+            )
+        if response.status_code >= 400:
+            raise CommandError(
+                f"{method.upper()} {path} returned {response.status_code}."
+            )
+        return response
+
+    def prepare(self, cache_state, warm_paths):
+        if cache_state == "cold":
+            cache.delete_pattern("*")
+            # The L1 cache would otherwise keep serving the deleted entries.
+            local = get_local_cache()
+            if local is not None:
+                local.clear()
+        else:
+            for path in warm_paths:
+                self.send("get", path, None)
+
+    def measure(self, endpoint, cache_state, requests):
+        """
+        Return the throughput, latency percentiles and query count of the
+        endpoint with the cache in the given state before each request.
+        """
+        request, warm_paths = self.make_request(endpoint)
+        self.prepare(cache_state, warm_paths)
+        with CaptureQueriesContext(connection) as captured:
+            self.send(*request)
+        # Count now: the captured queries are read from the connection's log,
+        # which the next request resets.
+        queries = len(captured)
+
+        timings = []
+        for index in range(WARMUP + requests):
+            request, warm_paths = self.make_request(endpoint)
+            self.prepare(cache_state, warm_paths)
+            started = time.perf_counter()
+            self.send(*request)
+            elapsed = time.perf_counter() - started
+            if index >= WARMUP:
+                timings.append(elapsed)
+
+        percentiles = statistics.quantiles(timings, n=100)
+        return {
+            "endpoint": endpoint,
+            "cache": cache_state,
+            "requests": requests,
+            "throughput": requests / sum(timings),
+            "p50_ms": percentiles[49] * 1000,
+            "p99_ms": percentiles[98] * 1000,
+            "queries": queries,
+        }
+
+    def check_budgets(self, results):
+        return [
+            f"{result['endpoint']} ({result['cache']} cache, scale "
+            f"{result['scale']}) ran {result['queries']} queries, over its "
+            f"budget of {QUERY_BUDGETS[result['endpoint'], result['cache']]}."
+            for result in results
+            if result["queries"] > QUERY_BUDGETS[result["endpoint"], result["cache"]]
+        ]
+
+    def compare(self, results, baseline, tolerance):
+        """
+        Return the regressions of the results against the baseline.
+        """
+        previous = {
+            (result["scale"], result["endpoint"], result["cache"]): result
+            for result in baseline["results"]
+        }
+        failures = []
+        for result in results:
+            before = previous.get(
+                (result["scale"], result["endpoint"], result["cache"])
+            )
+            if before is None:
+                continue
+            name = f"{result['endpoint']} ({result['cache']} cache, scale {result['scale']})"
+            for metric in ("p50_ms", "p99_ms"):
+                if result[metric] > before[metric] * (1 + tolerance):
+                    failures.append(
+                        f"{name} {metric} regressed from {before[metric]:.2f} "
+                        f"to {result[metric]:.2f}."
+                    )
+            if result["queries"] > before["queries"]:
+                failures.append(
+                    f"{name} queries went from {before['queries']} to "
+                    f"{result['queries']}."
+                )
+        return failures
@@ -0,0 +1,152 @@
+import statistics
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import RequestFactory
+from django_redis import get_redis_connection
+from api.cache import AUTHORS, BOOKS, bump_generations
+
+MODES = ["new", "persistent", "pool"]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure per-request latency of an endpoint with new connections for "
+        "every request, persistent database connections, and the psycopg "
+        "connection pool (PostgreSQL only)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--path",
+            default="/api/books/?page_size=10",
+            help="Endpoint to request (default: /api/books/?page_size=10)",
+        )
+        parser.add_argument(
+            "--requests",
+            type=int,
+            default=500,
+            help="Number of timed requests per mode (default: 500)",
+        )
+        parser.add_argument(
+            "--cache",
+            choices=["miss", "hit"],
+            default="miss",
+            help=(
+                "Whether list pages are rebuilt from the database on every "
+                "request or served from the cache (default: miss)"
+            ),
+        )
+        parser.add_argument(
+            "--modes",
+            nargs="+",
+            choices=MODES,
+            default=MODES,
+            help="Connection modes to compare (default: all)",
+        )
+        parser.add_argument(
+            "--host",
+            default="localhost",
+            help="Host header of the requests (default: localhost)",
+        )
+
+    def handle(self, *args, **options):
+        if options["requests"] <= 0:
+            raise CommandError("--requests must be positive.")
+        handler = WSGIHandler()
+        factory = RequestFactory(SERVER_NAME=options["host"])
+
+        self.stdout.write(
+            f"{options['requests']} requests to {options['path']} "
+            f"(cache {options['cache']})"
+        )
+        self.stdout.write(f"{'mode':<12}{'mean':>10}{'p50':>10}{'p99':>10}")
+        for mode in options["modes"]:
+            if not self.configure(mode):
+                self.stdout.write(f"{mode:<12}  skipped: needs PostgreSQL")
+                continue
+            try:
+                timings = self.run(handler, factory, mode, options)
+            finally:
+                self.reset()
+            p50, p99 = (
+                statistics.quantiles(timings, n=100)[index] for index in (49, 98)
+            )
+            self.stdout.write(
+                f"{mode:<12}{statistics.fmean(timings):>8.2f}ms"
+                f"{p50:>8.2f}ms{p99:>8.2f}ms"
+            )
+
+    def configure(self, mode):
+        """
+        Set up every database connection for the mode. Returns False if the
+        mode is not available on these databases.
+        """
+        if mode == "pool" and any(
+            connection.vendor != "postgresql" for connection in connections.all()
+        ):
+            return False
+        connections.close_all()
+        self.saved = {}
+        for connection in connections.all():
+            settings_dict = connection.settings_dict
+            options = settings_dict["OPTIONS"]
+            self.saved[connection.alias] = (
+                settings_dict["CONN_MAX_AGE"],
+                settings_dict["CONN_HEALTH_CHECKS"],
+                options.pop("pool", None),
+            )
+            settings_dict["CONN_MAX_AGE"] = 600 if mode == "persistent" else 0
+            settings_dict["CONN_HEALTH_CHECKS"] = mode == "persistent"
+            if mode == "pool":
+                options["pool"] = self.saved[connection.alias][2] or True
+        return True
+
+    def reset(self):
+        """
+        Restore the connection settings of the project.
+        """
+        connections.close_all()
+        for connection in connections.all():
+            if hasattr(connection, "close_pool"):
+                connection.close_pool()
+            settings_dict = connection.settings_dict
+            max_age, health_checks, pool = self.saved[connection.alias]
+            settings_dict["CONN_MAX_AGE"] = max_age
+            settings_dict["CONN_HEALTH_CHECKS"] = health_checks
+            settings_dict["OPTIONS"].pop("pool", None)
+            if pool is not None:
+                settings_dict["OPTIONS"]["pool"] = pool
+
+    def run(self, handler, factory, mode, options):
+        """
+        Return the latency of each request in milliseconds, after a few
+        warm-up requests.
+        """
+        redis = get_redis_connection("default")
+        timings = []
+        for index in range(options["requests"] + 10):
+            if options["cache"] == "miss":
+                bump_generations(AUTHORS, BOOKS)
+            if mode == "new":
+                # Without pooling, every request opens its Redis connection too.
+                redis.connection_pool.disconnect()
+            environ = factory.get(options["path"]).environ
+            started = time.perf_counter()
+            response = handler(environ, self.start_response)
+            # Closing the response ends the request, which closes or
+            # returns the database connections like a WSGI server would.
+            response.close()
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise CommandError(
+                    f"{options['path']} returned {response.status_code}."
+                )
+            if index >= 10:
+                timings.append(elapsed)
+        return timings
+
+    def start_response(self, status, headers):
+        pass
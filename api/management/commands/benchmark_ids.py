@@ -0,0 +1,158 @@
+import os
+import random
+import sqlite3
+import statistics
+import tempfile
+import time
+from uuid import uuid4
+
+from django.core.management.base import BaseCommand, CommandError
+from api.ids import uuid7
+
+# Id layouts compared: name, column type, id generator and encoding
+LAYOUTS = [
+    ("text-v4", "char(32)", uuid4, lambda value: value.hex),
+    ("blob-v4", "blob", uuid4, lambda value: value.bytes),
+    ("blob-v7", "blob", uuid7, lambda value: value.bytes),
+]
+
+# The tables and indexes of api_author and api_book that involve ids
+SCHEMA = [
+    "CREATE TABLE author (id {type} NOT NULL PRIMARY KEY, name varchar(255))",
+    """
+    CREATE TABLE book (
+        id {type} NOT NULL PRIMARY KEY,
+        title varchar(255),
+        publish_date date,
+        author_id {type} NOT NULL REFERENCES author (id)
+    )
+    """,
+    "CREATE INDEX book_author_id ON book (author_id)",
+    "CREATE INDEX book_author_publish_date ON book (author_id, publish_date, id)",
+]
+
+JOIN = """
+    SELECT a.name, b.title FROM book b JOIN author a ON a.id = b.author_id
+    WHERE b.author_id = ? ORDER BY b.publish_date, b.id
+"""
+LOOKUP = "SELECT title, author_id FROM book WHERE id = ?"
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the storage of author and book ids on SQLite as 32 hex "
+        "characters (the former layout), as 16-byte blobs, and as 16-byte "
+        "time-ordered (version 7) ids: insert time, database size, author "
+        "books joins and lookups by id. Runs on temporary databases."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--authors",
+            type=int,
+            default=20000,
+            help="Number of authors (default: 20000)",
+        )
+        parser.add_argument(
+            "--books-per-author",
+            type=int,
+            default=10,
+            help="Books per author (default: 10)",
+        )
+        parser.add_argument(
+            "--queries",
+            type=int,
+            default=5000,
+            help="Timed joins and lookups per layout (default: 5000)",
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            default=42,
+            help="Random seed of the queried ids (default: 42)",
+        )
+
+    def handle(self, *args, **options):
+        for option in ("authors", "books_per_author", "queries"):
+            if options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive.")
+
+        self.stdout.write(
+            f"{options['authors']} authors, "
+            f"{options['authors'] * options['books_per_author']} books"
+        )
+        self.stdout.write(
+            f"{'layout':<10}{'insert':>10}{'size':>10}{'join p50':>12}"
+            f"{'lookup p50':>12}"
+        )
+        with tempfile.TemporaryDirectory() as directory:
+            for name, column_type, generate, encode in LAYOUTS:
+                path = os.path.join(directory, f"{name}.sqlite3")
+                result = self.run(path, column_type, generate, encode, options)
+                self.stdout.write(
+                    f"{name:<10}{result['insert']:>9.2f}s"
+                    f"{result['size'] / 2**20:>8.1f}MB"
+                    f"{result['join'] * 1000:>10.3f}ms"
+                    f"{result['lookup'] * 1000:>10.3f}ms"
+                )
+
+    def run(self, path, column_type, generate, encode, options):
+        """
+        Load a database with the layout and return its insert time, size,
+        and the median time of a join and of a lookup.
+        """
+        connection = sqlite3.connect(path, isolation_level=None)
+        for sql in SCHEMA:
+            connection.execute(sql.format(type=column_type))
+
+        books_per_author = options["books_per_author"]
+        authors, books = [], []
+        started = time.perf_counter()
+        connection.execute("BEGIN")
+        # Rows are written in creation order, one author and their books
+        # at a time, like the API would.
+        for index in range(options["authors"]):
+            author_id = encode(generate())
+            connection.execute(
+                "INSERT INTO author VALUES (?, ?)", (author_id, f"Author {index}")
+            )
+            rows = [
+                (
+                    encode(generate()),
+                    f"Book {number}",
+                    f"2020-01-{number % 28 + 1:02}",
+                    author_id,
+                )
+                for number in range(books_per_author)
+            ]
+            connection.executemany("INSERT INTO book VALUES (?, ?, ?, ?)", rows)
+            authors.append(author_id)
+            books.extend(row[0] for row in rows)
+        connection.execute("COMMIT")
+        inserted = time.perf_counter() - started
+        connection.execute("ANALYZE")
+        (page_count,) = connection.execute("PRAGMA page_count").fetchone()
+        (page_size,) = connection.execute("PRAGMA page_size").fetchone()
+
+        rng = random.Random(options["seed"])
+        join = self.time_queries(
+            connection, JOIN, rng.choices(authors, k=options["queries"])
+        )
+        lookup = self.time_queries(
+            connection, LOOKUP, rng.choices(books, k=options["queries"])
+        )
+        connection.close()
+        return {
+            "insert": inserted,
+            "size": page_count * page_size,
+            "join": join,
+            "lookup": lookup,
+        }
+
+    def time_queries(self, connection, sql, ids):
+        timings = []
+        for value in ids:
+            started = time.perf_counter()
+            connection.execute(sql, (value,)).fetchall()
+            timings.append(time.perf_counter() - started)
+        return statistics.median(timings)
@@ -0,0 +1,254 @@
+import csv
+import json
+import os
+import time
+from datetime import date
+from uuid import UUID
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from api.changes import log_changes
+from api.ids import new_id
+from api.models import Author, Book, Change, ImportCheckpoint
+from api.renderers import CSVRenderer
+from api.cache import AUTHORS, BOOKS, author_books, author_tag, book_tag
+from api.signals import invalidate
+
+# Columns stored in length-limited fields, and their limits
+MAX_LENGTHS = {
+    "title": Book._meta.get_field("title").max_length,
+    "author_name": Author._meta.get_field("name").max_length,
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books and their authors from a CSV or NDJSON file, such as the "
+        "output of /api/books/export. Authors are deduplicated by name and "
+        "birth date. Progress is saved with every batch so an interrupted "
+        "import can be continued with --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or NDJSON file to import")
+        parser.add_argument(
+            "--format",
+            choices=["csv", "ndjson"],
+            help="Input format (default: guessed from the file extension)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=5000,
+            help="Number of books inserted per transaction (default: 5000)",
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Skip the rows of the file committed by a previous run",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"File not found: {path}")
+        if options["batch_size"] <= 0:
+            raise CommandError("--batch-size must be positive.")
+        input_format = options["format"] or self.guess_format(path)
+        self.path = os.path.abspath(path)
+        skip = self.read_checkpoint() if options["resume"] else 0
+        if skip:
+            self.stdout.write(f"Resuming after row {skip}.")
+
+        self.flatten = CSVRenderer().flatten
+        self.authors = self.load_authors()
+        self.pending_authors = []
+        self.pending_books = []
+        self.pending_tags = []
+        self.imported = self.skipped = self.existing = 0
+        self.started = time.monotonic()
+
+        position = skip
+        for position, row in enumerate(self.read_rows(path, input_format), 1):
+            if position <= skip:
+                continue
+            try:
+                row = self.parse_row(row, input_format)
+                if row is None:
+                    continue
+                self.add_row(row)
+            except (KeyError, TypeError, ValueError) as exc:
+                self.skipped += 1
+                self.stderr.write(f"Skipping row {position}: {exc!r}")
+                continue
+            if len(self.pending_books) >= options["batch_size"]:
+                self.flush(position)
+
+        self.flush(position)
+        ImportCheckpoint.objects.filter(path=self.path).delete()
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {self.imported} books in {elapsed:.1f}s "
+                f"({self.rate(elapsed):.0f} rows/s), skipped {self.skipped} rows "
+                f"and {self.existing} books that already existed."
+            )
+        )
+
+    def guess_format(self, path):
+        extension = os.path.splitext(path)[1].lower()
+        if extension == ".csv":
+            return "csv"
+        if extension in (".ndjson", ".jsonl"):
+            return "ndjson"
+        raise CommandError("Cannot guess the input format, pass --format.")
+
+    def read_rows(self, path, input_format):
+        """
+        Yield the records of the file one at a time: dicts for CSV, and
+        every line, blank ones included, for NDJSON, so that positions are
+        line numbers.
+        """
+        with open(path, newline="", encoding="utf-8") as file:
+            if input_format == "csv":
+                yield from csv.DictReader(file)
+                return
+            yield from file
+
+    def parse_row(self, record, input_format):
+        """
+        Return a record as a flat dict using the column names of the CSV
+        export, or None for a blank line. Raise ``ValueError`` if it is not
+        a JSON object.
+        """
+        if input_format == "csv":
+            return record
+        if not record.strip():
+            return None
+        row = json.loads(record)
+        if not isinstance(row, dict):
+            raise ValueError("not a JSON object")
+        return self.flatten(row)
+
+    def load_authors(self):
+        """
+        Map the natural key of every existing author to its id, so that
+        foreign keys are resolved without a query per row.
+        """
+        authors = {}
+        for name, birth_date, pk in Author.objects.values_list(
+            "name", "birth_date", "id"
+        ).iterator(chunk_size=10000):
+            authors[(name, birth_date)] = pk
+        return authors
+
+    def add_row(self, row):
+        """
+        Queue the book of a row, and its author if it is not known yet.
+        """
+        for column, max_length in MAX_LENGTHS.items():
+            if len(row[column]) > max_length:
+                raise ValueError(f"{column} is longer than {max_length} characters")
+        key = (row["author_name"], date.fromisoformat(row["author_birth_date"]))
+        author_id = UUID(row["author_id"]) if row.get("author_id") else None
+        book = Book(
+            id=UUID(row["id"]) if row.get("id") else None,
+            title=row["title"],
+            description=row.get("description") or "",
+            publish_date=date.fromisoformat(row["publish_date"]),
+        )
+        if not key[0] or not book.title:
+            raise ValueError("author_name and title must not be empty")
+        if book.id is None:
+            book.id = new_id()
+        else:
+            self.pending_tags.append(book_tag(book.id))
+
+        book.author_id = self.authors.get(key)
+        if book.author_id is None:
+            author = Author(
+                id=author_id,
+                name=key[0],
+                bio=row.get("author_bio") or "",
+                birth_date=key[1],
+            )
+            if author.id is None:
+                author.id = new_id()
+            else:
+                self.pending_tags.append(author_tag(author.id))
+            self.pending_authors.append(author)
+            self.authors[key] = book.author_id = author.id
+        self.pending_books.append(book)
+
+    def flush(self, position):
+        """
+        Insert the queued authors and books in one transaction, along with
+        their change log entries and the checkpoint of the first
+        ``position`` rows of the file. Rows whose id already exists are left
+        untouched and are not logged.
+        """
+        if not self.pending_books and not self.pending_authors:
+            return
+        with transaction.atomic():
+            authors = self.new_rows(Author, self.pending_authors)
+            books = self.new_rows(Book, self.pending_books)
+            Author.objects.bulk_create(authors, ignore_conflicts=True)
+            Book.objects.bulk_create(books, ignore_conflicts=True)
+            # bulk_create sends no signals, so the changes are logged here.
+            log_changes(authors, Change.CREATE)
+            log_changes(books, Change.CREATE)
+            ImportCheckpoint.objects.update_or_create(
+                path=self.path, defaults={"rows": position}
+            )
+
+        # Authors created by this batch cannot have a cached book list or
+        # book count yet, and cached detail entries can only exist for ids
+        # taken from the file.
+        created = {author.id for author in authors}
+        books_of = {
+            author_books(book.author_id)
+            for book in self.pending_books
+            if book.author_id not in created
+        }
+        namespaces = books_of | ({AUTHORS, BOOKS} if created else {BOOKS})
+        invalidate(namespaces, [*self.pending_tags, *books_of])
+
+        self.imported += len(books)
+        self.existing += len(self.pending_books) - len(books)
+        self.pending_authors = []
+        self.pending_books = []
+        self.pending_tags = []
+        elapsed = time.monotonic() - self.started
+        self.stdout.write(
+            f"Imported {self.imported} books ({self.rate(elapsed):.0f} rows/s)"
+        )
+
+    def new_rows(self, model, objs):
+        """
+        Return the objects the insert will create: those whose id is not in
+        the database yet, without repeats.
+        """
+        pks = [obj.pk for obj in objs]
+        existing = set()
+        batch_size = connection.ops.bulk_batch_size(["pk"], pks)
+        for start in range(0, len(pks), batch_size):
+            batch = pks[start : start + batch_size]
+            existing.update(
+                model.objects.filter(pk__in=batch).values_list("pk", flat=True)
+            )
+        rows = []
+        for obj in objs:
+            if obj.pk not in existing:
+                existing.add(obj.pk)
+                rows.append(obj)
+        return rows
+
+    def rate(self, elapsed):
+        return self.imported / elapsed if elapsed > 0 else 0
+
+    def read_checkpoint(self):
+        """
+        Return the number of rows of the file already imported.
+        """
+        checkpoint = ImportCheckpoint.objects.filter(path=self.path).first()
+        return checkpoint.rows if checkpoint else 0
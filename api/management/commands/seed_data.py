@@ -1,48 +1,150 @@
-from django.core.management.base import BaseCommand
-from api.models import Author, Book
-from faker import Faker
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from api.cache import AUTHORS, BOOKS
+from api.changes import log_changes
+from api.management.fake_data import DISTRIBUTIONS, generate_chunk
+from api.models import Author, Book, Change
+from api.signals import invalidate
 
 
 class Command(BaseCommand):
-    help = "Seed database with initial data for development"
+    help = (
+        "Seed database with synthetic data for development and load testing. "
+        "The same --seed always produces the same authors and books."
+    )
 
-    def handle(self, *args, **kwargs):
-        self.stdout.write("Seeding data...")
-        self.seed_authors()
-        self.seed_books()
-        self.stdout.write("Seeding complete.")
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--authors",
+            type=int,
+            default=10,
+            help="Number of authors to create (default: 10)",
+        )
+        parser.add_argument(
+            "--books-per-author",
+            type=int,
+            default=3,
+            help="Mean number of books per author (default: 3)",
+        )
+        parser.add_argument(
+            "--distribution",
+            choices=DISTRIBUTIONS,
+            default="fixed",
+            help=(
+                "How the number of books varies between authors: exactly the "
+                "mean, uniform around it, or long-tailed (default: fixed)"
+            ),
+        )
+        parser.add_argument(
+            "--seed",
+            type=int,
+            help="Random seed, for reproducible data (default: random)",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help=(
+                "Number of authors generated per task and inserted per "
+                "transaction, with their books (default: 1000)"
+            ),
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Number of generator processes (default: number of CPUs)",
+        )
 
-    def seed_authors(self):
-        """
-        Create sample authors.
-        """
-        faker = Faker()
-        for _ in range(10):
-            Author.objects.create(
-                name=faker.name(),
-                bio=faker.text(),
-                birth_date=faker.date_of_birth(tzinfo=None),
+    def handle(self, *args, **options):
+        for option in ("authors", "batch_size", "workers"):
+            if options[option] <= 0:
+                raise CommandError(f"--{option.replace('_', '-')} must be positive.")
+        if options["books_per_author"] < 0:
+            raise CommandError("--books-per-author must not be negative.")
+        seed = options["seed"]
+        if seed is None:
+            seed = random.randrange(2**32)
+
+        self.stdout.write(f"Seeding data with seed {seed}...")
+        started = time.monotonic()
+        authors = books = 0
+        for author_rows, book_rows in self.generate(seed, options):
+            self.insert(author_rows, book_rows)
+            authors += len(author_rows)
+            books += len(book_rows)
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"Created {authors} authors and {books} books "
+                f"({(authors + books) / elapsed:.0f} rows/s)"
             )
-        self.stdout.write(self.style.SUCCESS("Authors seeded successfully."))
+        invalidate([AUTHORS, BOOKS], [])
+        self.stdout.write(self.style.SUCCESS("Seeding complete."))
 
-    def seed_books(self):
+    def generate(self, seed, options):
         """
-        Create sample books linked to authors.
+        Yield the ``(authors, books)`` rows of each chunk, in order.
+
+        Chunks are generated by worker processes, keeping at most two per
+        worker in flight so that memory stays bounded when inserting is
+        slower than generating.
         """
-        faker = Faker()
-        authors = Author.objects.all()
-        if not authors:
-            self.stdout.write(
-                self.style.ERROR("No authors found. Please seed authors first.")
+        batch_size = options["batch_size"]
+        chunks = [
+            (
+                seed,
+                index,
+                min(batch_size, options["authors"] - start),
+                options["books_per_author"],
+                options["distribution"],
+                settings.ID_VERSION,
             )
+            for index, start in enumerate(range(0, options["authors"], batch_size))
+        ]
+        workers = min(options["workers"], len(chunks))
+        if workers == 1:
+            for chunk in chunks:
+                yield generate_chunk(*chunk)
             return
 
-        for author in authors:
-            for _ in range(3):
-                Book.objects.create(
-                    title=faker.sentence(nb_words=5),
-                    description=faker.text(),
-                    publish_date=faker.date_this_decade(),
-                    author=author,
-                )
-        self.stdout.write(self.style.SUCCESS("Books seeded successfully."))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for chunk in chunks:
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+                pending.append(executor.submit(generate_chunk, *chunk))
+            while pending:
+                yield pending.popleft().result()
+
+    def insert(self, author_rows, book_rows):
+        """
+        Insert one chunk of authors and books in a single transaction,
+        together with their change log entries.
+        """
+        authors = [
+            Author(id=pk, name=name, bio=bio, birth_date=birth_date)
+            for pk, name, bio, birth_date in author_rows
+        ]
+        books = [
+            Book(
+                id=pk,
+                title=title,
+                description=description,
+                publish_date=publish_date,
+                author_id=author_id,
+            )
+            for pk, title, description, publish_date, author_id in book_rows
+        ]
+        with transaction.atomic():
+            Author.objects.bulk_create(authors)
+            Book.objects.bulk_create(books)
+            # bulk_create sends no signals.
+            log_changes(authors, Change.CREATE)
+            log_changes(books, Change.CREATE)
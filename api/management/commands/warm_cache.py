@@ -0,0 +1,92 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from api.warming import warm
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the cache entries of the first book and author list pages "
+        "and of the most requested paths that are missing or about to "
+        "expire. With --interval, keep doing so on a schedule."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--top",
+            type=int,
+            default=settings.CACHE_WARM_TOP_K,
+            help=(
+                "Number of most requested paths to refresh "
+                f"(default: CACHE_WARM_TOP_K, {settings.CACHE_WARM_TOP_K})"
+            ),
+        )
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=settings.CACHE_WARM_AHEAD,
+            help=(
+                "Refresh entries expiring within this many seconds "
+                f"(default: CACHE_WARM_AHEAD, {settings.CACHE_WARM_AHEAD})"
+            ),
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            help="Run every this many seconds instead of once",
+        )
+        parser.add_argument(
+            "--host",
+            help=(
+                "Host header of the requests (default: the first host of "
+                "ALLOWED_HOSTS that is not a pattern, else localhost)"
+            ),
+        )
+        parser.add_argument(
+            "--secure",
+            action="store_true",
+            help="Make the requests over HTTPS",
+        )
+
+    def handle(self, *args, **options):
+        if options["top"] < 0:
+            raise CommandError("--top must not be negative.")
+        if options["ahead"] < 0:
+            raise CommandError("--ahead must not be negative.")
+        interval = options["interval"]
+        if interval is not None:
+            if interval <= 0:
+                raise CommandError("--interval must be positive.")
+            if interval >= options["ahead"]:
+                # Entries could expire between two runs.
+                raise CommandError("--interval must be shorter than --ahead.")
+            if options["ahead"] >= settings.CACHE_TIMEOUT:
+                raise CommandError(
+                    "--ahead must be shorter than CACHE_TIMEOUT, or every "
+                    "entry would be rebuilt on every run."
+                )
+
+        while True:
+            started = time.monotonic()
+            self.run(options)
+            if interval is None:
+                return
+            time.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    def run(self, options):
+        started = time.monotonic()
+        warmed, missing, failed = warm(
+            options["top"], options["ahead"], options["host"], options["secure"]
+        )
+        # Long-running: drop connections that exceeded CONN_MAX_AGE or broke.
+        close_old_connections()
+        for path, status in failed:
+            self.stderr.write(f"Failed to warm {path}: HTTP {status}")
+        summary = f"Warmed {len(warmed)} paths in {time.monotonic() - started:.2f}s"
+        if missing:
+            summary += f", dropped {len(missing)} that no longer exist"
+        if failed:
+            summary += f", {len(failed)} failed"
+        self.stdout.write(f"{summary}.")
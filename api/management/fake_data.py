@@ -0,0 +1,82 @@
+"""
+Synthetic author and book generation for ``seed_data``.
+
+This module does not need Django to be set up, so worker processes can
+load it without setting up the project. Every chunk of authors is
+generated from its own seed, so the output depends only on the base seed
+and the chunk layout, not on the number of workers. Ids follow
+``ID_VERSION`` like those of the models; version 7 ids embed the time they
+were generated, so only their random bits are reproducible.
+"""
+
+import random
+from datetime import date
+from uuid import UUID
+
+from faker import Faker
+
+from api.ids import uuid7
+
+DISTRIBUTIONS = ["fixed", "uniform", "pareto"]
+
+BIRTH_DATES = (date(1900, 1, 1), date(2005, 12, 31))
+PUBLISH_DATES = (date(1950, 1, 1), date(2024, 12, 31))
+
+
+def book_count(rng, mean, distribution):
+    """
+    Draw the number of books of one author, with the given mean.
+    """
+    if distribution == "uniform":
+        return rng.randint(0, 2 * mean)
+    if distribution == "pareto":
+        # Pareto with shape 2 has a mean of 2: most authors get a few books
+        # and a handful get very many.
+        return int(mean * rng.paretovariate(2) / 2)
+    return mean
+
+
+def make_uuid(rng, version):
+    """
+    Return an id of the given version, with random bits drawn from ``rng``.
+    """
+    if version == 7:
+        return uuid7(rng.getrandbits(74))
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def generate_chunk(seed, index, authors, books_per_author, distribution, id_version):
+    """
+    Generate the ``index``-th chunk of ``authors`` authors and their books,
+    with ids of version ``id_version``.
+
+    Returns ``(authors, books)`` as lists of tuples, in the column order of
+    ``Author(id, name, bio, birth_date)`` and
+    ``Book(id, title, description, publish_date, author_id)``.
+    """
+    rng = random.Random(f"{seed}:{index}")
+    faker = Faker()
+    faker.seed_instance(rng.getrandbits(64))
+
+    author_rows, book_rows = [], []
+    for _ in range(authors):
+        author_id = make_uuid(rng, id_version)
+        author_rows.append(
+            (
+                author_id,
+                faker.name(),
+                faker.text(),
+                faker.date_between(*BIRTH_DATES),
+            )
+        )
+        for _ in range(book_count(rng, books_per_author, distribution)):
+            book_rows.append(
+                (
+                    make_uuid(rng, id_version),
+                    faker.sentence(nb_words=5),
+                    faker.text(),
+                    faker.date_between(*PUBLISH_DATES),
+                    author_id,
+                )
+            )
+    return author_rows, book_rows
@@ -0,0 +1,312 @@
+"""
+Request-level performance metrics, enabled with ``METRICS_ENABLED``.
+
+``MetricsMiddleware`` records, for every request, the database queries and
+their time, the cache lookups by key family with their result and latency,
+and the time spent serializing and rendering responses. The breakdown is
+returned in a ``Server-Timing`` header, and added to counters exposed in
+the Prometheus text format at ``/metrics``.
+
+Counters are buffered in each process and added to a Redis hash at most
+every ``METRICS_FLUSH_INTERVAL`` seconds, so ``/metrics`` reports the totals
+of every worker. When metrics are disabled the middleware is not loaded and
+the hooks in the cache and views return after a single context lookup.
+"""
+
+import re
+import threading
+import time
+from contextlib import nullcontext
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import Http404, HttpResponse
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+# Upper bounds of the request duration histogram, in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+METRICS = {
+    "http_requests_total": ("counter", "Requests served."),
+    "http_request_duration_seconds": ("histogram", "Time spent serving requests."),
+    "db_queries_total": ("counter", "Database queries run."),
+    "db_query_duration_seconds_total": ("counter", "Time spent in queries."),
+    "cache_requests_total": ("counter", "Cache lookups, by key family and result."),
+    "cache_duration_seconds_total": ("counter", "Time spent in cache lookups."),
+    "serialize_duration_seconds_total": ("counter", "Time spent serializing."),
+    "render_duration_seconds_total": ("counter", "Time spent rendering JSON."),
+}
+
+UUID_PATTERN = re.compile(
+    r"[0-9a-f]{8}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{4}-?[0-9a-f]{12}", re.I
+)
+
+_current = ContextVar("metrics", default=None)
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def current_metrics():
+    """
+    Return the metrics of the request being served, or None if metrics are
+    disabled.
+    """
+    return _current.get()
+
+
+def key_family(key):
+    """
+    Return the family of a cache key: its leading words, with ids replaced
+    by ``<pk>``, e.g. ``all_books`` or ``author_<pk>_books``.
+    """
+    words = []
+    for word in UUID_PATTERN.sub("<pk>", key).split("_"):
+        if word != "<pk>" and not word.isalpha():
+            break
+        words.append(word)
+    return "_".join(words) or "other"
+
+
+def timer(phase):
+    """
+    Return a context manager adding the time spent in the block to the
+    ``phase`` of the current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return nullcontext()
+    return metrics.timer(phase)
+
+
+class RequestMetrics:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.query_time = 0.0
+        # {family: {result: count}} and {family: seconds}
+        self.cache_results = {}
+        self.cache_time = {}
+        self.phases = {}
+
+    def add_query(self, seconds):
+        self.queries += 1
+        self.query_time += seconds
+
+    def add_cache(self, key, result, seconds):
+        family = key_family(key)
+        results = self.cache_results.setdefault(family, {})
+        results[result] = results.get(result, 0) + 1
+        self.cache_time[family] = self.cache_time.get(family, 0.0) + seconds
+
+    def add_time(self, phase, seconds):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def timer(self, phase):
+        return _Timer(self, phase)
+
+    def server_timing(self, duration):
+        """
+        Return the ``Server-Timing`` header value, durations in milliseconds.
+        """
+        entries = [
+            f"total;dur={duration * 1000:.2f}",
+            f'db;dur={self.query_time * 1000:.2f};desc="{self.queries} queries"',
+        ]
+        for family, results in self.cache_results.items():
+            name = family.replace("<pk>", "pk")
+            desc = ", ".join(f"{count} {result}" for result, count in results.items())
+            seconds = self.cache_time[family]
+            entries.append(f'cache.{name};dur={seconds * 1000:.2f};desc="{desc}"')
+        for phase, seconds in self.phases.items():
+            entries.append(f"{phase};dur={seconds * 1000:.2f}")
+        return ", ".join(entries)
+
+    def counters(self, view, method, status, duration):
+        """
+        Return the Prometheus samples of the request, by series.
+        """
+        view = f'view="{view}"'
+        samples = {
+            f'http_requests_total{{{view},method="{method}",status="{status}"}}': 1,
+            f"http_request_duration_seconds_sum{{{view}}}": duration,
+            f"http_request_duration_seconds_count{{{view}}}": 1,
+            f'http_request_duration_seconds_bucket{{{view},le="+Inf"}}': 1,
+            f"db_queries_total{{{view}}}": self.queries,
+            f"db_query_duration_seconds_total{{{view}}}": self.query_time,
+        }
+        for bound in BUCKETS:
+            if duration <= bound:
+                samples[
+                    f'http_request_duration_seconds_bucket{{{view},le="{bound}"}}'
+                ] = 1
+        for family, results in self.cache_results.items():
+            labels = f'family="{family}"'
+            for result, count in results.items():
+                samples[
+                    f'cache_requests_total{{{labels},result="{result.lower()}"}}'
+                ] = count
+            samples[f"cache_duration_seconds_total{{{labels}}}"] = self.cache_time[
+                family
+            ]
+        for phase, seconds in self.phases.items():
+            samples[f"{phase}_duration_seconds_total{{{view}}}"] = seconds
+        return samples
+
+
+class _Timer:
+    def __init__(self, metrics, phase):
+        self.metrics = metrics
+        self.phase = phase
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info):
+        self.metrics.add_time(self.phase, time.perf_counter() - self.started)
+
+
+def record_query(execute, sql, params, many, context):
+    """
+    Database execute wrapper counting the queries of the current request.
+    """
+    metrics = _current.get()
+    if metrics is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        metrics.add_query(time.perf_counter() - started)
+
+
+def add_samples(samples):
+    """
+    Add samples to the process buffer, and flush it to Redis if it has not
+    been for ``METRICS_FLUSH_INTERVAL`` seconds.
+    """
+    global _last_flush
+    with _pending_lock:
+        for series, value in samples.items():
+            if value:
+                _pending[series] = _pending.get(series, 0) + value
+        now = time.monotonic()
+        if now - _last_flush < settings.METRICS_FLUSH_INTERVAL:
+            return
+        _last_flush = now
+        samples = dict(_pending)
+        _pending.clear()
+    flush(samples)
+
+
+def flush(samples):
+    if not samples:
+        return
+    key = cache.make_key("metrics")
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for series, value in samples.items():
+        pipeline.hincrbyfloat(key, series, value)
+    try:
+        pipeline.execute()
+    except RedisError:
+        # Metrics are best effort; never fail a request over them.
+        pass
+
+
+def render_metrics():
+    """
+    Return every worker's counters in the Prometheus text format.
+    """
+    with _pending_lock:
+        samples = dict(_pending)
+        _pending.clear()
+    flush(samples)
+    key = cache.make_key("metrics")
+    values = get_redis_connection("default").hgetall(key)
+    series = {}
+    for name, value in values.items():
+        name = name.decode()
+        series.setdefault(name.split("{", 1)[0], []).append((name, float(value)))
+
+    lines = []
+    for metric, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        names = [metric]
+        if kind == "histogram":
+            names = [f"{metric}_bucket", f"{metric}_sum", f"{metric}_count"]
+        for name in names:
+            for sample, value in sorted(series.get(name, [])):
+                lines.append(f"{sample} {value:g}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request):
+    """
+    Serve the counters to Prometheus.
+    """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(
+        render_metrics(), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+class MetricsMiddleware:
+    """
+    Record the metrics of every request. Put it first in ``MIDDLEWARE`` so
+    the total includes the other middleware.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        metrics, token = self.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    async def __acall__(self, request):
+        metrics, token = self.start()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, metrics)
+
+    def start(self):
+        for connection in connections.all():
+            if record_query not in connection.execute_wrappers:
+                connection.execute_wrappers.append(record_query)
+        metrics = RequestMetrics()
+        return metrics, _current.set(metrics)
+
+    def finish(self, request, response, metrics):
+        duration = time.perf_counter() - metrics.started
+        response["Server-Timing"] = metrics.server_timing(duration)
+        match = request.resolver_match
+        view = match.view_name if match else "unmatched"
+        if view != "metrics":
+            add_samples(
+                metrics.counters(view, request.method, response.status_code, duration)
+            )
+        return response
@@ -0,0 +1,204 @@
+from django.db import migrations
+
+# Full-text index over book titles and descriptions and the name and bio of
+# their author. It is kept up to date by triggers, so bulk writes that skip
+# model signals (bulk_create, bulk_update, queryset updates) are indexed too.
+
+SQLITE_INSTALL = [
+    # FTS5 rows are addressed by integer rowid, which api_book_search_rowid
+    # maps to book ids. The rowid of api_book itself cannot be used because
+    # VACUUM may renumber it.
+    """
+    CREATE TABLE api_book_search_rowid (
+        rowid INTEGER PRIMARY KEY,
+        book_id char(32) NOT NULL UNIQUE
+    )
+    """,
+    """
+    CREATE VIRTUAL TABLE api_book_search USING fts5(
+        title, description, author_name, author_bio,
+        tokenize = 'porter unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER api_book_search_insert AFTER INSERT ON api_book BEGIN
+        INSERT INTO api_book_search_rowid (book_id) VALUES (new.id);
+        INSERT INTO api_book_search (rowid, title, description, author_name, author_bio)
+        SELECT m.rowid, new.title, new.description, a.name, a.bio
+        FROM api_book_search_rowid m, api_author a
+        WHERE m.book_id = new.id AND a.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_book_search_update
+    AFTER UPDATE OF title, description, author_id ON api_book BEGIN
+        DELETE FROM api_book_search
+        WHERE rowid = (SELECT rowid FROM api_book_search_rowid WHERE book_id = old.id);
+        INSERT INTO api_book_search (rowid, title, description, author_name, author_bio)
+        SELECT m.rowid, new.title, new.description, a.name, a.bio
+        FROM api_book_search_rowid m, api_author a
+        WHERE m.book_id = new.id AND a.id = new.author_id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_book_search_delete AFTER DELETE ON api_book BEGIN
+        DELETE FROM api_book_search
+        WHERE rowid = (SELECT rowid FROM api_book_search_rowid WHERE book_id = old.id);
+        DELETE FROM api_book_search_rowid WHERE book_id = old.id;
+    END
+    """,
+    """
+    CREATE TRIGGER api_book_search_author_update
+    AFTER UPDATE OF name, bio ON api_author BEGIN
+        DELETE FROM api_book_search WHERE rowid IN (
+            SELECT m.rowid FROM api_book_search_rowid m
+            JOIN api_book b ON b.id = m.book_id
+            WHERE b.author_id = new.id
+        );
+        INSERT INTO api_book_search (rowid, title, description, author_name, author_bio)
+        SELECT m.rowid, b.title, b.description, new.name, new.bio
+        FROM api_book b JOIN api_book_search_rowid m ON m.book_id = b.id
+        WHERE b.author_id = new.id;
+    END
+    """,
+    "INSERT INTO api_book_search_rowid (book_id) SELECT id FROM api_book",
+    """
+    INSERT INTO api_book_search (rowid, title, description, author_name, author_bio)
+    SELECT m.rowid, b.title, b.description, a.name, a.bio
+    FROM api_book b
+    JOIN api_author a ON a.id = b.author_id
+    JOIN api_book_search_rowid m ON m.book_id = b.id
+    """,
+]
+
+SQLITE_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS api_book_search_author_update",
+    "DROP TRIGGER IF EXISTS api_book_search_delete",
+    "DROP TRIGGER IF EXISTS api_book_search_update",
+    "DROP TRIGGER IF EXISTS api_book_search_insert",
+    "DROP TABLE IF EXISTS api_book_search",
+    "DROP TABLE IF EXISTS api_book_search_rowid",
+]
+
+# Title matches weigh most, then the author name, the description and the
+# author bio.
+POSTGRES_DOCUMENT = """
+    setweight(to_tsvector('english', {title}), 'A') ||
+    setweight(to_tsvector('english', {author_name}), 'B') ||
+    setweight(to_tsvector('english', {description}), 'C') ||
+    setweight(to_tsvector('english', {author_bio}), 'D')
+"""
+
+POSTGRES_INSTALL = [
+    """
+    CREATE TABLE api_book_search (
+        book_id uuid PRIMARY KEY,
+        document tsvector NOT NULL
+    )
+    """,
+    "CREATE INDEX api_book_search_document_idx ON api_book_search USING GIN (document)",
+    """
+    CREATE FUNCTION api_book_search_index_book() RETURNS trigger AS $$
+    BEGIN
+        INSERT INTO api_book_search (book_id, document)
+        SELECT NEW.id, {document}
+        FROM api_author a WHERE a.id = NEW.author_id
+        ON CONFLICT (book_id) DO UPDATE SET document = EXCLUDED.document;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(
+        document=POSTGRES_DOCUMENT.format(
+            title="NEW.title",
+            description="NEW.description",
+            author_name="a.name",
+            author_bio="a.bio",
+        )
+    ),
+    """
+    CREATE TRIGGER api_book_search_book
+    AFTER INSERT OR UPDATE OF title, description, author_id ON api_book
+    FOR EACH ROW EXECUTE FUNCTION api_book_search_index_book()
+    """,
+    """
+    CREATE FUNCTION api_book_search_delete_book() RETURNS trigger AS $$
+    BEGIN
+        DELETE FROM api_book_search WHERE book_id = OLD.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    """
+    CREATE TRIGGER api_book_search_book_delete
+    AFTER DELETE ON api_book
+    FOR EACH ROW EXECUTE FUNCTION api_book_search_delete_book()
+    """,
+    """
+    CREATE FUNCTION api_book_search_index_author() RETURNS trigger AS $$
+    BEGIN
+        UPDATE api_book_search s SET document = {document}
+        FROM api_book b WHERE b.id = s.book_id AND b.author_id = NEW.id;
+        RETURN NULL;
+    END
+    $$ LANGUAGE plpgsql
+    """.format(
+        document=POSTGRES_DOCUMENT.format(
+            title="b.title",
+            description="b.description",
+            author_name="NEW.name",
+            author_bio="NEW.bio",
+        )
+    ),
+    """
+    CREATE TRIGGER api_book_search_author
+    AFTER UPDATE OF name, bio ON api_author
+    FOR EACH ROW EXECUTE FUNCTION api_book_search_index_author()
+    """,
+    """
+    INSERT INTO api_book_search (book_id, document)
+    SELECT b.id, {document}
+    FROM api_book b JOIN api_author a ON a.id = b.author_id
+    """.format(
+        document=POSTGRES_DOCUMENT.format(
+            title="b.title",
+            description="b.description",
+            author_name="a.name",
+            author_bio="a.bio",
+        )
+    ),
+]
+
+POSTGRES_UNINSTALL = [
+    "DROP TRIGGER IF EXISTS api_book_search_author ON api_author",
+    "DROP TRIGGER IF EXISTS api_book_search_book_delete ON api_book",
+    "DROP TRIGGER IF EXISTS api_book_search_book ON api_book",
+    "DROP FUNCTION IF EXISTS api_book_search_delete_book()",
+    "DROP FUNCTION IF EXISTS api_book_search_index_author()",
+    "DROP FUNCTION IF EXISTS api_book_search_index_book()",
+    "DROP TABLE IF EXISTS api_book_search",
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_INSTALL, SQLITE_UNINSTALL),
+    'postgresql': (POSTGRES_INSTALL, POSTGRES_UNINSTALL),
+}
+
+
+def run(statements):
+    def operation(apps, schema_editor):
+        install, uninstall = STATEMENTS.get(schema_editor.connection.vendor, ([], []))
+        for statement in install if statements == 'install' else uninstall:
+            schema_editor.execute(statement)
+
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_export_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(run('install'), run('uninstall')),
+    ]
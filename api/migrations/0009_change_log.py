@@ -0,0 +1,25 @@
+# Generated by Django 5.1 on 2026-10-18 04:49
+
+import rest_framework.utils.encoders
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_book_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('resource', models.CharField(choices=[('author', 'Author'), ('book', 'Book')], help_text='Kind of object that changed', max_length=16)),
+                ('object_id', models.UUIDField(help_text='ID of the object that changed')),
+                ('action', models.CharField(choices=[('create', 'Create'), ('update', 'Update'), ('delete', 'Delete')], help_text='What happened to the object', max_length=16)),
+                ('data', models.JSONField(encoder=rest_framework.utils.encoders.JSONEncoder, help_text='Fields of the object after the change, null when deleted', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True, help_text='Time the change was recorded')),
+            ],
+        ),
+    ]
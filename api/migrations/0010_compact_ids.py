@@ -0,0 +1,91 @@
+# Generated by Django 5.1 on 2026-10-18 04:53
+
+from importlib import import_module
+
+import api.ids
+from django.db import migrations
+
+# Store author and book ids, and the ids they are referred to by, in 16
+# bytes. On SQLite the columns become BLOBs and their values are converted
+# from 32 hex characters; other databases already have a native uuid type.
+#
+# SQLite alters a column by rebuilding its table, which drops the triggers
+# keeping the search index of 0007 up to date, so they are dropped first and
+# installed again once the ids are converted.
+
+search = import_module("api.migrations.0007_book_search")
+DROP_TRIGGERS = [sql for sql in search.SQLITE_UNINSTALL if "TRIGGER" in sql]
+CREATE_TRIGGERS = [sql for sql in search.SQLITE_INSTALL if "TRIGGER" in sql]
+
+COLUMNS = [
+    ("api_author", "id"),
+    ("api_book", "id"),
+    ("api_book", "author_id"),
+    ("api_book_search_rowid", "book_id"),
+    ("api_change", "object_id"),
+]
+
+
+def run_on_sqlite(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in statements:
+            schema_editor.execute(sql)
+
+    return run
+
+
+def convert(function):
+    def run(apps, schema_editor):
+        connection = schema_editor.connection
+        if connection.vendor != "sqlite":
+            return
+        connection.ensure_connection()
+        connection.connection.create_function(
+            "convert_id", 1, function, deterministic=True
+        )
+        for table, column in COLUMNS:
+            schema_editor.execute(f"UPDATE {table} SET {column} = convert_id({column})")
+
+    return run
+
+
+def to_bytes(value):
+    return bytes.fromhex(value) if isinstance(value, str) else value
+
+
+def to_hex(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_change_log'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(DROP_TRIGGERS), run_on_sqlite(CREATE_TRIGGERS)
+        ),
+        migrations.AlterField(
+            model_name='author',
+            name='id',
+            field=api.ids.CompactUUIDField(default=api.ids.new_id, editable=False, help_text='Unique ID for this particular author across whole library', primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='book',
+            name='id',
+            field=api.ids.CompactUUIDField(default=api.ids.new_id, editable=False, help_text='Unique ID for this particular book across whole library', primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name='change',
+            name='object_id',
+            field=api.ids.CompactUUIDField(help_text='ID of the object that changed'),
+        ),
+        migrations.RunPython(convert(to_bytes), convert(to_hex)),
+        migrations.RunPython(
+            run_on_sqlite(CREATE_TRIGGERS), run_on_sqlite(DROP_TRIGGERS)
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 5.1 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_compact_ids'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ImportCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('path', models.CharField(help_text='Absolute path of the imported file', max_length=1024, unique=True)),
+                ('rows', models.PositiveBigIntegerField(help_text='Number of rows of the file already imported')),
+                ('updated_at', models.DateTimeField(auto_now=True, help_text='Last time a batch was committed')),
+            ],
+        ),
+    ]
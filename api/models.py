@@ -1,5 +1,6 @@
 from django.db import models
-from uuid import uuid4
+from rest_framework.utils.encoders import JSONEncoder
+from .ids import CompactUUIDField, new_id
 
 
 class Author(models.Model):
@@ -7,15 +8,24 @@ class Author(models.Model):
     Model representing an author of a book in the library.
     """
 
-    id = models.UUIDField(
+    id = CompactUUIDField(
         primary_key=True,
-        default=uuid4,
+        default=new_id,
         editable=False,
         help_text="Unique ID for this particular author across whole library",
     )
     name = models.CharField(max_length=255, help_text="Enter author's name")
     bio = models.TextField(help_text="Enter author's bio")
     birth_date = models.DateField(help_text="Enter author's birth date")
+    updated_at = models.DateTimeField(
+        auto_now=True, help_text="Last time this author was updated"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["name", "id"], name="author_name_id_idx"),
+            models.Index(fields=["updated_at"], name="author_updated_at_idx"),
+        ]
 
     def __str__(self):
         return self.name
@@ -26,9 +36,9 @@ class Book(models.Model):
     Model representing a book in the library.
     """
 
-    id = models.UUIDField(
+    id = CompactUUIDField(
         primary_key=True,
-        default=uuid4,
+        default=new_id,
         editable=False,
         help_text="Unique ID for this particular book across whole library",
     )
@@ -42,6 +52,90 @@ class Book(models.Model):
         help_text="Enter book's author",
         db_index=True,
     )
+    updated_at = models.DateTimeField(
+        auto_now=True, help_text="Last time this book was updated"
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["publish_date", "id"], name="book_publish_date_id_idx"
+            ),
+            models.Index(fields=["updated_at", "id"], name="book_updated_at_id_idx"),
+            models.Index(
+                fields=["author", "publish_date", "id"],
+                name="book_author_publish_date_idx",
+            ),
+            models.Index(fields=["title", "id"], name="book_title_id_idx"),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        """
+        Remember the author the book was loaded with, so a change of author
+        can invalidate the previous author's cached book list too. The
+        signal handlers keep it up to date after each save.
+        """
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_author_id = instance.__dict__.get("author_id")
+        return instance
 
     def __str__(self):
         return self.title
+
+
+class Change(models.Model):
+    """
+    Entry of the append-only log of changes to authors and books. Entries
+    are written in the same transaction as the change they record, and
+    their ids increase in the order they were written.
+    """
+
+    CREATE = "create"
+    UPDATE = "update"
+    DELETE = "delete"
+
+    resource = models.CharField(
+        max_length=16,
+        choices=[("author", "Author"), ("book", "Book")],
+        help_text="Kind of object that changed",
+    )
+    object_id = CompactUUIDField(help_text="ID of the object that changed")
+    action = models.CharField(
+        max_length=16,
+        choices=[(CREATE, "Create"), (UPDATE, "Update"), (DELETE, "Delete")],
+        help_text="What happened to the object",
+    )
+    data = models.JSONField(
+        null=True,
+        # Encodes dates, times and ids the way API responses do
+        encoder=JSONEncoder,
+        help_text="Fields of the object after the change, null when deleted",
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True, help_text="Time the change was recorded"
+    )
+
+    def __str__(self):
+        return f"{self.action} {self.resource} {self.object_id}"
+
+
+class ImportCheckpoint(models.Model):
+    """
+    Progress of an ``import_catalog`` run, saved in the transaction of each
+    batch so that ``--resume`` continues exactly after the last committed
+    one.
+    """
+
+    path = models.CharField(
+        max_length=1024, unique=True, help_text="Absolute path of the imported file"
+    )
+    rows = models.PositiveBigIntegerField(
+        help_text="Number of rows of the file already imported"
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True, help_text="Last time a batch was committed"
+    )
+
+    def __str__(self):
+        return f"{self.path}: {self.rows} rows"
@@ -0,0 +1,377 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from functools import reduce
+from operator import or_
+
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class PageSizePagination(BasePagination):
+    """
+    Base class for paginations that take a ``?page_size=`` and respond with
+    ``{"next": ..., "previous": ..., "results": [...]}``.
+    """
+
+    page_size = settings.REST_FRAMEWORK["PAGE_SIZE"]
+    max_page_size = settings.MAX_PAGE_SIZE
+    page_size_query_param = "page_size"
+
+    def get_paginated_response(self, data):
+        return Response(
+            {
+                "next": self.get_next_link(),
+                "previous": self.get_previous_link(),
+                "results": data,
+            }
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri-reference"},
+                "previous": {"type": "string", "nullable": True, "format": "uri-reference"},
+                "results": schema,
+            },
+        }
+
+    def get_url(self):
+        """
+        Return the path and query string of the request, which links are
+        built from. Links are relative because pages are cached and shared
+        by every client, whatever scheme and host they reached the API by.
+        """
+        return self.request.get_full_path()
+
+    def get_page_size(self, request):
+        """
+        Return the requested page size, clamped to ``max_page_size``.
+        """
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+
+class KeysetPagination(PageSizePagination):
+    """
+    Cursor pagination over a composite, unique ordering key.
+
+    Unlike DRF's ``CursorPagination``, the cursor stores the full ordering
+    key of the boundary row, so every page is fetched with a single indexed
+    range condition and no offset, no matter how deep the client paginates.
+    The last ordering field must be unique (usually ``id``).
+
+    Clients may pick another ordering with ``?ordering=`` among
+    ``ordering_fields``, optionally prefixed with ``-``; the ``id``
+    tie-breaker follows its direction.
+    """
+
+    ordering = ("id",)
+    ordering_fields = ()
+    ordering_query_param = "ordering"
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page(list(queryset))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        Async version of ``paginate_queryset``.
+        """
+        queryset = self.get_page_queryset(queryset, request)
+        return self.set_page([item async for item in queryset])
+
+    def get_page_queryset(self, queryset, request):
+        """
+        Return the queryset of the requested page, plus one row to tell
+        whether there are more.
+        """
+        self.request = request
+        self.ordering = self.get_requested_ordering(request)
+        self.page_size = self.get_page_size(request)
+        self.position, self.reverse = self.decode_cursor(request)
+
+        ordering = self.get_ordering(self.reverse)
+        if self.position is not None:
+            try:
+                queryset = queryset.filter(
+                    self.get_keyset_filter(ordering, self.position)
+                )
+            except (DjangoValidationError, ValueError):
+                raise NotFound(self.invalid_cursor_message)
+        return queryset.order_by(*ordering)[: self.page_size + 1]
+
+    def set_page(self, results):
+        has_more = len(results) > self.page_size
+        self.page = results[: self.page_size]
+
+        if self.reverse:
+            self.page.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        return self.page
+
+    def get_page_key(self, request):
+        """
+        Return a normalized identifier of the requested page, suitable for
+        use in a cache key. Raises ``NotFound`` for malformed cursors.
+        """
+        self.ordering = self.get_requested_ordering(request)
+        position, reverse = self.decode_cursor(request)
+        cursor = self.encode_position(position, reverse) if position else "first"
+        page_key = f"{self.get_page_size(request)}_{cursor}"
+        if self.ordering != type(self).ordering:
+            page_key = f"{page_key}_ordering={','.join(self.ordering)}"
+        return page_key
+
+    def get_requested_ordering(self, request):
+        """
+        Return the ordering requested with ``?ordering=``, or the default
+        one. Raises ``ValidationError`` for fields that cannot be ordered by.
+        """
+        value = request.query_params.get(self.ordering_query_param)
+        if not value:
+            return type(self).ordering
+        field = value.strip().lstrip("-")
+        if field not in self.ordering_fields:
+            allowed = ", ".join(self.ordering_fields)
+            raise ValidationError(
+                {self.ordering_query_param: [f"Must be one of: {allowed}."]}
+            )
+        prefix = "-" if value.strip().startswith("-") else ""
+        return (f"{prefix}{field}", f"{prefix}id")
+
+    def get_ordering(self, reverse=False):
+        if not reverse:
+            return list(self.ordering)
+        return [
+            field[1:] if field.startswith("-") else f"-{field}"
+            for field in self.ordering
+        ]
+
+    def get_keyset_filter(self, ordering, position):
+        """
+        Build ``(a > x) OR (a = x AND b > y) OR ...`` for the given ordering.
+        """
+        conditions = []
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            equal = {
+                other.lstrip("-"): value
+                for other, value in zip(ordering[:index], position[:index])
+            }
+            conditions.append(Q(**equal, **{f"{name}__{lookup}": position[index]}))
+        return reduce(or_, conditions)
+
+    def get_position(self, item):
+        """
+        Return the ordering key of a model instance or a ``values()`` row.
+        """
+        fields = [field.lstrip("-") for field in self.ordering]
+        if isinstance(item, dict):
+            return [str(item[field]) for field in fields]
+        return [str(getattr(item, field)) for field in fields]
+
+    def decode_cursor(self, request):
+        """
+        Return ``(position, reverse)`` for the cursor in the request.
+        """
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            padding = "=" * (-len(encoded) % 4)
+            data = json.loads(urlsafe_b64decode(encoded + padding))
+            position, reverse = data["p"], bool(data.get("r", False))
+            ordering = data.get("o", type(self).ordering)
+        except (TypeError, ValueError, KeyError, AttributeError):
+            raise NotFound(self.invalid_cursor_message)
+        if list(ordering) != list(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(position, list) or len(position) != len(self.ordering):
+            raise NotFound(self.invalid_cursor_message)
+        if not all(isinstance(value, str) for value in position):
+            raise NotFound(self.invalid_cursor_message)
+        return position, reverse
+
+    def encode_position(self, position, reverse=False):
+        data = {"p": position}
+        if reverse:
+            data["r"] = True
+        if self.ordering != type(self).ordering:
+            data["o"] = list(self.ordering)
+        encoded = json.dumps(data, separators=(",", ":")).encode()
+        return urlsafe_b64encode(encoded).decode().rstrip("=")
+
+    def encode_cursor(self, position, reverse=False):
+        url = self.get_url()
+        cursor = self.encode_position(position, reverse)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page:
+            url = self.get_url()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[-1]))
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            url = self.get_url()
+            return remove_query_param(url, self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+
+class AuthorPagination(KeysetPagination):
+    """
+    Paginate authors by name, using the id as a tie-breaker.
+    """
+
+    ordering = ("name", "id")
+
+
+class BookPagination(KeysetPagination):
+    """
+    Paginate books by publish date, using the id as a tie-breaker.
+    """
+
+    ordering = ("publish_date", "id")
+    ordering_fields = ("publish_date", "title")
+
+
+class SearchPagination(PageSizePagination):
+    """
+    Page-numbered pagination for ranked search results, which have no
+    ordering key to build a cursor from. One extra result is fetched to
+    tell whether there is a next page, instead of counting all matches.
+    """
+
+    page_query_param = "page"
+    max_page = settings.SEARCH_MAX_PAGE
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.page_number = self.get_page_number(request)
+
+        offset = (self.page_number - 1) * self.page_size
+        results = list(queryset[offset : offset + self.page_size + 1])
+        self.has_next = (
+            len(results) > self.page_size and self.page_number < self.max_page
+        )
+        self.page = results[: self.page_size]
+        return self.page
+
+    def get_page_number(self, request):
+        """
+        Return the requested page number. Raises ``NotFound`` for malformed
+        numbers and for pages past ``max_page``.
+        """
+        try:
+            page_number = int(request.query_params.get(self.page_query_param, 1))
+        except ValueError:
+            raise NotFound("Invalid page")
+        if not 1 <= page_number <= self.max_page:
+            raise NotFound("Invalid page")
+        return page_number
+
+    def get_page_key(self, request):
+        """
+        Return a normalized identifier of the requested page, suitable for
+        use in a cache key.
+        """
+        return f"{self.get_page_size(request)}_{self.get_page_number(request)}"
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.get_url()
+        return replace_query_param(url, self.page_query_param, self.page_number + 1)
+
+    def get_previous_link(self):
+        if self.page_number == 1:
+            return None
+        url = self.get_url()
+        if self.page_number == 2:
+            return remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+
+class ChangePagination(PageSizePagination):
+    """
+    Pagination of the change log from ``?after=``, the id of the last change
+    the client has seen. Responses hold the ``after`` to send next, which is
+    unchanged when there are no new changes, so clients can keep polling
+    with it.
+    """
+
+    after_query_param = "after"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.after = self.get_after(request)
+
+        results = list(
+            queryset.filter(id__gt=self.after).order_by("id")[: self.page_size + 1]
+        )
+        self.has_next = len(results) > self.page_size
+        self.page = results[: self.page_size]
+        if self.page:
+            self.after = self.page[-1].id
+        return self.page
+
+    def get_after(self, request):
+        try:
+            after = int(request.query_params.get(self.after_query_param, 0))
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if after < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return after
+
+    def get_paginated_response(self, data):
+        return Response(
+            {"next": self.get_next_link(), "after": self.after, "results": data}
+        )
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["after", "results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri-reference"},
+                "after": {"type": "integer"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.get_url()
+        return replace_query_param(url, self.after_query_param, self.after)
+
+    def get_previous_link(self):
+        return None
@@ -0,0 +1,83 @@
+import csv
+import io
+import json
+
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class StreamingRenderer(BaseRenderer):
+    """
+    Renderer for flat, line-oriented formats that can also render an
+    iterable of rows incrementally, for use with ``StreamingHttpResponse``.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        rows = data if isinstance(data, list) else [data]
+        return b"".join(self.render_rows(rows))
+
+    def render_rows(self, rows, chunk_size=1):
+        """
+        Yield the rendered rows as bytes, ``chunk_size`` rows at a time.
+        """
+        chunk = []
+        for line in self.render_lines(rows):
+            chunk.append(line)
+            if len(chunk) >= chunk_size:
+                yield "".join(chunk).encode(self.charset)
+                chunk = []
+        if chunk:
+            yield "".join(chunk).encode(self.charset)
+
+    def render_lines(self, rows):
+        raise NotImplementedError
+
+
+class NDJSONRenderer(StreamingRenderer):
+    """
+    Newline-delimited JSON, one object per line.
+    """
+
+    media_type = "application/x-ndjson"
+    format = "ndjson"
+
+    def render_lines(self, rows):
+        for row in rows:
+            line = json.dumps(
+                row, cls=JSONEncoder, ensure_ascii=False, separators=(",", ":")
+            )
+            yield f"{line}\n"
+
+
+class CSVRenderer(StreamingRenderer):
+    """
+    CSV with a header row. Nested objects are flattened into
+    ``<field>_<subfield>`` columns.
+    """
+
+    media_type = "text/csv"
+    format = "csv"
+
+    def flatten(self, row, prefix=""):
+        flat = {}
+        for key, value in row.items():
+            if isinstance(value, dict):
+                flat.update(self.flatten(value, prefix=f"{prefix}{key}_"))
+            else:
+                flat[f"{prefix}{key}"] = value
+        return flat
+
+    def render_lines(self, rows):
+        buffer = io.StringIO()
+        writer = None
+        for row in rows:
+            row = self.flatten(row)
+            if writer is None:
+                writer = csv.DictWriter(buffer, fieldnames=list(row))
+                writer.writeheader()
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
@@ -0,0 +1,172 @@
+"""
+Read replica routing.
+
+Replicas are configured with the ``DB_REPLICA_*`` settings and listed in
+``DATABASE_REPLICAS``. Reads only go to a replica inside ``replica_reads()``,
+which the viewsets enter for their read actions; everything else, including
+the reads that validate a write, stays on the primary. Each request uses a
+single replica, chosen round-robin among those that are reachable. The
+choice checks Redis and connects to the replica, so it is never made on an
+event loop: the async ORM runs its queries in worker threads, and the
+replica is chosen there.
+
+After a client writes, its reads stick to the primary for
+``DB_REPLICA_STICKY_SECONDS``, so it always sees its own writes even if the
+replicas lag. The deadline is sent back in the ``read_primary_until``
+cookie and the ``X-Read-Primary-Until`` header; clients that do not keep
+cookies can echo the header on their next requests.
+
+Other clients may still read a lagging replica, and whatever they read is
+cached for everyone, including the writer. So for the same window after any
+write, reads go to the primary as well, and cache entries are only ever
+rebuilt from replicas that have had time to catch up.
+"""
+
+import asyncio
+import itertools
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.utils import DatabaseError
+
+PIN_COOKIE = "read_primary_until"
+PIN_HEADER = "X-Read-Primary-Until"
+# Cache key present for DB_REPLICA_STICKY_SECONDS after every write
+SETTLE_KEY = "replicas:written"
+
+# A context variable rather than a thread local, so that it follows requests
+# served by the async views into the threads running their queries.
+_replica = ContextVar("replica", default=None)
+
+_counter = itertools.count()
+_down_until = {}
+_lock = threading.Lock()
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """
+    Send the reads made inside the block to a replica, if any is configured
+    and ``enabled`` is true. The replica is chosen on the first read.
+    """
+    token = _replica.set({"alias": None} if enabled else None)
+    try:
+        yield
+    finally:
+        _replica.reset(token)
+
+
+def is_healthy(alias):
+    """
+    Return whether a connection to the database can be opened. Reconnecting
+    is part of the first query of a request anyway, so this adds no round
+    trip.
+    """
+    try:
+        connections[alias].ensure_connection()
+    except DatabaseError:
+        return False
+    return True
+
+
+def choose_replica():
+    """
+    Return the next healthy replica in round-robin order, or the primary if
+    none is. A replica that fails is skipped for ``DB_REPLICA_RETRY_SECONDS``.
+    """
+    replicas = settings.DATABASE_REPLICAS
+    start = next(_counter)
+    now = time.monotonic()
+    for offset in range(len(replicas)):
+        alias = replicas[(start + offset) % len(replicas)]
+        if _down_until.get(alias, 0) > now:
+            continue
+        if is_healthy(alias):
+            return alias
+        with _lock:
+            _down_until[alias] = now + settings.DB_REPLICA_RETRY_SECONDS
+    return DEFAULT_DB_ALIAS
+
+
+def record_write():
+    """
+    Send every read to the primary for ``DB_REPLICA_STICKY_SECONDS``, while
+    the replicas may not have the write yet. Called before the cache entries
+    the write affects are invalidated, so none is rebuilt from a replica.
+    """
+    if settings.DATABASE_REPLICAS:
+        cache.set(SETTLE_KEY, time.time(), settings.DB_REPLICA_STICKY_SECONDS)
+
+
+def is_settling():
+    """
+    Return whether the primary was written to within the last
+    ``DB_REPLICA_STICKY_SECONDS``.
+    """
+    return cache.has_key(SETTLE_KEY)
+
+
+def on_event_loop():
+    """
+    Return whether the caller runs on an event loop.
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+class ReplicaRouter:
+    """
+    Route reads made inside ``replica_reads()`` to a replica, and every
+    other query to the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _replica.get()
+        if state is None or not settings.DATABASE_REPLICAS:
+            return DEFAULT_DB_ALIAS
+        if state["alias"] is None:
+            if on_event_loop():
+                # Choosing reads Redis and connects to the replica, which
+                # would block the loop. The async ORM runs its queries in
+                # worker threads, where the choice is made instead.
+                return DEFAULT_DB_ALIAS
+            state["alias"] = DEFAULT_DB_ALIAS if is_settling() else choose_replica()
+        return state["alias"]
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary.
+        return True
+
+
+def is_pinned(request):
+    """
+    Return whether the client wrote recently enough for its reads to stay
+    on the primary.
+    """
+    value = request.COOKIES.get(PIN_COOKIE) or request.headers.get(PIN_HEADER)
+    try:
+        return float(value) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+
+def pin_to_primary(response):
+    """
+    Keep the reads of the client that received the response on the primary
+    for ``DB_REPLICA_STICKY_SECONDS``.
+    """
+    seconds = settings.DB_REPLICA_STICKY_SECONDS
+    until = f"{time.time() + seconds:.3f}"
+    response.set_cookie(PIN_COOKIE, until, max_age=seconds, httponly=True)
+    response[PIN_HEADER] = until
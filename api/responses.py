@@ -0,0 +1,199 @@
+import gzip
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import get_conditional_response, parse_etags, patch_vary_headers
+from django.utils.http import http_date, parse_header_parameters
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .metrics import timer
+
+
+def make_etag(value):
+    """
+    Return a strong ETag for the given bytes or string.
+    """
+    if isinstance(value, str):
+        value = value.encode()
+    return f'"{hashlib.md5(value, usedforsecurity=False).hexdigest()}"'
+
+
+def render_entry(data, etag=None, last_modified=None):
+    """
+    Render serialized data to the JSON bytes stored in the cache, along with
+    their content type, a strong ETag and a Last-Modified timestamp. Both
+    default to the content hash and the current time. Bodies of at least
+    ``CACHE_COMPRESS_MIN_SIZE`` bytes are stored gzipped.
+    """
+    with timer("render"):
+        body = JSONRenderer().render(data)
+        if last_modified is None:
+            last_modified = time.time()
+        entry = {
+            "body": body,
+            "encoding": None,
+            "content_type": JSONRenderer.media_type,
+            "etag": etag or make_etag(body),
+            "last_modified": int(last_modified),
+        }
+        threshold = settings.CACHE_COMPRESS_MIN_SIZE
+        if threshold and len(body) >= threshold:
+            entry["body"] = gzip.compress(body, compresslevel=6, mtime=0)
+            entry["encoding"] = "gzip"
+        return entry
+
+
+def accepts_gzip(request):
+    """
+    Return whether the request's ``Accept-Encoding`` allows gzip: listed, or
+    covered by ``*``, with a non-zero ``q`` value.
+    """
+    qualities = {}
+    for coding in request.META.get("HTTP_ACCEPT_ENCODING", "").split(","):
+        name, params = parse_header_parameters(coding)
+        if not name:
+            continue
+        try:
+            qualities[name] = float(params.get("q", 1))
+        except ValueError:
+            qualities[name] = 0.0
+    quality = qualities.get("gzip", qualities.get("x-gzip", qualities.get("*", 0)))
+    return quality > 0
+
+
+def gzip_etag(etag):
+    """
+    Return the ETag of the gzipped representation for an ETag.
+    """
+    return f'{etag[:-1]}-gzip"'
+
+
+def entry_etag(request, entry):
+    """
+    Return the ETag of the entry as served to the request. Gzipped and
+    identity bodies are different representations, so they have different
+    strong ETags.
+    """
+    if entry["encoding"] == "gzip" and accepts_gzip(request):
+        return gzip_etag(entry["etag"])
+    return entry["etag"]
+
+
+def decode_entry(entry):
+    """
+    Return the uncompressed JSON bytes of a cached entry.
+    """
+    if entry["encoding"] == "gzip":
+        return gzip.decompress(entry["body"])
+    return entry["body"]
+
+
+class CachedResponse(Response):
+    """
+    Response built from a cached entry of pre-rendered JSON bytes.
+
+    When JSON is negotiated the cached bytes are returned as they are, and
+    gzipped bodies are passed through untouched to clients that accept gzip.
+    Other renderers, such as the browsable API, fall back to ``data``, which
+    is only decoded when accessed.
+    """
+
+    def __init__(self, entry, status=None, headers=None, etag=None):
+        self.entry = entry
+        super().__init__(None, status=status, headers=headers)
+        self["ETag"] = etag or entry["etag"]
+        self["Last-Modified"] = http_date(entry["last_modified"])
+
+    @property
+    def data(self):
+        if self._data is None:
+            self._data = json.loads(decode_entry(self.entry))
+        return self._data
+
+    @data.setter
+    def data(self, value):
+        self._data = value
+
+    @property
+    def rendered_content(self):
+        renderer = getattr(self, "accepted_renderer", None)
+        media_type = getattr(self, "accepted_media_type", None) or ""
+        _, params = parse_header_parameters(media_type)
+        if not isinstance(renderer, JSONRenderer) or "indent" in params:
+            return super().rendered_content
+
+        self["Content-Type"] = self.entry["content_type"]
+        return entry_body(self.renderer_context.get("request"), self.entry, self)
+
+
+def entry_body(request, entry, response):
+    """
+    Return the body of a cached entry for the request, passing gzipped
+    bodies through to clients that accept gzip, and set the matching
+    ``Content-Encoding`` and ``Vary`` headers on the response.
+    """
+    if entry["encoding"] is None:
+        return entry["body"]
+    patch_vary_headers(response, ["Accept-Encoding"])
+    if accepts_gzip(request):
+        response["Content-Encoding"] = entry["encoding"]
+        return entry["body"]
+    return decode_entry(entry)
+
+
+def cached_response(request, entry, status=None, headers=None):
+    """
+    Return a ``CachedResponse`` for the entry, or a 304 response if the
+    request's ``If-None-Match``/``If-Modified-Since`` headers match it.
+    """
+    etag = entry_etag(request, entry)
+    response = CachedResponse(entry, status=status, headers=headers, etag=etag)
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=entry["last_modified"],
+        response=response,
+    )
+
+
+def entry_response(request, entry, status=200, headers=None):
+    """
+    Return a plain ``HttpResponse`` with the JSON bytes of the entry, or a
+    304 response if the request's conditional headers match it. This is
+    what ``cached_response`` renders to for JSON clients, without going
+    through DRF.
+    """
+    response = HttpResponse(
+        status=status, headers=headers, content_type=entry["content_type"]
+    )
+    etag = entry_etag(request, entry)
+    response.content = entry_body(request, entry, response)
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(entry["last_modified"])
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=entry["last_modified"],
+        response=response,
+    )
+
+
+def not_modified(request, etag):
+    """
+    Return a 304 response if ``If-None-Match`` matches the ETag, or the
+    ETag of its gzipped representation, else None.
+
+    ``*`` is not honoured: list ETags are checked before the resource is
+    known to exist, and a missing one must still be answered with 404.
+    """
+    etags = parse_etags(request.META.get("HTTP_IF_NONE_MATCH", ""))
+    for candidate in (etag, gzip_etag(etag)):
+        if candidate in etags:
+            response = HttpResponseNotModified()
+            response["ETag"] = candidate
+            return response
+    return None
@@ -0,0 +1,128 @@
+"""
+Full-text search over books.
+
+The index is created by migration ``0007_book_search`` and kept up to date by
+database triggers on ``api_book`` and ``api_author``. Backends only query it:
+they return the ids of the matching books, best match first. The backend is
+chosen from the database vendor, or set with ``SEARCH_BACKEND``.
+"""
+
+import re
+from uuid import UUID
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils.module_loading import import_string
+
+
+class SearchResults:
+    """
+    Lazy, sliceable sequence of the ids of the books matching a query, so
+    that paginators only fetch the page they need.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or item.step is not None:
+            raise TypeError("Search results only support slicing.")
+        offset = item.start or 0
+        if item.stop is None:
+            raise TypeError("Search results must be sliced with an upper bound.")
+        return self.backend.search(self.query, max(item.stop - offset, 0), offset)
+
+
+class SearchBackend:
+    def results(self, query):
+        return SearchResults(self, query)
+
+    def search(self, query, limit, offset=0):
+        """
+        Return the ids of up to ``limit`` books matching the query, skipping
+        the first ``offset``, in order of relevance.
+        """
+        raise NotImplementedError
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 index ranked with BM25. Each column gets its own weight:
+    title, description, author name, author bio.
+    """
+
+    weights = (10.0, 2.0, 5.0, 1.0)
+
+    def match_expression(self, query):
+        # Quote every word, so that user input is never parsed as FTS5 query
+        # syntax. Words are combined with AND.
+        words = re.findall(r"\w+", query)
+        return " ".join(f'"{word}"' for word in words)
+
+    def search(self, query, limit, offset=0):
+        expression = self.match_expression(query)
+        if not expression or limit <= 0:
+            return []
+        weights = ", ".join(str(weight) for weight in self.weights)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"""
+                SELECT m.book_id
+                FROM api_book_search
+                JOIN api_book_search_rowid m ON m.rowid = api_book_search.rowid
+                WHERE api_book_search MATCH %s
+                ORDER BY bm25(api_book_search, {weights}), m.book_id
+                LIMIT %s OFFSET %s
+                """,
+                [expression, limit, offset],
+            )
+            # Ids are 16-byte blobs, see ids.py
+            return [UUID(bytes=book_id) for book_id, in cursor.fetchall()]
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    PostgreSQL ``tsvector`` index with a GIN index, ranked with
+    ``ts_rank_cd``. Queries use the ``websearch_to_tsquery`` syntax.
+    """
+
+    config = "english"
+
+    def search(self, query, limit, offset=0):
+        if not query.strip() or limit <= 0:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(
+                """
+                SELECT s.book_id
+                FROM api_book_search s, websearch_to_tsquery(%s, %s) query
+                WHERE s.document @@ query
+                ORDER BY ts_rank_cd(s.document, query) DESC, s.book_id
+                LIMIT %s OFFSET %s
+                """,
+                [self.config, query, limit, offset],
+            )
+            return [book_id for book_id, in cursor.fetchall()]
+
+
+BACKENDS = {
+    "sqlite": SQLiteSearchBackend,
+    "postgresql": PostgresSearchBackend,
+}
+
+
+def get_search_backend():
+    """
+    Return the configured search backend.
+    """
+    if settings.SEARCH_BACKEND:
+        return import_string(settings.SEARCH_BACKEND)()
+    try:
+        return BACKENDS[connection.vendor]()
+    except KeyError:
+        raise ImproperlyConfigured(
+            f"Full-text search is not supported on {connection.vendor}; "
+            "set SEARCH_BACKEND."
+        )
@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Book, Author
+from .metrics import timer
+from .models import Book, Author, Change
 from datetime import date
 
 
@@ -21,19 +22,46 @@ class AuthorSerializer(serializers.ModelSerializer):
         return value
 
 
+class AuthorRelatedField(serializers.PrimaryKeyRelatedField):
+    """
+    Primary key field for authors that resolves them from the
+    ``prefetched_authors`` context mapping when a bulk request has loaded
+    them up front, instead of running one query per item.
+    """
+
+    def to_internal_value(self, data):
+        authors = self.context.get("prefetched_authors")
+        if authors is None:
+            return super().to_internal_value(data)
+        if isinstance(data, bool):
+            self.fail("incorrect_type", data_type=type(data).__name__)
+        try:
+            return authors[Author._meta.pk.to_python(data)]
+        except KeyError:
+            self.fail("does_not_exist", pk_value=data)
+
+
 class BookSerializer(serializers.ModelSerializer):
     """
     Serializer for the Book model.
     """
 
-    author_id = serializers.PrimaryKeyRelatedField(
+    author_id = AuthorRelatedField(
         queryset=Author.objects.all(), source="author", write_only=True
     )
     author = AuthorSerializer(read_only=True)
 
     class Meta:
         model = Book
-        fields = ["id", "title", "description", "publish_date", "author", "author_id"]
+        fields = [
+            "id",
+            "title",
+            "description",
+            "publish_date",
+            "updated_at",
+            "author",
+            "author_id",
+        ]
 
     def validate_publish_date(self, value):
         """
@@ -42,3 +70,123 @@ class BookSerializer(serializers.ModelSerializer):
         if value > date.today():
             raise serializers.ValidationError("Publish date cannot be in the future.")
         return value
+
+
+class ChangeSerializer(serializers.ModelSerializer):
+    """
+    Serializer for entries of the change log.
+    """
+
+    class Meta:
+        model = Change
+        fields = ["id", "resource", "object_id", "action", "data", "created_at"]
+
+
+class ValuesSerializer:
+    """
+    Read-only serializer over ``QuerySet.values()`` rows.
+
+    It skips ModelSerializer field introspection and model instantiation, and
+    must produce the same output as the serializer it mirrors. ``fields``
+    lists the output keys in order; ``converters`` maps a field to the DRF
+    field whose ``to_representation`` formats it, and ``nested`` maps a
+    relation to the ``ValuesSerializer`` read through ``<field>__`` lookups.
+
+    Passing ``fields`` narrows the output (and the selected columns) to a
+    subset of fields. Relations in ``expand`` are embedded as objects, the
+    others are rendered as their primary key; by default all are embedded.
+    """
+
+    fields = []
+    converters = {}
+    nested = {}
+
+    def __init__(self, prefix="", fields=None, expand=None):
+        self.prefix = prefix
+        self.selected_fields = [
+            name for name in self.fields if fields is None or name in fields
+        ]
+        self.converter_functions = {
+            name: field_class().to_representation
+            for name, field_class in self.converters.items()
+        }
+        self.nested_serializers = {
+            name: serializer_class(prefix=f"{prefix}{name}__")
+            for name, serializer_class in self.nested.items()
+            if expand is None or name in expand
+        }
+        for name in self.nested:
+            if name not in self.nested_serializers:
+                self.converter_functions[name] = (
+                    serializers.UUIDField().to_representation
+                )
+
+    @property
+    def lookups(self):
+        lookups = []
+        for name in self.selected_fields:
+            if name in self.nested_serializers:
+                lookups.extend(self.nested_serializers[name].lookups)
+            else:
+                lookups.append(f"{self.prefix}{name}")
+        return lookups
+
+    def values(self, queryset, extra=()):
+        """
+        Narrow a queryset to the columns this serializer reads, plus any
+        ``extra`` lookups the caller needs from each row.
+        """
+        lookups = self.lookups
+        lookups.extend(lookup for lookup in extra if lookup not in lookups)
+        return queryset.values(*lookups)
+
+    def to_representation(self, row):
+        data = {}
+        for name in self.selected_fields:
+            if name in self.nested_serializers:
+                data[name] = self.nested_serializers[name].to_representation(row)
+                continue
+            value = row[f"{self.prefix}{name}"]
+            converter = self.converter_functions.get(name)
+            data[name] = converter(value) if converter and value is not None else value
+        return data
+
+    def many(self, rows):
+        with timer("serialize"):
+            return [self.to_representation(row) for row in rows]
+
+
+class AuthorValuesSerializer(ValuesSerializer):
+    """
+    Fast read path producing the same output as ``AuthorSerializer``.
+    """
+
+    fields = ["id", "name", "bio", "birth_date", "updated_at"]
+    converters = {
+        "id": serializers.UUIDField,
+        "birth_date": serializers.DateField,
+        "updated_at": serializers.DateTimeField,
+    }
+
+
+class AuthorBookCountValuesSerializer(AuthorValuesSerializer):
+    """
+    Author output of the author endpoints, with the number of books of each
+    author read from a ``book_count`` annotation.
+    """
+
+    fields = AuthorValuesSerializer.fields + ["book_count"]
+
+
+class BookValuesSerializer(ValuesSerializer):
+    """
+    Fast read path producing the same output as ``BookSerializer``.
+    """
+
+    fields = ["id", "title", "description", "publish_date", "updated_at", "author"]
+    converters = {
+        "id": serializers.UUIDField,
+        "publish_date": serializers.DateField,
+        "updated_at": serializers.DateTimeField,
+    }
+    nested = {"author": AuthorValuesSerializer}
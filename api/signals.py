@@ -0,0 +1,129 @@
+import threading
+from contextlib import contextmanager
+from functools import partial
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .cache import (
+    AUTHORS,
+    BOOKS,
+    author_books,
+    author_tag,
+    book_tag,
+    bump_generations,
+    invalidate_tags,
+)
+from .changes import log_changes
+from .models import Author, Book, Change
+from .replicas import record_write
+
+_batch = threading.local()
+
+
+@contextmanager
+def batch_invalidation():
+    """
+    Collect the invalidations of every write inside the block and apply them
+    once on exit, instead of once per row.
+    """
+    if getattr(_batch, "pending", None) is not None:
+        yield
+        return
+    _batch.pending = (set(), set())
+    try:
+        yield
+    finally:
+        namespaces, tags = _batch.pending
+        _batch.pending = None
+        if namespaces or tags:
+            invalidate_on_commit(namespaces, tags)
+
+
+def invalidate(namespaces, tags):
+    pending = getattr(_batch, "pending", None)
+    if pending is None:
+        invalidate_on_commit(namespaces, tags)
+        return
+    pending[0].update(namespaces)
+    pending[1].update(tags)
+
+
+def invalidate_on_commit(namespaces, tags):
+    """
+    Apply invalidations once the current transaction commits, or now
+    outside of one. Applied before the commit, a concurrent read could
+    cache the rows being replaced under the new generation.
+    """
+    if connection.in_atomic_block:
+        transaction.on_commit(partial(apply_invalidation, namespaces, tags))
+    else:
+        apply_invalidation(namespaces, tags)
+
+
+def apply_invalidation(namespaces, tags):
+    record_write()
+    if namespaces:
+        bump_generations(*namespaces)
+    if tags:
+        invalidate_tags(*tags)
+
+
+def invalidate_author(author):
+    """
+    Evict cached responses that embed the author.
+    """
+    invalidate([AUTHORS, author_books(author.pk)], [author_tag(author.pk)])
+
+
+def invalidate_book(book):
+    """
+    Evict cached responses that embed the book, or the book list or book
+    count of its author, including the author it was loaded with if it
+    moved to another author.
+    """
+    books_of = [author_books(book.author_id)]
+    loaded_author_id = getattr(book, "_loaded_author_id", None)
+    if loaded_author_id and loaded_author_id != book.author_id:
+        books_of.append(author_books(loaded_author_id))
+    # Author detail entries are tagged with author_books() for their book count
+    invalidate([BOOKS, *books_of], [book_tag(book.pk), *books_of])
+    book._loaded_author_id = book.author_id
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_delete, sender=Author)
+def invalidate_author_cache(sender, instance, **kwargs):
+    """
+    Evict cached responses that embed the saved or deleted author.
+    """
+    invalidate_author(instance)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_book_cache(sender, instance, **kwargs):
+    """
+    Evict cached responses that embed the saved or deleted book.
+    """
+    invalidate_book(instance)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Book)
+def log_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Record the creation or update of an author or book in the change log.
+    """
+    if raw:
+        # Loaded from a fixture
+        return
+    log_changes([instance], Change.CREATE if created else Change.UPDATE)
+
+
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Book)
+def log_delete(sender, instance, **kwargs):
+    """
+    Record the deletion of an author or book in the change log.
+    """
+    log_changes([instance], Change.DELETE)
@@ -1,8 +1,74 @@
+import gzip
+import json
+import os
+import tempfile
+import time
 import unittest
+from datetime import timedelta
+from unittest.mock import patch
+from io import StringIO
+from uuid import uuid4
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.test import AsyncRequestFactory, SimpleTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django_redis import get_redis_connection
 from django.urls import reverse
-from rest_framework import status
+from django.utils.asyncio import async_unsafe
+from django.utils import timezone
+from rest_framework import serializers, status
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
-from .models import Author, Book
+from .cache import (
+    AUTHORS,
+    BOOKS,
+    MISSING,
+    LocalCache,
+    author_books,
+    bump_generations,
+    get_async_redis,
+    get_generations,
+    get_local_cache,
+    versioned_key,
+)
+from .async_views import AsyncReadView
+from .ids import new_id, uuid7
+from .management.commands import benchmark_api
+from .models import Author, Book, Change, ImportCheckpoint
+from . import metrics, replicas, warming
+from .replicas import PIN_COOKIE, PIN_HEADER, ReplicaRouter, replica_reads
+from .filters import BookFilterBackend, prefix_range
+from .pagination import BookPagination
+from .serializers import (
+    AuthorSerializer,
+    AuthorValuesSerializer,
+    BookSerializer,
+    BookValuesSerializer,
+)
+from .views import AuthorViewSet, BookViewSet, parse_uuid
+from .signals import invalidate
+
+
+def run_now(func, using=None, robust=False):
+    func()
+
+
+class CommitCallbacksMixin:
+    """
+    Run ``on_commit`` callbacks, such as cache invalidations, right away.
+    Each test runs in a transaction that never commits, while the writes it
+    makes would commit on their own outside of tests.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        patcher = patch.object(transaction, "on_commit", run_now)
+        patcher.start()
+        cls.addClassCleanup(patcher.stop)
 
 
 class AuthorAPITestCase(APITestCase):
@@ -58,8 +124,10 @@ class AuthorAPITestCase(APITestCase):
         url = reverse("api:authors-get-books", args=[self.author.id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["title"], self.book.title)
+        self.assertEqual(response.data["author"]["name"], self.author.name)
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["title"], self.book.title)
+        self.assertNotIn("author", response.data["results"][0])
 
     def test_get_nonexistent_author_books(self):
         url = reverse("api:authors-detail", args=["nonexistent-id"])
@@ -173,5 +241,1934 @@ class BookAPITestCase(APITestCase):
         self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
 
 
+class PaginationTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Mystery Novel {index}",
+                description="A thrilling mystery novel.",
+                publish_date=f"2023-01-0{index % 3 + 1}",
+                author=self.author,
+            )
+            for index in range(5)
+        ]
+
+    def test_list_books_follows_cursor(self):
+        url = reverse("api:books-list")
+        response = self.client.get(url, {"page_size": 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["previous"])
+
+        ids = []
+        pages = [response.data]
+        while pages[-1]["next"]:
+            pages.append(self.client.get(pages[-1]["next"]).data)
+        for page in pages:
+            ids.extend(book["id"] for book in page["results"])
+
+        expected = sorted(self.books, key=lambda book: (book.publish_date, book.id))
+        self.assertEqual(ids, [str(book.id) for book in expected])
+        self.assertEqual(len(pages), 3)
+
+        previous = self.client.get(pages[-1]["previous"]).data
+        self.assertEqual(previous["results"], pages[-2]["results"])
+
+    def test_links_do_not_depend_on_the_host(self):
+        url = reverse("api:books-list")
+        first = self.client.get(url, {"page_size": 2}, secure=True)
+        self.assertTrue(first.data["next"].startswith(f"{url}?"))
+        # Served from the cache to a client on another host
+        second = self.client.get(url, {"page_size": 2}, HTTP_HOST="example.com")
+        self.assertEqual(second["X-Cache"], "HIT")
+        self.assertEqual(second.data["next"], first.data["next"])
+
+    @patch.object(BookPagination, "max_page_size", 3)
+    def test_list_books_clamps_page_size(self):
+        url = reverse("api:books-list")
+        response = self.client.get(url, {"page_size": 1000})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["results"]), 3)
+
+    def test_list_books_with_invalid_cursor(self):
+        url = reverse("api:books-list")
+        response = self.client.get(url, {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_authors_is_paginated(self):
+        url = reverse("api:authors-list")
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["results"][0]["name"], self.author.name)
+        self.assertIsNone(response.data["next"])
+
+    def test_create_book_invalidates_list_pages(self):
+        url = reverse("api:books-list")
+        self.client.get(url)
+        Book.objects.create(
+            title="Another Novel",
+            description="Another thrilling novel.",
+            publish_date="2024-01-01",
+            author=self.author,
+        )
+        self.client.post(
+            url,
+            {
+                "title": "Fresh Novel",
+                "description": "A fresh novel.",
+                "publish_date": "2024-02-01",
+                "author_id": self.author.id,
+            },
+        )
+        response = self.client.get(url)
+        self.assertEqual(len(response.data["results"]), 7)
+
+
+class CacheInvalidationTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.other_author = Author.objects.create(
+            name="Jane Roe",
+            bio="A writer of thrillers.",
+            birth_date="1980-01-01",
+        )
+        self.book = Book.objects.create(
+            title="Mystery Novel",
+            description="A thrilling mystery novel.",
+            publish_date="2023-01-01",
+            author=self.author,
+        )
+
+    def test_author_rename_invalidates_embedded_author(self):
+        book_url = reverse("api:books-detail", args=[self.book.id])
+        list_url = reverse("api:books-list")
+        books_url = reverse("api:authors-get-books", args=[self.author.id])
+        self.client.get(book_url)
+        self.client.get(list_url)
+        self.client.get(books_url)
+
+        self.author.name = "Johnny Doe"
+        self.author.save()
+
+        response = self.client.get(book_url)
+        self.assertEqual(response.data["author"]["name"], "Johnny Doe")
+        response = self.client.get(list_url)
+        self.assertEqual(response.data["results"][0]["author"]["name"], "Johnny Doe")
+        response = self.client.get(books_url)
+        self.assertEqual(response.data["author"]["name"], "Johnny Doe")
+
+    def test_moving_book_invalidates_both_author_book_lists(self):
+        old_url = reverse("api:authors-get-books", args=[self.author.id])
+        new_url = reverse("api:authors-get-books", args=[self.other_author.id])
+        self.assertEqual(len(self.client.get(old_url).data["results"]), 1)
+        self.assertEqual(len(self.client.get(new_url).data["results"]), 0)
+
+        self.book.author = self.other_author
+        self.book.save()
+
+        self.assertEqual(len(self.client.get(old_url).data["results"]), 0)
+        self.assertEqual(len(self.client.get(new_url).data["results"]), 1)
+
+    def test_unrelated_write_keeps_cached_entries(self):
+        url = reverse("api:authors-detail", args=[self.author.id])
+        self.client.get(url)
+        self.other_author.name = "Janet Roe"
+        self.other_author.save()
+        self.assertIsNotNone(cache.get(f"author_{self.author.id}"))
+
+    def test_book_write_bumps_generations(self):
+        namespaces = [BOOKS, AUTHORS, author_books(self.author.id)]
+        books, authors, author_books_generation = get_generations(*namespaces)
+        self.book.title = "New Mystery Novel"
+        self.book.save()
+        self.assertEqual(
+            get_generations(*namespaces),
+            [books + 1, authors, author_books_generation + 1],
+        )
+
+    def test_author_delete_invalidates_cached_book(self):
+        url = reverse("api:books-detail", args=[self.book.id])
+        self.client.get(url)
+        self.author.delete()
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class TransactionInvalidationTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+
+    def test_invalidation_waits_for_commit(self):
+        url = reverse("api:books-list")
+        self.client.get(url)
+        generations = get_generations(BOOKS)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                Book.objects.create(
+                    title="Book 1",
+                    description="A book.",
+                    publish_date="2020-01-01",
+                    author=self.author,
+                )
+                # Until the commit, readers still use the current generation,
+                # so whatever they cache is replaced once it commits.
+                self.assertEqual(get_generations(BOOKS), generations)
+                self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertNotEqual(get_generations(BOOKS), generations)
+        response = self.client.get(url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 1)
+
+    def test_invalidation_outside_a_transaction_is_immediate(self):
+        generations = get_generations(BOOKS)
+        # TestCase wraps every test in a transaction; pretend it is not there.
+        with patch.object(connection, "in_atomic_block", False):
+            invalidate([BOOKS], [])
+        self.assertNotEqual(get_generations(BOOKS), generations)
+
+
+class StampedeProtectionTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.book = Book.objects.create(
+            title="Mystery Novel",
+            description="A thrilling mystery novel.",
+            publish_date="2023-01-01",
+            author=self.author,
+        )
+        self.url = reverse("api:books-list")
+
+    def lock_first_page(self, timeout=5):
+        page_key = f"{BookPagination.page_size}_first"
+        cache_key = versioned_key("all_books", [BOOKS, AUTHORS], page_key)
+        lock = cache.lock(f"lock:{cache_key}", timeout=timeout)
+        lock.acquire(blocking=False)
+        return lock
+
+    def test_list_reports_cache_status(self):
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+    def test_serves_stale_page_while_locked(self):
+        self.client.get(self.url)
+        Book.objects.create(
+            title="Another Novel",
+            description="Another thrilling novel.",
+            publish_date="2024-01-01",
+            author=self.author,
+        )
+
+        lock = self.lock_first_page()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "STALE")
+        self.assertEqual(len(response.data["results"]), 1)
+        lock.release()
+
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 2)
+
+    def test_computes_page_when_lock_holder_gives_up(self):
+        self.lock_first_page(timeout=0.2)
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(len(response.data["results"]), 1)
+
+    @override_settings(CACHE_EARLY_REFRESH_BETA=1e9)
+    def test_early_refresh_recomputes_before_expiry(self):
+        self.client.get(self.url)
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+
+
+class NegativeCacheTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+
+    def test_empty_author_list_is_cached(self):
+        url = reverse("api:authors-list")
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.data["results"], [])
+
+    def test_unknown_author_is_cached(self):
+        url = reverse("api:authors-detail", args=[uuid4()])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_malformed_book_id_skips_cache_and_database(self):
+        url = reverse("api:books-detail", args=["nonexistent-id"])
+        with self.assertNumQueries(0), patch.object(cache, "get") as cache_get:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        cache_get.assert_not_called()
+
+    def test_creating_missing_book_evicts_negative_entry(self):
+        pk = uuid4()
+        url = reverse("api:books-detail", args=[pk])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+        author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        Book.objects.create(
+            id=pk,
+            title="Mystery Novel",
+            description="A thrilling mystery novel.",
+            publish_date="2023-01-01",
+            author=author,
+        )
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+@override_settings(CACHE_L1_ENABLED=True)
+class LocalCacheTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.local = get_local_cache()
+        self.local.clear()
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.url = reverse("api:authors-detail", args=[self.author.id])
+
+    def test_retrieve_is_served_from_local_cache(self):
+        self.client.get(self.url)
+        with patch.object(cache, "get") as cache_get:
+            response = self.client.get(self.url)
+        self.assertEqual(response.data["name"], self.author.name)
+        cache_get.assert_not_called()
+
+    def test_write_evicts_local_entry(self):
+        self.client.get(self.url)
+        self.author.name = "Jane Doe"
+        self.author.save()
+        self.assertIs(self.local.get(f"author_{self.author.id}"), MISSING)
+        self.assertEqual(self.client.get(self.url).data["name"], "Jane Doe")
+
+    def test_published_invalidation_evicts_local_entry(self):
+        self.local.set("book_remote", "value")
+        get_redis_connection("default").publish(
+            settings.CACHE_INVALIDATION_CHANNEL, json.dumps(["book_remote"])
+        )
+        deadline = time.monotonic() + 2
+        while self.local.get("book_remote") is not MISSING:
+            self.assertLess(time.monotonic(), deadline)
+            time.sleep(0.01)
+
+
+class LocalCacheEvictionTestCase(SimpleTestCase):
+
+    def test_evicts_least_recently_used_entry(self):
+        local = LocalCache(max_entries=2, timeout=60)
+        local.set("a", 1)
+        local.set("b", 2)
+        local.get("a")
+        local.set("c", 3)
+        self.assertEqual(local.get("a"), 1)
+        self.assertIs(local.get("b"), MISSING)
+        self.assertEqual(local.get("c"), 3)
+
+    def test_entries_expire(self):
+        local = LocalCache(max_entries=2, timeout=60)
+        local.set("a", 1, timeout=0)
+        self.assertIs(local.get("a"), MISSING)
+
+
+class RenderedCacheTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.url = reverse("api:authors-detail", args=[self.author.id])
+
+    def test_hit_returns_cached_bytes_without_serializing(self):
+        first = self.client.get(self.url)
+        with patch.object(AuthorSerializer, "to_representation") as to_representation:
+            second = self.client.get(self.url)
+        to_representation.assert_not_called()
+        self.assertEqual(second.content, first.content)
+        self.assertEqual(second["Content-Type"], "application/json")
+        self.assertEqual(second["ETag"], first["ETag"])
+        self.assertEqual(second.json()["name"], self.author.name)
+
+    @override_settings(CACHE_COMPRESS_MIN_SIZE=1)
+    def test_compressed_entry_is_passed_through_to_gzip_clients(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        data = json.loads(gzip.decompress(response.content))
+        self.assertEqual(data["name"], self.author.name)
+
+        response = self.client.get(self.url)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(response.json()["name"], self.author.name)
+
+    @override_settings(CACHE_COMPRESS_MIN_SIZE=1)
+    def test_gzipped_body_has_its_own_etag(self):
+        identity = self.client.get(self.url)
+        gzipped = self.client.get(self.url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(gzipped["Content-Encoding"], "gzip")
+        self.assertNotEqual(gzipped["ETag"], identity["ETag"])
+
+        response = self.client.get(
+            self.url,
+            HTTP_ACCEPT_ENCODING="gzip",
+            HTTP_IF_NONE_MATCH=gzipped["ETag"],
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=gzipped["ETag"])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["ETag"], identity["ETag"])
+
+        # A list ETag is checked before the entry is read, in both forms.
+        url = reverse("api:authors-list")
+        etag = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip")["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    @override_settings(CACHE_COMPRESS_MIN_SIZE=1)
+    def test_accept_encoding_quality_values(self):
+        self.client.get(self.url)
+        for accept_encoding, gzipped in [
+            ("gzip;q=0", False),
+            ("gzip; q=0.0, identity", False),
+            ("identity;q=1, gzip;q=0.5", True),
+            ("*", True),
+            ("*, gzip;q=0", False),
+            ("br", False),
+        ]:
+            with self.subTest(accept_encoding):
+                response = self.client.get(
+                    self.url, HTTP_ACCEPT_ENCODING=accept_encoding
+                )
+                self.assertEqual(response.has_header("Content-Encoding"), gzipped)
+
+    def test_browsable_api_renders_cached_entry(self):
+        self.client.get(self.url)
+        response = self.client.get(self.url, HTTP_ACCEPT="text/html")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn("text/html", response["Content-Type"])
+        self.assertContains(response, self.author.name)
+
+
+class ConditionalGetTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.book = Book.objects.create(
+            title="Mystery Novel",
+            description="A thrilling mystery novel.",
+            publish_date="2023-01-01",
+            author=self.author,
+        )
+
+    def test_retrieve_with_matching_etag(self):
+        url = reverse("api:authors-detail", args=[self.author.id])
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response["ETag"], etag)
+
+    def test_retrieve_with_if_modified_since(self):
+        url = reverse("api:books-detail", args=[self.book.id])
+        last_modified = self.client.get(url)["Last-Modified"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_book_count_change_modifies_author(self):
+        url = reverse("api:authors-detail", args=[self.author.id])
+        response = self.client.get(url)
+        last_modified = response["Last-Modified"]
+        self.book.delete()
+        # Rebuilt a second later than the entry the client has
+        later = time.time() + 1
+        with patch("api.responses.time") as mock_time:
+            mock_time.time.return_value = later
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["book_count"], 0)
+
+    def test_list_with_matching_etag_skips_cached_page(self):
+        url = reverse("api:books-list")
+        etag = self.client.get(url)["ETag"]
+        with patch.object(cache, "get_many") as get_many:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        get_many.assert_not_called()
+
+    def test_wildcard_does_not_hide_missing_author(self):
+        url = reverse("api:authors-get-books", args=[uuid4()])
+        response = self.client.get(url, HTTP_IF_NONE_MATCH="*")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_write_changes_etag(self):
+        url = reverse("api:books-list")
+        etag = self.client.get(url)["ETag"]
+        self.author.name = "Jane Doe"
+        self.author.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+
+
+class ValuesSerializerParityTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        authors = [
+            Author.objects.create(
+                name="José Saramago",
+                bio='A Portuguese writer.\nNobel "laureate".',
+                birth_date="1922-11-16",
+            ),
+            Author.objects.create(
+                name="村上春樹",
+                bio="",
+                birth_date="1949-01-12",
+            ),
+        ]
+        for index, author in enumerate(authors):
+            Book.objects.create(
+                title=f"Novel {index}",
+                description="A novel with <markup> & ümlauts.",
+                publish_date="2001-02-03",
+                author=author,
+            )
+
+    def assertSameBytes(self, expected, actual):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(expected), renderer.render(actual))
+
+    def test_author_output_matches_model_serializer(self):
+        queryset = Author.objects.order_by("id")
+        serializer = AuthorValuesSerializer()
+        self.assertSameBytes(
+            AuthorSerializer(queryset, many=True).data,
+            serializer.many(serializer.values(queryset)),
+        )
+
+    def test_book_output_matches_model_serializer(self):
+        queryset = Book.objects.select_related("author").order_by("id")
+        serializer = BookValuesSerializer()
+        self.assertSameBytes(
+            BookSerializer(queryset, many=True).data,
+            serializer.many(serializer.values(queryset)),
+        )
+
+    @override_settings(TIME_ZONE="Asia/Jakarta")
+    def test_book_output_matches_in_other_time_zone(self):
+        book = Book.objects.select_related("author").first()
+        serializer = BookValuesSerializer()
+        row = serializer.values(Book.objects.filter(pk=book.pk)).get()
+        self.assertSameBytes(
+            BookSerializer(book).data, serializer.to_representation(row)
+        )
+
+    def test_book_endpoints_match_model_serializer(self):
+        book = Book.objects.select_related("author").first()
+        url = reverse("api:books-detail", args=[book.id])
+        response = self.client.get(url)
+        self.assertEqual(
+            response.content, JSONRenderer().render(BookSerializer(book).data)
+        )
+
+
+class SparseFieldsetTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.book = Book.objects.create(
+            title="Mystery Novel",
+            description="A thrilling mystery novel.",
+            publish_date="2023-01-01",
+            author=self.author,
+        )
+
+    def test_list_books_with_fields(self):
+        url = reverse("api:books-list")
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"fields": "title,id"})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [{"id": str(self.book.id), "title": self.book.title}],
+        )
+        sql = queries[-1]["sql"]
+        self.assertNotIn("description", sql)
+        self.assertNotIn("api_author", sql)
+
+    def test_retrieve_book_with_unexpanded_author(self):
+        url = reverse("api:books-detail", args=[self.book.id])
+        response = self.client.get(url, {"fields": "id,author"})
+        self.assertEqual(
+            response.data, {"id": str(self.book.id), "author": str(self.author.id)}
+        )
+
+    def test_retrieve_book_with_expanded_author(self):
+        url = reverse("api:books-detail", args=[self.book.id])
+        response = self.client.get(url, {"fields": "id,author", "expand": "author"})
+        self.assertEqual(response.data["author"]["name"], self.author.name)
+
+    def test_field_selection_is_part_of_cache_key(self):
+        url = reverse("api:authors-detail", args=[self.author.id])
+        self.client.get(url, {"fields": "name"})
+        response = self.client.get(url)
+        self.assertEqual(response.data["bio"], self.author.bio)
+        response = self.client.get(url, {"fields": "name"})
+        self.assertEqual(response.data, {"name": self.author.name})
+
+    def test_unknown_field_is_rejected(self):
+        url = reverse("api:authors-list")
+        response = self.client.get(url, {"fields": "name,secret"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {"expand": "books"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BulkEndpointTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.authors = [
+            Author.objects.create(
+                name=f"Author {index}", bio="Bio", birth_date="1970-01-01"
+            )
+            for index in range(3)
+        ]
+        self.url = reverse("api:books-bulk-create")
+
+    def book_data(self, index, author):
+        return {
+            "title": f"Book {index}",
+            "description": "Description",
+            "publish_date": "2023-01-01",
+            "author_id": str(author.id),
+        }
+
+    def test_bulk_create_books(self):
+        items = [self.book_data(index, self.authors[index % 3]) for index in range(30)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data), 30)
+        self.assertEqual(response.data[0]["author"]["name"], "Author 0")
+        self.assertEqual(Book.objects.count(), 30)
+        author_queries = [q for q in queries if 'FROM "api_author"' in q["sql"]]
+        self.assertEqual(len(author_queries), 1)
+
+    def test_bulk_create_reports_errors_per_item(self):
+        items = [
+            self.book_data(0, self.authors[0]),
+            {**self.book_data(1, self.authors[0]), "author_id": str(uuid4())},
+            {**self.book_data(2, self.authors[0]), "title": ""},
+        ]
+        response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        errors = response.data["errors"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("author_id", errors[1])
+        self.assertIn("title", errors[2])
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_bulk_create_rejects_oversized_batches(self):
+        items = [self.book_data(0, self.authors[0])] * 3
+        with override_settings(BULK_MAX_ITEMS=2):
+            response = self.client.post(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.post(self.url, {"title": "x"}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update_books(self):
+        books = [
+            Book.objects.create(
+                title=f"Book {index}", publish_date="2023-01-01", author=self.authors[0]
+            )
+            for index in range(2)
+        ]
+        books_url = reverse("api:authors-get-books", args=[self.authors[1].id])
+        self.assertEqual(self.client.get(books_url).data["results"], [])
+
+        items = [
+            {"id": str(books[0].id), "title": "Renamed"},
+            {"id": str(books[1].id), "author_id": str(self.authors[1].id)},
+        ]
+        response = self.client.patch(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        books[0].refresh_from_db()
+        self.assertEqual(books[0].title, "Renamed")
+        self.assertEqual(len(self.client.get(books_url).data["results"]), 1)
+
+    def test_bulk_update_reports_unknown_and_duplicate_ids(self):
+        book = Book.objects.create(
+            title="Book", publish_date="2023-01-01", author=self.authors[0]
+        )
+        items = [
+            {"id": str(book.id), "title": "Renamed"},
+            {"id": str(book.id), "title": "Again"},
+            {"id": str(uuid4()), "title": "Missing"},
+        ]
+        response = self.client.patch(self.url, items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(
+            response.data["errors"],
+            [{}, {"id": ["Duplicate id."]}, {"id": ["Not found."]}],
+        )
+        book.refresh_from_db()
+        self.assertEqual(book.title, "Book")
+
+    def test_bulk_delete_authors_invalidates_once(self):
+        Book.objects.create(
+            title="Book", publish_date="2023-01-01", author=self.authors[0]
+        )
+        url = reverse("api:authors-bulk-create")
+        ids = [str(author.id) for author in self.authors[:2]]
+        with patch("api.signals.bump_generations") as bump:
+            response = self.client.delete(url, ids, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(bump.call_count, 1)
+        self.assertEqual(Author.objects.count(), 1)
+        self.assertEqual(Book.objects.count(), 0)
+
+    def test_bulk_delete_reports_unknown_ids(self):
+        url = reverse("api:authors-bulk-create")
+        ids = [str(self.authors[0].id), str(uuid4())]
+        response = self.client.delete(url, ids, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["errors"], [{}, {"id": ["Not found."]}])
+        self.assertEqual(Author.objects.count(), 3)
+
+
+class ExportTestCase(APITestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe",
+            bio="A prolific writer of mystery novels.",
+            birth_date="1970-01-01",
+        )
+        self.books = [
+            Book.objects.create(
+                title=f"Book {index}",
+                description="Description",
+                publish_date="2023-01-01",
+                author=self.author,
+            )
+            for index in range(3)
+        ]
+        self.url = reverse("api:books-export")
+
+    def export(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, b"".join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        response, content = self.export()
+        self.assertTrue(response["Content-Type"].startswith("application/x-ndjson"))
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["title"] for row in rows], ["Book 0", "Book 1", "Book 2"])
+        self.assertEqual(rows[0], BookSerializer(self.books[0]).data)
+
+    def test_export_csv(self):
+        response, content = self.export(format="csv")
+        self.assertTrue(response["Content-Type"].startswith("text/csv"))
+        lines = content.splitlines()
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(
+            lines[0],
+            "id,title,description,publish_date,updated_at,author_id,author_name,"
+            "author_bio,author_birth_date,author_updated_at",
+        )
+        self.assertIn("John Doe", lines[1])
+
+    @override_settings(EXPORT_SETTLE_SECONDS=0)
+    def test_export_since(self):
+        response, _ = self.export()
+        since = response["X-Export-Timestamp"]
+        self.books[1].title = "Renamed"
+        self.books[1].save()
+
+        _, content = self.export(since=since)
+        rows = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([row["title"] for row in rows], ["Renamed"])
+
+        self.author.save()
+        _, content = self.export(since=since)
+        self.assertEqual(len(content.splitlines()), 3)
+
+    @override_settings(EXPORT_SETTLE_SECONDS=60)
+    def test_export_timestamp_leaves_a_margin(self):
+        response, _ = self.export()
+        since = serializers.DateTimeField().to_internal_value(
+            response["X-Export-Timestamp"]
+        )
+        self.assertLessEqual(since, timezone.now() - timedelta(seconds=60))
+        # A write committed after the export started, with an earlier
+        # updated_at, is still in the next export.
+        Book.objects.filter(pk=self.books[0].pk).update(
+            updated_at=timezone.now() - timedelta(seconds=1)
+        )
+        _, content = self.export(since=response["X-Export-Timestamp"])
+        self.assertEqual(len(content.splitlines()), 3)
+
+    def test_export_rejects_invalid_since(self):
+        response = self.client.get(self.url, {"since": "yesterday"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ImportCatalogTestCase(APITestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, name)
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(content)
+        return path
+
+    def import_catalog(self, path, *args):
+        stdout = StringIO()
+        call_command("import_catalog", path, *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_import_csv_deduplicates_authors(self):
+        existing = Author.objects.create(
+            name="Jane Roe", bio="Existing", birth_date="1980-01-01"
+        )
+        path = self.write(
+            "catalog.csv",
+            "title,description,publish_date,author_name,author_bio,author_birth_date\n"
+            "Book 1,One,2023-01-01,John Doe,Bio,1970-01-01\n"
+            "Book 2,Two,2023-02-01,John Doe,Bio,1970-01-01\n"
+            "Book 3,Three,2023-03-01,Jane Roe,Bio,1980-01-01\n"
+            "Book 4,Four,not a date,Jane Roe,Bio,1980-01-01\n",
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.import_catalog(path, "--batch-size", "100")
+        statements = [query["sql"].split()[0] for query in queries]
+        # The known authors, the ids of the batch that already exist and the
+        # checkpoint
+        self.assertEqual(statements.count("SELECT"), 4)
+        # The authors, the books, their change log entries and the checkpoint
+        self.assertEqual(statements.count("INSERT"), 5)
+        self.assertEqual(Author.objects.count(), 2)
+        self.assertEqual(Book.objects.count(), 3)
+        self.assertEqual(Book.objects.get(title="Book 3").author, existing)
+        self.assertEqual(Book.objects.filter(author__name="John Doe").count(), 2)
+
+    def test_import_round_trips_export(self):
+        author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        book = Book.objects.create(
+            title="Book", description="One", publish_date="2023-01-01", author=author
+        )
+        response = self.client.get(reverse("api:books-export"))
+        path = self.write(
+            "catalog.ndjson", b"".join(response.streaming_content).decode()
+        )
+        Author.objects.all().delete()
+
+        self.import_catalog(path)
+        self.assertEqual(Book.objects.get().id, book.id)
+        self.assertEqual(Author.objects.get().id, author.id)
+
+    def test_only_inserted_rows_are_logged(self):
+        author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        Book.objects.create(
+            title="Book", description="One", publish_date="2023-01-01", author=author
+        )
+        response = self.client.get(reverse("api:books-export"))
+        path = self.write(
+            "catalog.ndjson", b"".join(response.streaming_content).decode()
+        )
+        Book.objects.all().delete()
+        Change.objects.all().delete()
+
+        # Twice: the second import finds every id already there.
+        self.import_catalog(path)
+        output = self.import_catalog(path)
+        self.assertIn("Imported 0 books", output)
+        self.assertIn("1 books that already existed", output)
+        changes = Change.objects.values_list("resource", "action")
+        self.assertEqual(list(changes), [("book", Change.CREATE)])
+        self.assertEqual(Change.objects.get().data["title"], "Book")
+
+    def write_books(self, count):
+        rows = "".join(
+            f'{{"title": "Book {index}", "description": "", '
+            f'"publish_date": "2023-01-01", "author": {{"name": "John Doe", '
+            f'"bio": "", "birth_date": "1970-01-01"}}}}\n'
+            for index in range(count)
+        )
+        return self.write("catalog.ndjson", rows)
+
+    def test_resume_from_checkpoint(self):
+        path = self.write_books(5)
+        ImportCheckpoint.objects.create(path=os.path.abspath(path), rows=3)
+
+        self.import_catalog(path, "--resume", "--batch-size", "1")
+        titles = sorted(Book.objects.values_list("title", flat=True))
+        self.assertEqual(titles, ["Book 3", "Book 4"])
+        self.assertFalse(ImportCheckpoint.objects.exists())
+
+    def test_checkpoint_is_committed_with_its_batch(self):
+        path = self.write_books(5)
+        # The second batch fails after its books are inserted.
+        with patch(
+            "api.management.commands.import_catalog.log_changes",
+            side_effect=[None, None, None, RuntimeError],
+        ):
+            with self.assertRaises(RuntimeError):
+                self.import_catalog(path, "--batch-size", "2")
+        self.assertEqual(ImportCheckpoint.objects.get().rows, 2)
+        self.assertEqual(Book.objects.count(), 2)
+
+        self.import_catalog(path, "--resume", "--batch-size", "2")
+        titles = sorted(Book.objects.values_list("title", flat=True))
+        self.assertEqual(titles, [f"Book {index}" for index in range(5)])
+
+    def test_malformed_lines_are_skipped(self):
+        book = (
+            '{"title": "Book", "description": "", "publish_date": "2023-01-01", '
+            '"author": {"name": "John Doe", "bio": "", "birth_date": "1970-01-01"}}'
+        )
+        path = self.write(
+            "catalog.ndjson", f'{{"title": "Broken\n\n[1, 2]\n"text"\n{book}\n'
+        )
+        stderr = StringIO()
+        call_command("import_catalog", path, stdout=StringIO(), stderr=stderr)
+        self.assertEqual(list(Book.objects.values_list("title", flat=True)), ["Book"])
+        # Reported by line number
+        skipped = [line.split(":")[0] for line in stderr.getvalue().splitlines()]
+        self.assertEqual(
+            skipped, ["Skipping row 1", "Skipping row 3", "Skipping row 4"]
+        )
+
+    def test_rows_with_long_fields_are_skipped(self):
+        path = self.write(
+            "catalog.csv",
+            "title,description,publish_date,author_name,author_bio,author_birth_date\n"
+            f"{'x' * 256},One,2023-01-01,John Doe,Bio,1970-01-01\n"
+            f"Book 2,Two,2023-02-01,{'x' * 256},Bio,1970-01-01\n"
+            "Book 3,Three,2023-03-01,John Doe,Bio,1970-01-01\n",
+        )
+        output = self.import_catalog(path)
+        self.assertEqual(list(Book.objects.values_list("title", flat=True)), ["Book 3"])
+        self.assertIn("Imported 1 books", output)
+        self.assertIn("skipped 2 rows", output)
+
+
+class SeedDataTestCase(APITestCase):
+
+    def seed(self, *args):
+        call_command("seed_data", *args, stdout=StringIO())
+
+    def test_seed_creates_requested_rows(self):
+        self.seed("--authors", "25", "--books-per-author", "4", "--batch-size", "10")
+        self.assertEqual(Author.objects.count(), 25)
+        self.assertEqual(Book.objects.count(), 100)
+        self.assertEqual(
+            Change.objects.filter(resource="author", action=Change.CREATE).count(),
+            25,
+        )
+        self.assertEqual(
+            Change.objects.filter(resource="book", action=Change.CREATE).count(),
+            100,
+        )
+
+    def test_seed_is_reproducible(self):
+        args = ["--authors", "6", "--distribution", "uniform", "--seed", "42"]
+        self.seed(*args, "--batch-size", "2", "--workers", "1")
+        first = sorted(Book.objects.values_list("id", "title", "author_id"))
+        Author.objects.all().delete()
+
+        self.seed(*args, "--batch-size", "2", "--workers", "2")
+        self.assertEqual(
+            sorted(Book.objects.values_list("id", "title", "author_id")), first
+        )
+
+    @override_settings(ID_VERSION=7)
+    def test_seed_follows_id_version(self):
+        self.seed("--authors", "3", "--seed", "42", "--workers", "1")
+        ids = [*Author.objects.values_list("id", flat=True)]
+        ids += Book.objects.values_list("id", flat=True)
+        self.assertEqual({pk.version for pk in ids}, {7})
+
+    def test_pareto_distribution_has_the_requested_mean(self):
+        self.seed(
+            "--authors",
+            "2000",
+            "--books-per-author",
+            "5",
+            "--distribution",
+            "pareto",
+            "--seed",
+            "1",
+            "--workers",
+            "1",
+        )
+        self.assertAlmostEqual(Book.objects.count() / 2000, 5, delta=1)
+
+
+class SearchTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="Agatha Christie",
+            bio="English writer known for her detective novels.",
+            birth_date="1890-09-15",
+        )
+        self.mystery = Book.objects.create(
+            title="Murder on the Orient Express",
+            description="Hercule Poirot investigates a murder on a train.",
+            publish_date="1934-01-01",
+            author=self.author,
+        )
+        self.other = Book.objects.create(
+            title="The Mysterious Affair at Styles",
+            description="A country house murder.",
+            publish_date="1920-10-01",
+            author=self.author,
+        )
+        self.url = reverse("api:books-search")
+
+    def search(self, q, **params):
+        response = self.client.get(self.url, {"q": q, **params})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in response.data["results"]]
+
+    def test_search_ranks_title_matches_first(self):
+        self.assertEqual(
+            self.search("murder"),
+            ["Murder on the Orient Express", "The Mysterious Affair at Styles"],
+        )
+        self.assertEqual(self.search("poirot train"), [self.mystery.title])
+
+    def test_search_author_fields(self):
+        self.assertEqual(len(self.search("christie")), 2)
+        self.assertEqual(len(self.search("detective")), 2)
+
+    def test_index_follows_writes(self):
+        self.mystery.title = "Death on the Nile"
+        self.mystery.save()
+        self.assertEqual(self.search("nile"), ["Death on the Nile"])
+        self.assertEqual(self.search("orient"), [])
+
+        self.author.name = "Mary Westmacott"
+        self.author.save()
+        self.assertEqual(self.search("christie"), [])
+        self.assertEqual(len(self.search("westmacott")), 2)
+
+        self.other.delete()
+        self.assertEqual(self.search("styles"), [])
+
+    def test_bulk_created_books_are_indexed(self):
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title="The Big Four",
+                    description="",
+                    publish_date="1927-01-01",
+                    author=self.author,
+                )
+            ]
+        )
+        self.assertEqual(self.search("big four"), ["The Big Four"])
+
+    def test_search_is_paginated(self):
+        response = self.client.get(self.url, {"q": "murder", "page_size": 1})
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertIsNone(response.data["previous"])
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            response.data["results"][0]["title"], "The Mysterious Affair at Styles"
+        )
+        self.assertIsNone(response.data["next"])
+        self.assertIsNotNone(response.data["previous"])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(self.search('murder" OR NOT (*'), [])
+        self.assertEqual(len(self.search("Murder  -")), 2)
+
+    def test_invalid_requests(self):
+        response = self.client.get(self.url, {"q": "  "})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(self.url, {"q": "murder", "page": "x"})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class BookFilterTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        self.other_author = Author.objects.create(
+            name="Jane Roe", bio="Bio", birth_date="1980-01-01"
+        )
+        for title, publish_date, author in [
+            ("Alpha", "2020-01-01", self.author),
+            ("Alphabet", "2021-01-01", self.other_author),
+            ("alpine", "2022-01-01", self.author),
+            ("Beta", "2023-01-01", self.author),
+        ]:
+            Book.objects.create(
+                title=title, description="", publish_date=publish_date, author=author
+            )
+        self.url = reverse("api:books-list")
+
+    def titles(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [book["title"] for book in response.data["results"]]
+
+    def test_filter_by_author(self):
+        self.assertEqual(
+            self.titles(author=self.author.id), ["Alpha", "alpine", "Beta"]
+        )
+
+    def test_filter_by_publish_date_range(self):
+        self.assertEqual(
+            self.titles(published_after="2021-01-01", published_before="2022-06-30"),
+            ["Alphabet", "alpine"],
+        )
+
+    def test_filter_by_title_prefix(self):
+        self.assertEqual(self.titles(title__startswith="Alph"), ["Alpha", "Alphabet"])
+        self.assertEqual(self.titles(title__startswith="alp"), ["alpine"])
+
+    def test_title_prefix_ending_before_surrogates(self):
+        self.assertEqual(prefix_range("a\ud7ff"), "a\ue000")
+        self.assertEqual(prefix_range("a\U0010ffff"), "b")
+        self.assertEqual(self.titles(title__startswith="Alph\ud7ff"), [])
+
+    def test_ordering(self):
+        self.assertEqual(
+            self.titles(ordering="title"), ["Alpha", "Alphabet", "Beta", "alpine"]
+        )
+        self.assertEqual(
+            self.titles(ordering="-publish_date", author=self.author.id),
+            ["Beta", "alpine", "Alpha"],
+        )
+
+    def test_ordering_is_kept_across_pages(self):
+        response = self.client.get(self.url, {"ordering": "-title", "page_size": 2})
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]], ["alpine", "Beta"]
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]],
+            ["Alphabet", "Alpha"],
+        )
+
+        cursor = response.data["previous"].split("cursor=")[1]
+        response = self.client.get(self.url, {"cursor": cursor})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_invalid_parameters(self):
+        for params in (
+            {"author": "nope"},
+            {"published_after": "yesterday"},
+            {"ordering": "description"},
+        ):
+            response = self.client.get(self.url, params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_equivalent_filters_share_a_cache_entry(self):
+        response = self.client.get(self.url, {"author": str(self.author.id)})
+        self.assertEqual(response["X-Cache"], "MISS")
+        response = self.client.get(
+            self.url, {"author": str(self.author.id).upper(), "published_after": ""}
+        )
+        self.assertEqual(response["X-Cache"], "HIT")
+        response = self.client.get(self.url, {"author": str(self.other_author.id)})
+        self.assertEqual(response["X-Cache"], "MISS")
+
+    def test_filters_use_indexes(self):
+        backend = BookFilterBackend()
+        for params, index in (
+            ({"title__startswith": "Alph"}, "book_title_id_idx"),
+            ({"author": str(self.author.id)}, "book_author_publish_date_idx"),
+        ):
+            request = self.client.get(self.url, params).wsgi_request
+            request.query_params = request.GET
+            queryset = backend.filter_queryset(request, Book.objects.all(), None)
+            self.assertIn(index, queryset.order_by("publish_date", "id").explain())
+
+
+class AuthorBooksTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        self.other_author = Author.objects.create(
+            name="Jane Roe", bio="Bio", birth_date="1980-01-01"
+        )
+        for index in range(5):
+            Book.objects.create(
+                title=f"Book {index}",
+                description="",
+                publish_date=f"202{index}-01-01",
+                author=self.author,
+            )
+        self.url = reverse("api:authors-get-books", args=[self.author.id])
+
+    def test_books_are_paginated(self):
+        response = self.client.get(self.url, {"page_size": 2})
+        self.assertEqual(response.data["author"]["book_count"], 5)
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]], ["Book 0", "Book 1"]
+        )
+        response = self.client.get(response.data["next"])
+        self.assertEqual(
+            [book["title"] for book in response.data["results"]], ["Book 2", "Book 3"]
+        )
+
+    def test_books_page_is_cached_until_the_author_books_change(self):
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+        Book.objects.create(
+            title="Other",
+            description="",
+            publish_date="2020-01-01",
+            author=self.other_author,
+        )
+        self.assertEqual(self.client.get(self.url)["X-Cache"], "HIT")
+
+        Book.objects.filter(title="Book 0").get().delete()
+        response = self.client.get(self.url)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertEqual(response.data["author"]["book_count"], 4)
+
+    def test_book_count_without_n_plus_one(self):
+        for index in range(3):
+            Author.objects.create(
+                name=f"Author {index}", bio="Bio", birth_date="1990-01-01"
+            )
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse("api:authors-list"))
+        counts = {
+            author["name"]: author["book_count"] for author in response.data["results"]
+        }
+        self.assertEqual(counts["John Doe"], 5)
+        self.assertEqual(counts["Author 0"], 0)
+
+    def test_book_count_on_detail_follows_book_writes(self):
+        url = reverse("api:authors-detail", args=[self.author.id])
+        self.assertEqual(self.client.get(url).data["book_count"], 5)
+        Book.objects.create(
+            title="Book 5",
+            description="",
+            publish_date="2025-01-01",
+            author=self.author,
+        )
+        self.assertEqual(self.client.get(url).data["book_count"], 6)
+        list_url = reverse("api:authors-list")
+        self.assertEqual(self.client.get(list_url).data["results"][1]["book_count"], 6)
+
+
+class AsyncReadViewTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        self.book = Book.objects.create(
+            title="Book 1",
+            description="",
+            publish_date="2020-01-01",
+            author=self.author,
+        )
+        self.factory = AsyncRequestFactory()
+        self.list_view = AsyncReadView.as_view(
+            viewset_class=BookViewSet, basename="books"
+        )
+        self.detail_view = AsyncReadView.as_view(
+            viewset_class=BookViewSet, basename="books", detail=True
+        )
+
+    async def serve(self, view, request, **kwargs):
+        # Each async test runs in its own event loop: close the loop's Redis
+        # connections before it goes away.
+        try:
+            return await view(request, **kwargs)
+        finally:
+            await get_async_redis().aclose()
+
+    async def test_list_matches_sync_view(self):
+        url = reverse("api:books-list")
+        response = await self.serve(self.list_view, self.factory.get(url))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Cache"], "MISS")
+        self.assertIn("Accept", response["Vary"])
+
+        response = await self.serve(self.list_view, self.factory.get(url))
+        self.assertEqual(response["X-Cache"], "HIT")
+        sync_response = await self.async_client.get(url)
+        self.assertEqual(sync_response["X-Cache"], "HIT")
+        self.assertEqual(json.loads(response.content), sync_response.json())
+
+    async def test_list_is_served_by_the_async_orm(self):
+        url = reverse("api:authors-list")
+        view = AsyncReadView.as_view(viewset_class=AuthorViewSet, basename="authors")
+        response = await self.serve(
+            view, self.factory.get(url, {"fields": "name,book_count"})
+        )
+        self.assertEqual(
+            json.loads(response.content)["results"],
+            [{"name": "John Doe", "book_count": 1}],
+        )
+
+    @override_settings(DATABASE_REPLICAS=["replica_1"])
+    async def test_filtered_list_with_replicas(self):
+        # Like the real check, which opens a connection; the replica is
+        # reported down so that the queries run on the test database.
+        is_healthy = async_unsafe("is_healthy")(lambda alias: False)
+        url = reverse("api:books-list")
+        with patch.object(replicas, "is_healthy", is_healthy):
+            response = await self.serve(
+                self.list_view, self.factory.get(url, {"title__startswith": "Bo"})
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["results"][0]["title"], "Book 1")
+
+    async def test_retrieve_and_conditional_get(self):
+        url = reverse("api:books-detail", args=[self.book.id])
+        response = await self.serve(
+            self.detail_view, self.factory.get(url), pk=str(self.book.id)
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(json.loads(response.content)["title"], "Book 1")
+
+        request = self.factory.get(url, headers={"if-none-match": response["ETag"]})
+        response = await self.serve(self.detail_view, request, pk=str(self.book.id))
+        self.assertEqual(response.status_code, 304)
+
+    async def test_errors_are_delegated_to_drf(self):
+        pk = str(uuid4())
+        url = reverse("api:books-detail", args=[pk])
+        response = await self.serve(self.detail_view, self.factory.get(url), pk=pk)
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(json.loads(response.content), {"detail": "Not found."})
+
+        url = reverse("api:books-list")
+        response = await self.serve(
+            self.list_view, self.factory.get(url, {"fields": "nope"})
+        )
+        self.assertEqual(response.status_code, 400)
+
+    async def test_writes_and_other_renderers_are_delegated_to_drf(self):
+        url = reverse("api:books-list")
+        response = await self.serve(
+            self.list_view,
+            self.factory.get(url, headers={"accept": "application/json; indent=2"}),
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'{\n  "next"'))
+
+        response = await self.serve(
+            self.list_view,
+            self.factory.post(
+                url,
+                {
+                    "title": "Book 2",
+                    "description": "Description",
+                    "publish_date": "2021-01-01",
+                    "author_id": str(self.author.id),
+                },
+                content_type="application/json",
+            ),
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(await Book.objects.acount(), 2)
+
+
+@override_settings(DATABASE_REPLICAS=["replica_1", "replica_2"])
+class ReplicaRouterTestCase(SimpleTestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        replicas._down_until.clear()
+        patcher = patch.object(replicas, "is_healthy", return_value=True)
+        self.is_healthy = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def read_alias(self):
+        with replica_reads():
+            alias = self.router.db_for_read(Book)
+            # One replica per request
+            self.assertEqual(self.router.db_for_read(Author), alias)
+            return alias
+
+    def test_reads_outside_replica_reads_use_the_primary(self):
+        self.assertEqual(self.router.db_for_read(Book), "default")
+        with replica_reads(enabled=False):
+            self.assertEqual(self.router.db_for_read(Book), "default")
+        with replica_reads():
+            self.assertEqual(self.router.db_for_write(Book), "default")
+
+    def test_round_robin(self):
+        aliases = {self.read_alias() for _ in range(4)}
+        self.assertEqual(aliases, {"replica_1", "replica_2"})
+
+    def test_unhealthy_replica_is_skipped_until_retry(self):
+        self.is_healthy.side_effect = lambda alias: alias != "replica_1"
+        self.assertEqual([self.read_alias() for _ in range(4)], ["replica_2"] * 4)
+        # Not checked again until DB_REPLICA_RETRY_SECONDS have passed
+        checked = [call.args[0] for call in self.is_healthy.call_args_list]
+        self.assertEqual(checked.count("replica_1"), 1)
+
+    def test_falls_back_to_primary_when_no_replica_is_healthy(self):
+        self.is_healthy.return_value = False
+        self.assertEqual(self.read_alias(), "default")
+
+    async def test_replica_is_chosen_off_the_event_loop(self):
+        with replica_reads():
+            self.assertEqual(self.router.db_for_read(Book), "default")
+            self.is_healthy.assert_not_called()
+            alias = await sync_to_async(self.router.db_for_read)(Book)
+            self.assertIn(alias, {"replica_1", "replica_2"})
+            # Chosen once for the request, wherever it is read from
+            self.assertEqual(self.router.db_for_read(Book), alias)
+
+    def test_reads_use_the_primary_after_a_write(self):
+        self.addCleanup(cache.delete, replicas.SETTLE_KEY)
+        replicas.record_write()
+        self.assertEqual(self.read_alias(), "default")
+        self.is_healthy.assert_not_called()
+
+
+class ReadYourWritesTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        patcher = patch("api.views.replica_reads", wraps=replica_reads)
+        self.replica_reads = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def used_replica(self):
+        return self.replica_reads.call_args.args[0]
+
+    def test_reads_use_replicas(self):
+        self.client.get(reverse("api:authors-list"))
+        self.assertTrue(self.used_replica())
+        self.client.get(reverse("api:authors-detail", args=[self.author.id]))
+        self.assertTrue(self.used_replica())
+        self.client.get(reverse("api:authors-get-books", args=[self.author.id]))
+        self.assertTrue(self.used_replica())
+
+    def test_writes_pin_reads_to_the_primary(self):
+        response = self.client.patch(
+            reverse("api:authors-detail", args=[self.author.id]),
+            {"name": "Jane Doe"},
+            format="json",
+        )
+        self.assertFalse(self.used_replica())
+        self.assertIn(PIN_COOKIE, response.cookies)
+        until = response[PIN_HEADER]
+
+        self.client.get(reverse("api:authors-list"))
+        self.assertFalse(self.used_replica())
+
+        # Clients without cookies send the header back instead
+        self.client.cookies.clear()
+        self.client.get(reverse("api:authors-list"))
+        self.assertTrue(self.used_replica())
+        self.client.get(reverse("api:authors-list"), headers={PIN_HEADER: until})
+        self.assertFalse(self.used_replica())
+
+    def test_change_feed_reads_the_primary(self):
+        self.client.get(reverse("api:changes-list"))
+        self.assertFalse(self.used_replica())
+
+    def test_pin_expires(self):
+        self.client.cookies[PIN_COOKIE] = str(time.time() - 1)
+        self.client.get(reverse("api:books-list"))
+        self.assertTrue(self.used_replica())
+
+    @override_settings(DATABASE_REPLICAS=["replica_1"])
+    def test_reads_stay_on_the_primary_after_any_write(self):
+        url = reverse("api:authors-detail", args=[self.author.id])
+        self.client.patch(url, {"name": "Jane Doe"}, format="json")
+        # Another client, which is not pinned
+        self.client.cookies.clear()
+        with patch.object(replicas, "choose_replica") as choose_replica:
+            response = self.client.get(url)
+        choose_replica.assert_not_called()
+        self.assertEqual(response.data["name"], "Jane Doe")
+
+    @override_settings(DATABASE_REPLICAS=["replica_1"])
+    def test_pinned_reads_skip_the_cache(self):
+        url = reverse("api:authors-list")
+        self.client.cookies[PIN_COOKIE] = str(time.time() + 5)
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        self.assertEqual(self.client.get(url)["X-Cache"], "MISS")
+        # What pinned clients read is still stored for the others
+        self.client.cookies.clear()
+        self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+
+    def test_failed_writes_do_not_pin(self):
+        response = self.client.post(reverse("api:authors-list"), {}, format="json")
+        self.assertEqual(response.status_code, 400)
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+
+@override_settings(METRICS_ENABLED=True, METRICS_FLUSH_INTERVAL=0)
+class MetricsTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        Book.objects.create(
+            title="Book 1",
+            description="",
+            publish_date="2020-01-01",
+            author=self.author,
+        )
+
+    def server_timing(self, response):
+        return {
+            entry.split(";")[0]: entry
+            for entry in response["Server-Timing"].split(", ")
+        }
+
+    def test_server_timing_reports_queries_cache_and_phases(self):
+        timing = self.server_timing(self.client.get(reverse("api:books-list")))
+        self.assertIn('desc="1 queries"', timing["db"])
+        self.assertIn('desc="1 MISS"', timing["cache.all_books"])
+        self.assertIn("serialize", timing)
+        self.assertIn("render", timing)
+
+        timing = self.server_timing(self.client.get(reverse("api:books-list")))
+        self.assertIn('desc="0 queries"', timing["db"])
+        self.assertIn('desc="1 HIT"', timing["cache.all_books"])
+        self.assertNotIn("serialize", timing)
+
+        url = reverse("api:authors-detail", args=[self.author.id])
+        timing = self.server_timing(self.client.get(url))
+        self.assertIn('desc="1 MISS"', timing["cache.author_pk"])
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse("api:books-list"))
+        self.client.get(reverse("api:books-list"))
+        response = self.client.get(reverse("metrics"))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        self.assertIn("# TYPE http_request_duration_seconds histogram", body)
+        self.assertIn(
+            'http_requests_total{view="api:books-list",method="GET",status="200"} 2',
+            body,
+        )
+        self.assertIn('cache_requests_total{family="all_books",result="hit"} 1', body)
+        self.assertIn('cache_requests_total{family="all_books",result="miss"} 1', body)
+        self.assertIn('db_queries_total{view="api:books-list"} 1', body)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        response = self.client.get(reverse("api:books-list"))
+        self.assertNotIn("Server-Timing", response)
+        self.assertIsNone(metrics.current_metrics())
+        self.assertEqual(self.client.get(reverse("metrics")).status_code, 404)
+
+
+class KeyFamilyTestCase(SimpleTestCase):
+
+    def test_key_family(self):
+        pk = uuid4()
+        for key, family in [
+            ("all_books_v1.2_50_", "all_books"),
+            (f"book_{pk}", "book_<pk>"),
+            (f"book_{pk}_fields=title&expand=", "book_<pk>"),
+            (f"author_{pk}_books_v3_50_", "author_<pk>_books"),
+            ("search_books_v1.1_0cc175b9c0f1b6a831c399e269772661_1", "search_books"),
+        ]:
+            self.assertEqual(metrics.key_family(key), family)
+
+
+@override_settings(CACHE_HIT_TRACKING=True, CACHE_HIT_FLUSH_INTERVAL=0)
+class WarmCacheTestCase(CommitCallbacksMixin, APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        self.book = Book.objects.create(
+            title="Book 1",
+            description="",
+            publish_date="2020-01-01",
+            author=self.author,
+        )
+        self.book_url = reverse("api:books-detail", args=[self.book.id])
+        self.books_url = reverse("api:authors-get-books", args=[self.author.id])
+
+    def warm(self, *args):
+        stdout = StringIO()
+        call_command("warm_cache", *args, stdout=stdout, stderr=StringIO())
+        return stdout.getvalue()
+
+    def test_hits_are_counted_by_path(self):
+        self.client.get(self.book_url)
+        self.client.get(self.book_url)
+        self.client.get(self.books_url)
+        self.client.get(reverse("api:books-detail", args=[uuid4()]))
+        self.client.post(reverse("api:books-list"), {}, format="json")
+        self.assertEqual(warming.hot_paths(10), [self.book_url, self.books_url])
+        self.assertEqual(warming.hot_paths(1), [self.book_url])
+
+    @override_settings(CACHE_HIT_TRACKING=False)
+    def test_hits_are_not_counted_when_disabled(self):
+        self.client.get(self.book_url)
+        self.assertEqual(warming.hot_paths(10), [])
+
+    def test_warm_fills_lists_and_hot_entries(self):
+        self.client.get(self.book_url)
+        self.client.get(self.books_url)
+        cache.delete(f"book_{self.book.id}")
+        bump_generations(AUTHORS, BOOKS, author_books(self.author.id))
+
+        self.warm()
+        # The warmer's own requests are not counted.
+        self.assertEqual(warming.hot_paths(10), [self.book_url, self.books_url])
+        self.assertIsNotNone(cache.get(f"book_{self.book.id}"))
+        for url in (reverse("api:books-list"), reverse("api:authors-list")):
+            self.assertEqual(self.client.get(url)["X-Cache"], "HIT")
+        self.assertEqual(self.client.get(self.books_url)["X-Cache"], "HIT")
+
+    def test_only_entries_about_to_expire_are_refreshed(self):
+        self.client.get(self.book_url)
+        key = f"book_{self.book.id}"
+        with CaptureQueriesContext(connection) as queries:
+            self.warm("--ahead", "60", "--top", "1")
+        # Only the two list pages were cold.
+        self.assertEqual(len(queries), 2)
+        self.assertGreater(cache.ttl(key), 60)
+
+        cache.expire(key, 30)
+        with CaptureQueriesContext(connection) as queries:
+            self.warm("--ahead", "60", "--top", "1")
+        self.assertEqual(len(queries), 1)
+        self.assertGreater(cache.ttl(key), 60)
+
+    def test_deleted_paths_are_dropped(self):
+        self.client.get(self.book_url)
+        self.book.delete()
+        self.warm()
+        self.assertEqual(warming.hot_paths(10), [])
+
+    @override_settings(ALLOWED_HOSTS=[".example.com", "api.example.com"])
+    def test_failed_requests_are_reported(self):
+        self.assertIn("Warmed 2 paths", self.warm())
+        output = self.warm("--host", "localhost")
+        self.assertIn("Warmed 0 paths", output)
+        self.assertIn("2 failed", output)
+
+    def test_interval_must_be_shorter_than_ahead(self):
+        with self.assertRaises(CommandError):
+            self.warm("--interval", "60", "--ahead", "30")
+
+
+@override_settings(CHANGE_LOG_SETTLE_SECONDS=0)
+class ChangeLogTestCase(APITestCase):
+
+    def setUp(self):
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        self.url = reverse("api:changes-list")
+
+    def changes(self, **params):
+        return self.client.get(self.url, params).json()
+
+    def test_writes_are_logged_in_order(self):
+        response = self.client.post(
+            reverse("api:books-list"),
+            {
+                "title": "Book 1",
+                "description": "A book.",
+                "publish_date": "2020-01-01",
+                "author_id": str(self.author.id),
+            },
+            format="json",
+        )
+        book_id = response.data["id"]
+        book_url = reverse("api:books-detail", args=[book_id])
+        self.client.patch(book_url, {"title": "Book 2"}, format="json")
+        self.client.delete(book_url)
+
+        results = self.changes()["results"]
+        self.assertEqual(
+            [(change["resource"], change["action"]) for change in results],
+            [
+                ("author", "create"),
+                ("book", "create"),
+                ("book", "update"),
+                ("book", "delete"),
+            ],
+        )
+        self.assertEqual(results[1]["object_id"], book_id)
+        self.assertEqual(results[1]["data"]["author_id"], str(self.author.id))
+        self.assertEqual(results[2]["data"]["title"], "Book 2")
+        self.assertIsNone(results[3]["data"])
+
+    def test_cursor(self):
+        for index in range(4):
+            self.author.name = f"Name {index}"
+            self.author.save()
+        first = self.changes(page_size=3)
+        self.assertEqual(len(first["results"]), 3)
+        self.assertEqual(first["after"], first["results"][-1]["id"])
+        self.assertIsNotNone(first["next"])
+
+        second = self.client.get(first["next"]).json()
+        self.assertEqual(
+            [change["data"]["name"] for change in second["results"]],
+            ["Name 2", "Name 3"],
+        )
+        self.assertIsNone(second["next"])
+
+        # Without new changes, the cursor stays where it is.
+        empty = self.changes(after=second["after"])
+        self.assertEqual(empty["results"], [])
+        self.assertEqual(empty["after"], second["after"])
+        self.assertEqual(self.client.get(self.url, {"after": "x"}).status_code, 404)
+
+    def test_cascades_and_bulk_writes_are_logged(self):
+        response = self.client.post(
+            reverse("api:books-bulk-create"),
+            [
+                {
+                    "title": f"Book {index}",
+                    "description": "A book.",
+                    "publish_date": "2020-01-01",
+                    "author_id": str(self.author.id),
+                }
+                for index in range(2)
+            ],
+            format="json",
+        )
+        ids = [book["id"] for book in response.data]
+        self.client.patch(
+            reverse("api:books-bulk-create"),
+            [{"id": ids[0], "title": "Renamed"}],
+            format="json",
+        )
+        self.client.delete(reverse("api:authors-detail", args=[self.author.id]))
+
+        actions = [
+            (change.resource, change.action, str(change.object_id))
+            for change in Change.objects.order_by("id")
+        ][1:]
+        self.assertEqual(
+            actions[:3],
+            [
+                ("book", "create", ids[0]),
+                ("book", "create", ids[1]),
+                ("book", "update", ids[0]),
+            ],
+        )
+        self.assertCountEqual(
+            actions[3:5],
+            [
+                ("book", "delete", ids[0]),
+                ("book", "delete", ids[1]),
+            ],
+        )
+        self.assertEqual(actions[5], ("author", "delete", str(self.author.id)))
+
+    def test_cascaded_deletes_are_logged_with_one_insert(self):
+        Book.objects.bulk_create(
+            Book(
+                title=f"Book {index}",
+                description="A book.",
+                publish_date="2020-01-01",
+                author=self.author,
+            )
+            for index in range(5)
+        )
+        with CaptureQueriesContext(connection) as queries:
+            self.client.delete(reverse("api:authors-detail", args=[self.author.id]))
+        inserts = [
+            query["sql"]
+            for query in queries.captured_queries
+            if query["sql"].startswith(f'INSERT INTO "{Change._meta.db_table}"')
+        ]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Change.objects.filter(action=Change.DELETE).count(), 6)
+
+    def test_write_and_change_commit_together(self):
+        with patch("api.signals.log_changes", side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                self.client.patch(
+                    reverse("api:authors-detail", args=[self.author.id]),
+                    {"name": "Jane Doe"},
+                    format="json",
+                )
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.name, "John Doe")
+
+    @override_settings(CHANGE_LOG_SETTLE_SECONDS=60)
+    def test_recent_changes_are_held_back(self):
+        self.assertEqual(self.changes()["results"], [])
+        Change.objects.update(created_at=timezone.now() - timedelta(minutes=2))
+        self.assertEqual(len(self.changes()["results"]), 1)
+
+
+class CompactIdTestCase(APITestCase):
+
+    def setUp(self):
+        cache.delete_pattern("*")
+        self.author = Author.objects.create(
+            name="John Doe", bio="Bio", birth_date="1970-01-01"
+        )
+        self.book = Book.objects.create(
+            title="Book 1",
+            description="",
+            publish_date="2020-01-01",
+            author=self.author,
+        )
+
+    def test_uuid7_is_time_ordered(self):
+        first = uuid7()
+        time.sleep(0.002)
+        second = uuid7()
+        self.assertEqual((first.version, first.variant), (7, uuid4().variant))
+        self.assertLess(first.bytes, second.bytes)
+        self.assertNotEqual(uuid7(), uuid7())
+
+    def test_id_version_setting(self):
+        self.assertEqual(new_id().version, 4)
+        with override_settings(ID_VERSION=7):
+            self.assertEqual(new_id().version, 7)
+            author = Author.objects.create(
+                name="Jane Roe", bio="Bio", birth_date="1980-01-01"
+            )
+        self.assertEqual(author.id.version, 7)
+
+    @unittest.skipUnless(connection.vendor == "sqlite", "SQLite stores ids as blobs")
+    def test_ids_are_stored_in_16_bytes(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT typeof(id), length(id), length(author_id) FROM api_book"
+            )
+            self.assertEqual(cursor.fetchall(), [("blob", 16, 16)])
+        row = Book.objects.values("id", "author__id").get()
+        self.assertEqual(row, {"id": self.book.id, "author__id": self.author.id})
+
+    def test_detail_ids_are_normalized_once(self):
+        self.assertEqual(parse_uuid(str(self.book.id).upper()), self.book.id)
+        self.assertIs(parse_uuid(self.book.id), self.book.id)
+        self.assertIsNone(parse_uuid("not-a-uuid"))
+
+        canonical = reverse("api:books-detail", args=[self.book.id])
+        self.assertEqual(self.client.get(canonical).status_code, 200)
+        for pk in (self.book.id.hex, str(self.book.id).upper()):
+            url = reverse("api:books-detail", args=[pk])
+            # Served from the entry cached under the canonical id
+            with self.assertNumQueries(0):
+                self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class BenchmarkChecksTestCase(SimpleTestCase):
+
+    def result(self, **values):
+        return {
+            "scale": 100,
+            "endpoint": "book_list",
+            "cache": "warm",
+            "p50_ms": 1.0,
+            "p99_ms": 2.0,
+            "queries": 0,
+            **values,
+        }
+
+    def test_query_budgets(self):
+        command = benchmark_api.Command()
+        self.assertEqual(command.check_budgets([self.result()]), [])
+        failures = command.check_budgets([self.result(queries=1)])
+        self.assertEqual(len(failures), 1)
+        self.assertIn("budget of 0", failures[0])
+
+    def test_compare_with_baseline(self):
+        command = benchmark_api.Command()
+        baseline = {"results": [self.result()]}
+        within = self.result(p50_ms=1.2, p99_ms=2.4)
+        self.assertEqual(command.compare([within], baseline, 0.25), [])
+        failures = command.compare(
+            [self.result(p50_ms=1.5, queries=1), self.result(scale=1000)],
+            baseline,
+            0.25,
+        )
+        self.assertEqual(len(failures), 2)
+        self.assertIn("p50_ms regressed", failures[0])
+        self.assertIn("queries went from 0 to 1", failures[1])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -1,6 +1,8 @@
-from django.urls import path, include
+from django.conf import settings
+from django.urls import path, include, re_path
 from rest_framework.routers import DefaultRouter
-from .views import BookViewSet, AuthorViewSet
+from .async_views import AsyncReadView
+from .views import AuthorViewSet, BookViewSet, ChangeViewSet, ValuesReadMixin
 
 app_name = "api"
 
@@ -11,7 +13,32 @@ Router for the viewset.
 """
 router.register(r"authors", viewset=AuthorViewSet, basename="authors")
 router.register(r"books", viewset=BookViewSet, basename="books")
+router.register(r"changes", viewset=ChangeViewSet, basename="changes")
 
-urlpatterns = [
+urlpatterns = []
+
+if settings.ASYNC_READS:
+    # Matched before the router, which still serves every other route and
+    # the requests the async views delegate. Detail routes only match UUIDs,
+    # so that list actions such as books/search/ still reach the router.
+    for prefix, viewset, basename in router.registry:
+        if not issubclass(viewset, ValuesReadMixin):
+            continue
+        urlpatterns += [
+            re_path(
+                rf"^{prefix}/$",
+                AsyncReadView.as_view(viewset_class=viewset, basename=basename),
+                name=f"{basename}-list",
+            ),
+            re_path(
+                rf"^{prefix}/(?P<pk>[0-9a-fA-F-]{{32,36}})/$",
+                AsyncReadView.as_view(
+                    viewset_class=viewset, basename=basename, detail=True
+                ),
+                name=f"{basename}-detail",
+            ),
+        ]
+
+urlpatterns += [
     path("", include(router.urls)),
 ]
@@ -1,134 +1,806 @@
-from django.core.cache import cache
+import hashlib
+from datetime import timedelta
+from uuid import UUID
 from django.conf import settings
-from rest_framework import viewsets
+from django.db import transaction
+from django.db.models import Count, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from rest_framework import mixins, serializers, viewsets
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.permissions import SAFE_METHODS
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Author, Book
-from .serializers import AuthorSerializer, BookSerializer
+from .cache import (
+    AUTHORS,
+    BOOKS,
+    MISSING,
+    NOT_FOUND,
+    aget_cached,
+    aget_or_compute,
+    aset_tagged,
+    author_books,
+    author_tag,
+    aversioned_key,
+    book_tag,
+    bypassing,
+    get_cached,
+    get_or_compute,
+    set_tagged,
+    versioned_key,
+)
+from .changes import batch_changes, log_changes
+from .filters import BookFilterBackend
+from .metrics import timer
+from .models import Author, Book, Change
+from .pagination import (
+    AuthorPagination,
+    BookPagination,
+    ChangePagination,
+    SearchPagination,
+)
+from .renderers import CSVRenderer, NDJSONRenderer
+from .replicas import is_pinned, pin_to_primary, replica_reads
+from .responses import (
+    cached_response,
+    entry_response,
+    make_etag,
+    not_modified,
+    render_entry,
+)
+from .search import get_search_backend
+from .signals import batch_invalidation, invalidate_author, invalidate_book
+from .warming import record_hit
+from .serializers import (
+    AuthorBookCountValuesSerializer,
+    AuthorSerializer,
+    BookSerializer,
+    BookValuesSerializer,
+    ChangeSerializer,
+)
 
 
-class AuthorViewSet(viewsets.ModelViewSet):
+def parse_uuid(value):
     """
-    ViewSet for the Author model.
+    Return a UUID string as a ``UUID``, or None if it is malformed. Ids from
+    the URL are parsed once here; the cache keys use its canonical string
+    form and the queries its bytes, with no further parsing.
     """
+    if isinstance(value, UUID):
+        return value
+    try:
+        return UUID(str(value))
+    except ValueError:
+        return None
 
-    queryset = Author.objects.all()
-    serializer_class = AuthorSerializer
+
+class ValuesReadMixin:
+    """
+    Serve reads through ``values_serializer_class``, which builds responses
+    from ``QuerySet.values()`` rows instead of model instances.
+
+    Clients can narrow the output with ``?fields=`` and choose which
+    relations are embedded with ``?expand=``; only the selected columns are
+    read from the database.
+
+    ``list`` and ``retrieve`` cache the rendered responses. ``alist`` and
+    ``aretrieve`` are their async versions, served by ``async_views``.
+    """
+
+    values_serializer_class = None
+    # Lookups that retrieve needs from the row whatever fields are selected
+    object_lookups = ["updated_at"]
+    # Cache key prefixes of list pages and detail entries, and the
+    # namespaces whose writes invalidate list pages
+    list_cache_prefix = None
+    detail_cache_prefix = None
+    list_namespaces = []
+    # Actions whose reads count as hits for the cache warmer
+    tracked_actions = {"list", "retrieve"}
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if (
+            request.method == "GET"
+            and self.action in self.tracked_actions
+            and response.status_code in (200, 304)
+        ):
+            record_hit(request)
+        return response
+
+    def get_field_selection(self):
+        """
+        Return the ``(fields, expand)`` lists requested by the client. When
+        ``fields`` is given, relations are only embedded if listed in
+        ``expand``; otherwise all of them are, as before.
+        """
+        serializer_class = self.values_serializer_class
+        selection = {}
+        for param, allowed in (
+            ("fields", serializer_class.fields),
+            ("expand", serializer_class.nested),
+        ):
+            value = self.request.query_params.get(param)
+            if value is None:
+                continue
+            names = {name.strip() for name in value.split(",") if name.strip()}
+            unknown = names.difference(allowed)
+            if unknown:
+                raise ValidationError(
+                    {param: f"Unknown fields: {', '.join(sorted(unknown))}."}
+                )
+            selection[param] = [name for name in allowed if name in names]
+
+        fields = selection.get("fields", list(serializer_class.fields))
+        default_expand = [] if "fields" in selection else list(serializer_class.nested)
+        return fields, selection.get("expand", default_expand)
+
+    def get_selection_key(self):
+        """
+        Return a cache key suffix identifying the field selection, empty for
+        the default one.
+        """
+        fields, expand = self.get_field_selection()
+        serializer_class = self.values_serializer_class
+        if fields == serializer_class.fields and expand == list(
+            serializer_class.nested
+        ):
+            return ""
+        return f"_fields={','.join(fields)}&expand={','.join(expand)}"
+
+    def get_filter_key(self):
+        """
+        Return a cache key suffix identifying the filters applied to lists.
+        """
+        return "".join(
+            backend().get_cache_key(self.request) for backend in self.filter_backends
+        )
+
+    def get_values_serializer(self):
+        fields, expand = self.get_field_selection()
+        return self.values_serializer_class(fields=fields, expand=expand)
+
+    def get_values_queryset(self):
+        """
+        Return the queryset reads are served from, with any annotations the
+        values serializer reads.
+        """
+        return self.get_queryset()
+
+    def get_list_queryset(self):
+        """
+        Return the values serializer and the queryset of the rows of a list,
+        before pagination.
+        """
+        serializer = self.get_values_serializer()
+        ordering = self.paginator.get_requested_ordering(self.request)
+        ordering = [field.lstrip("-") for field in ordering]
+        queryset = self.filter_queryset(self.get_values_queryset())
+        return serializer, serializer.values(queryset, extra=ordering)
+
+    def get_object_queryset(self, pk):
+        """
+        Return the values serializer and the queryset of an object's row.
+        """
+        serializer = self.get_values_serializer()
+        # Filters only apply to lists; detail entries are cached per object.
+        queryset = serializer.values(
+            self.get_values_queryset(), extra=self.object_lookups
+        )
+        return serializer, queryset.filter(pk=pk)
+
+    def list_values(self):
+        """
+        Return the paginated response data for the requested page.
+        """
+        serializer, queryset = self.get_list_queryset()
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(serializer.many(page)).data
+
+    async def alist_values(self):
+        """
+        Async version of ``list_values``.
+        """
+        serializer, queryset = self.get_list_queryset()
+        page = await self.paginator.apaginate_queryset(queryset, self.request, self)
+        return self.get_paginated_response(serializer.many(page)).data
+
+    def get_object_values(self, pk):
+        """
+        Return the values row and the serialized data of an object, or raise
+        ``Http404`` if it does not exist.
+        """
+        serializer, queryset = self.get_object_queryset(pk)
+        row = queryset.first()
+        if row is None:
+            raise Http404
+        with timer("serialize"):
+            return row, serializer.to_representation(row)
+
+    async def aget_object_values(self, pk):
+        """
+        Async version of ``get_object_values``.
+        """
+        serializer, queryset = self.get_object_queryset(pk)
+        row = await queryset.afirst()
+        if row is None:
+            raise Http404
+        with timer("serialize"):
+            return row, serializer.to_representation(row)
+
+    def get_page_key(self):
+        """
+        Return the cache key suffix of the requested list page: its cursor,
+        size and ordering, the field selection and the filters.
+        """
+        return (
+            self.paginator.get_page_key(self.request)
+            + self.get_selection_key()
+            + self.get_filter_key()
+        )
+
+    def get_detail_cache_key(self, pk):
+        return f"{self.detail_cache_prefix}_{pk}{self.get_selection_key()}"
+
+    def get_detail_tags(self, pk, row):
+        """
+        Return the tags of a detail entry, or of its negative entry when
+        ``row`` is None.
+        """
+        raise NotImplementedError
+
+    def get_last_modified(self, row):
+        """
+        Return the time the object last changed, or None to use the time the
+        entry is rendered.
+        """
+        return row["updated_at"]
+
+    def render_object(self, row, data):
+        last_modified = self.get_last_modified(row)
+        if last_modified is not None:
+            last_modified = last_modified.timestamp()
+        return render_entry(data, last_modified=last_modified)
 
     def list(self, request, *args, **kwargs):
         """
-        List all authors, using cache if available.
+        List a page of objects, using cache if available. The ETag is derived
+        from the cache key, so a matching ``If-None-Match`` is answered with
+        304 before the cached page is even read.
         """
-        cache_key = "all_authors"
-        authors = cache.get(cache_key)
-        if not authors:
-            authors = super().list(request, *args, **kwargs).data
-            cache.set(cache_key, authors, settings.CACHE_TIMEOUT)
-        return Response(authors)
+        page_key = self.get_page_key()
+        cache_key = versioned_key(
+            self.list_cache_prefix, self.list_namespaces, page_key
+        )
+        etag = make_etag(cache_key)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
 
-    def retrieve(self, request, *args, **kwargs):
+        entry, cache_status = get_or_compute(
+            cache_key,
+            lambda: render_entry(self.list_values(), etag),
+            stale_key=f"{self.list_cache_prefix}_{page_key}",
+        )
+        return cached_response(request, entry, headers={"X-Cache": cache_status})
+
+    async def alist(self, request):
         """
-        Retrieve a specific author, using cache if available.
+        Async version of ``list``, returning a plain JSON ``HttpResponse``.
         """
-        cache_key = f"author_{kwargs['pk']}"
-        author = cache.get(cache_key)
-        if not author:
-            response = super().retrieve(request, *args, **kwargs)
-            if response.status_code == 200:
-                cache.set(cache_key, response.data, settings.CACHE_TIMEOUT)
+        page_key = self.get_page_key()
+        cache_key = await aversioned_key(
+            self.list_cache_prefix, self.list_namespaces, page_key
+        )
+        etag = make_etag(cache_key)
+        response = not_modified(request, etag)
+        if response is not None:
             return response
-        return Response(author)
 
-    @action(detail=True, methods=["get"], url_path="books")
-    def get_books(self, request, pk=None):
+        async def compute():
+            return render_entry(await self.alist_values(), etag)
+
+        entry, cache_status = await aget_or_compute(
+            cache_key, compute, stale_key=f"{self.list_cache_prefix}_{page_key}"
+        )
+        return entry_response(request, entry, headers={"X-Cache": cache_status})
+
+    def retrieve(self, request, *args, **kwargs):
         """
-        Retrieve all books by a specific author.
+        Retrieve a specific object, using cache if available. Unknown ids are
+        cached for ``CACHE_NEGATIVE_TIMEOUT`` seconds.
         """
-        author = Author.objects.prefetch_related("books").filter(id=pk).first()
-        if not author:
-            return Response(
-                {"error": "Author not found"}, status=status.HTTP_404_NOT_FOUND
-            )
-        books = author.books.all()
-        serializer = BookSerializer(books, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        pk = parse_uuid(kwargs["pk"])
+        if pk is None:
+            raise NotFound()
+        cache_key = self.get_detail_cache_key(pk)
+        entry = get_cached(cache_key)
+        if entry == NOT_FOUND:
+            raise NotFound()
+        if entry is MISSING:
+            try:
+                row, data = self.get_object_values(pk)
+            except Http404:
+                timeout = settings.CACHE_NEGATIVE_TIMEOUT
+                tags = self.get_detail_tags(pk, None)
+                set_tagged(cache_key, NOT_FOUND, tags, timeout)
+                raise NotFound()
+            entry = self.render_object(row, data)
+            set_tagged(cache_key, entry, self.get_detail_tags(pk, row))
+        return cached_response(request, entry)
 
-    def perform_create(self, serializer):
+    async def aretrieve(self, request, pk):
         """
-        Cache all authors after a create operation.
+        Async version of ``retrieve``, returning a plain JSON ``HttpResponse``.
         """
-        super().perform_create(serializer)
-        cache.delete("all_authors")
+        pk = parse_uuid(pk)
+        if pk is None:
+            raise NotFound()
+        cache_key = self.get_detail_cache_key(pk)
+        entry = await aget_cached(cache_key)
+        if entry == NOT_FOUND:
+            raise NotFound()
+        if entry is MISSING:
+            try:
+                row, data = await self.aget_object_values(pk)
+            except Http404:
+                timeout = settings.CACHE_NEGATIVE_TIMEOUT
+                tags = self.get_detail_tags(pk, None)
+                await aset_tagged(cache_key, NOT_FOUND, tags, timeout)
+                raise NotFound()
+            entry = self.render_object(row, data)
+            await aset_tagged(cache_key, entry, self.get_detail_tags(pk, row))
+        return entry_response(request, entry)
+
+
+class ReplicaReadMixin:
+    """
+    Run the queries of ``replica_actions`` on a read replica, unless the
+    client wrote within the last ``DB_REPLICA_STICKY_SECONDS``. Successful
+    writes pin the reads of their client to the primary for that long, and
+    while replicas are configured, pinned reads skip the cache too: another
+    client may have cached a response rebuilt from a lagging replica.
+    """
+
+    replica_actions = {"list", "retrieve"}
+
+    def dispatch(self, request, *args, **kwargs):
+        action = self.action_map.get(request.method.lower())
+        pinned = is_pinned(request)
+        enabled = action in self.replica_actions and not pinned
+        bypass = pinned and bool(settings.DATABASE_REPLICAS)
+        with replica_reads(enabled), bypassing(bypass):
+            return super().dispatch(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(response)
+        return response
+
+
+class AtomicWriteMixin:
+    """
+    Run each create, update and delete in a transaction, so that the change
+    log entries written by the signal handlers commit with it. They are
+    inserted together, so deleting an author with many books logs the
+    cascaded deletes with one query rather than one per book. The cache is
+    invalidated once, after the transaction has committed, so that no
+    concurrent read can cache the data it replaced.
+    """
+
+    def perform_create(self, serializer):
+        with batch_invalidation(), transaction.atomic(), batch_changes():
+            super().perform_create(serializer)
 
     def perform_update(self, serializer):
+        with batch_invalidation(), transaction.atomic(), batch_changes():
+            super().perform_update(serializer)
+
+    def perform_destroy(self, instance):
+        with batch_invalidation(), transaction.atomic(), batch_changes():
+            super().perform_destroy(instance)
+
+
+class BulkMixin:
+    """
+    Batch create, update and delete endpoints at ``<resource>/bulk/``.
+
+    Each request takes a list of at most ``BULK_MAX_ITEMS`` items. All items
+    are validated before anything is written; if any is invalid, nothing is
+    written and the errors are returned per item, in request order. Valid
+    batches are written in one transaction and invalidate the cache once.
+    """
+
+    def get_bulk_items(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({"non_field_errors": ["Expected a list of items."]})
+        if len(items) > settings.BULK_MAX_ITEMS:
+            raise ValidationError(
+                {
+                    "non_field_errors": [
+                        f"Expected at most {settings.BULK_MAX_ITEMS} items."
+                    ]
+                }
+            )
+        return items
+
+    def get_bulk_serializer_context(self, items):
         """
-        Cache all authors after an update operation.
+        Return the serializer context shared by every item of a batch.
         """
-        super().perform_update(serializer)
-        cache.delete("all_authors")
-        cache.delete(f"author_{serializer.instance.pk}")
+        return self.get_serializer_context()
 
-    def perform_destroy(self, instance):
+    def invalidate_instance(self, instance):
+        raise NotImplementedError
+
+    def bulk_error_response(self, errors):
+        return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=["post"], url_path="bulk")
+    def bulk_create(self, request):
+        """
+        Create a batch of objects.
         """
-        Cache all authors after a destroy operation.
+        items = self.get_bulk_items(request)
+        context = self.get_bulk_serializer_context(items)
+        serializer = self.get_serializer(data=items, many=True, context=context)
+        if not serializer.is_valid():
+            return self.bulk_error_response(serializer.errors)
+
+        model = self.get_queryset().model
+        instances = [model(**attrs) for attrs in serializer.validated_data]
+        with batch_invalidation(), transaction.atomic():
+            model.objects.bulk_create(instances)
+            # bulk_create and bulk_update send no signals.
+            log_changes(instances, Change.CREATE)
+            for instance in instances:
+                self.invalidate_instance(instance)
+        data = self.get_serializer(instances, many=True).data
+        return Response(data, status=status.HTTP_201_CREATED)
+
+    @bulk_create.mapping.patch
+    def bulk_update(self, request):
+        """
+        Partially update a batch of objects, each identified by its ``id``.
         """
-        cache.delete("all_authors")
-        cache.delete(f"author_{instance.pk}")
-        super().perform_destroy(instance)
+        items = self.get_bulk_items(request)
+        pks = [
+            parse_uuid(item.get("id")) if isinstance(item, dict) else None
+            for item in items
+        ]
+        instances = self.get_queryset().in_bulk([pk for pk in pks if pk])
+        context = self.get_bulk_serializer_context(items)
+
+        errors, serializers, seen = [], [], set()
+        for item, pk in zip(items, pks):
+            if pk not in instances:
+                errors.append({"id": ["Not found."]})
+                continue
+            if pk in seen:
+                errors.append({"id": ["Duplicate id."]})
+                continue
+            seen.add(pk)
+            serializer = self.get_serializer(
+                instances[pk], data=item, partial=True, context=context
+            )
+            errors.append({} if serializer.is_valid() else serializer.errors)
+            serializers.append(serializer)
+        if any(errors):
+            return self.bulk_error_response(errors)
 
+        fields = {"updated_at"}
+        now = timezone.now()
+        updated = []
+        for serializer in serializers:
+            for attr, value in serializer.validated_data.items():
+                setattr(serializer.instance, attr, value)
+                fields.add(attr)
+            serializer.instance.updated_at = now
+            updated.append(serializer.instance)
 
-class BookViewSet(viewsets.ModelViewSet):
+        model = self.get_queryset().model
+        with batch_invalidation(), transaction.atomic():
+            model.objects.bulk_update(updated, sorted(fields))
+            log_changes(updated, Change.UPDATE)
+            for instance in updated:
+                self.invalidate_instance(instance)
+        return Response(self.get_serializer(updated, many=True).data)
+
+    @bulk_create.mapping.delete
+    def bulk_destroy(self, request):
+        """
+        Delete a batch of objects given as a list of ids.
+        """
+        items = self.get_bulk_items(request)
+        pks = [parse_uuid(item) for item in items]
+        queryset = self.get_queryset().filter(pk__in=[pk for pk in pks if pk])
+        existing = set(queryset.values_list("pk", flat=True))
+        errors = [{} if pk in existing else {"id": ["Not found."]} for pk in pks]
+        if any(errors):
+            return self.bulk_error_response(errors)
+
+        with batch_invalidation(), transaction.atomic(), batch_changes():
+            queryset.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class AuthorViewSet(
+    ReplicaReadMixin,
+    AtomicWriteMixin,
+    BulkMixin,
+    ValuesReadMixin,
+    viewsets.ModelViewSet,
+):
+    """
+    ViewSet for the Author model.
+
+    Cached responses are invalidated by the signal handlers in ``signals.py``.
+    """
+
+    queryset = Author.objects.all()
+    serializer_class = AuthorSerializer
+    values_serializer_class = AuthorBookCountValuesSerializer
+    object_lookups = []
+    pagination_class = AuthorPagination
+    replica_actions = {"list", "retrieve", "get_books"}
+    tracked_actions = {"list", "retrieve", "get_books"}
+    list_cache_prefix = "all_authors"
+    # Book writes change the book counts
+    list_namespaces = [AUTHORS, BOOKS]
+    detail_cache_prefix = "author"
+
+    def invalidate_instance(self, instance):
+        invalidate_author(instance)
+
+    def get_detail_tags(self, pk, row):
+        if row is None:
+            return [author_tag(pk)]
+        return [author_tag(pk), author_books(pk)]
+
+    def get_last_modified(self, row):
+        # The book count changes without the author's updated_at, and a
+        # deleted book leaves no later updated_at behind. Entries are rebuilt
+        # after every change they depend on, so their render time is used.
+        return None
+
+    def get_values_queryset(self):
+        """
+        Annotate each author with its number of books. The count is a
+        correlated subquery on the book author index, so it only runs for
+        the rows of the page being read instead of grouping the whole join.
+        """
+        book_count = (
+            Book.objects.filter(author_id=OuterRef("pk"))
+            .order_by()
+            .values("author_id")
+            .annotate(count=Count("*"))
+            .values("count")
+        )
+        return self.get_queryset().annotate(
+            book_count=Coalesce(Subquery(book_count), 0)
+        )
+
+    @action(detail=True, methods=["get"], url_path="books")
+    def get_books(self, request, pk=None):
+        """
+        Retrieve a page of the books by a specific author, using cache if
+        available. The author is included once, next to the page.
+        """
+        pk = parse_uuid(pk)
+        if pk is None:
+            return Response(
+                {"error": "Author not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        paginator = BookPagination()
+        page_key = paginator.get_page_key(request)
+        cache_key = versioned_key(f"author_{pk}_books", [author_books(pk)], page_key)
+        etag = make_etag(cache_key)
+        response = not_modified(request, etag)
+        if response is not None:
+            return response
+
+        books, cache_status = get_or_compute(
+            cache_key,
+            lambda: self.get_author_books(pk, paginator, etag),
+            stale_key=f"author_{pk}_books_{page_key}",
+        )
+        if books is None:
+            return Response(
+                {"error": "Author not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        return cached_response(
+            request, books, status=status.HTTP_200_OK, headers={"X-Cache": cache_status}
+        )
+
+    def get_author_books(self, pk, paginator, etag):
+        """
+        Render the author and a page of their books, or return None if the
+        author does not exist.
+        """
+        serializer = AuthorBookCountValuesSerializer()
+        row = serializer.values(self.get_values_queryset().filter(pk=pk)).first()
+        if row is None:
+            return None
+        author = serializer.to_representation(row)
+
+        fields = [name for name in BookValuesSerializer.fields if name != "author"]
+        serializer = BookValuesSerializer(fields=fields)
+        ordering = paginator.get_requested_ordering(self.request)
+        queryset = serializer.values(
+            Book.objects.filter(author_id=pk),
+            extra=[field.lstrip("-") for field in ordering],
+        )
+        books = serializer.many(paginator.paginate_queryset(queryset, self.request))
+        page = paginator.get_paginated_response(books).data
+        return render_entry({"author": author, **page}, etag)
+
+
+class BookViewSet(
+    ReplicaReadMixin,
+    AtomicWriteMixin,
+    BulkMixin,
+    ValuesReadMixin,
+    viewsets.ModelViewSet,
+):
     """
     ViewSet for the Book model.
+
+    Cached responses are invalidated by the signal handlers in ``signals.py``.
     """
 
     queryset = Book.objects.select_related("author").all()
     serializer_class = BookSerializer
+    values_serializer_class = BookValuesSerializer
+    object_lookups = ["updated_at", "author__id", "author__updated_at"]
+    pagination_class = BookPagination
+    filter_backends = [BookFilterBackend]
+    list_cache_prefix = "all_books"
+    list_namespaces = [BOOKS, AUTHORS]
+    detail_cache_prefix = "book"
 
-    def list(self, request, *args, **kwargs):
+    def get_bulk_serializer_context(self, items):
         """
-        List all books, using cache if available.
+        Load every author referenced by the batch with a single query.
         """
-        cache_key = "all_books"
-        books = cache.get(cache_key)
-        if not books:
-            books = super().list(request, *args, **kwargs).data
-            cache.set(cache_key, books, settings.CACHE_TIMEOUT)
-        return Response(books)
+        author_ids = {
+            parse_uuid(item["author_id"])
+            for item in items
+            if isinstance(item, dict) and "author_id" in item
+        }
+        context = self.get_serializer_context()
+        context["prefetched_authors"] = Author.objects.in_bulk(
+            [pk for pk in author_ids if pk]
+        )
+        return context
 
-    def retrieve(self, request, *args, **kwargs):
+    def invalidate_instance(self, instance):
+        invalidate_book(instance)
+
+    def get_detail_tags(self, pk, row):
+        if row is None:
+            return [book_tag(pk)]
+        return [book_tag(pk), author_tag(row["author__id"])]
+
+    def get_last_modified(self, row):
+        return max(row["updated_at"], row["author__updated_at"])
+
+    @action(detail=False, methods=["get"], url_path="search")
+    def search(self, request):
         """
-        Retrieve a specific book, using cache if available.
+        Search books by title, description and author name and bio with
+        ``?q=``, best matches first. Results are paginated by page number.
         """
-        cache_key = f"book_{kwargs['pk']}"
-        book = cache.get(cache_key)
-        if not book:
-            response = super().retrieve(request, *args, **kwargs)
-            if response.status_code == 200:
-                cache.set(cache_key, response.data, settings.CACHE_TIMEOUT)
+        query = " ".join(request.query_params.get("q", "").split())
+        if not query:
+            raise ValidationError({"q": ["This field is required."]})
+        paginator = SearchPagination()
+        digest = hashlib.md5(query.lower().encode(), usedforsecurity=False).hexdigest()
+        page_key = f"{paginator.get_page_key(request)}{self.get_selection_key()}"
+        suffix = f"{digest}_{page_key}"
+        cache_key = versioned_key("search_books", [BOOKS, AUTHORS], suffix)
+        etag = make_etag(cache_key)
+        response = not_modified(request, etag)
+        if response is not None:
             return response
-        return Response(book)
 
-    def perform_create(self, serializer):
+        books, cache_status = get_or_compute(
+            cache_key,
+            lambda: render_entry(self.search_values(query, paginator), etag),
+            stale_key=f"search_books_{suffix}",
+        )
+        return cached_response(request, books, headers={"X-Cache": cache_status})
+
+    def search_values(self, query, paginator):
         """
-        Cache all books after a create operation.
+        Return the paginated response data for a page of search results.
         """
-        super().perform_create(serializer)
-        cache.delete("all_books")
+        results = get_search_backend().results(query)
+        pks = paginator.paginate_queryset(results, self.request, view=self)
+        serializer = self.get_values_serializer()
+        queryset = serializer.values(Book.objects.filter(pk__in=pks), extra=["id"])
+        rows = {row["id"]: row for row in queryset}
+        books = serializer.many(rows[pk] for pk in pks if pk in rows)
+        return paginator.get_paginated_response(books).data
 
-    def perform_update(self, serializer):
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path="export",
+        renderer_classes=[NDJSONRenderer, CSVRenderer],
+    )
+    def export(self, request):
         """
-        Cache all books after an update operation.
+        Stream every book with its author as NDJSON (default) or CSV, chosen
+        with the ``Accept`` header or ``?format=ndjson|csv``.
+
+        ``?since=`` limits the export to books that changed, or whose author
+        changed, at or after the given time. The ``X-Export-Timestamp``
+        header holds the time to pass as ``since`` on the next incremental
+        export: the time the export started, minus ``EXPORT_SETTLE_SECONDS``.
+        A write still in flight when the export starts gets an earlier
+        ``updated_at`` than that start but only commits after it, so it is
+        left to the next export, which reads back far enough to see it.
         """
-        super().perform_update(serializer)
-        cache.delete("all_books")
-        cache.delete(f"book_{serializer.instance.pk}")
+        settle = timedelta(seconds=settings.EXPORT_SETTLE_SECONDS)
+        exported_at = timezone.now() - settle
+        queryset = self.get_export_queryset(request.query_params.get("since"))
+        serializer = BookValuesSerializer()
+        rows = (
+            serializer.to_representation(row)
+            for row in serializer.values(queryset).iterator(
+                chunk_size=settings.EXPORT_CHUNK_SIZE
+            )
+        )
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            renderer.render_rows(rows, chunk_size=settings.EXPORT_CHUNK_SIZE),
+            content_type=f"{renderer.media_type}; charset={renderer.charset}",
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="books.{renderer.format}"'
+        )
+        response["X-Export-Timestamp"] = exported_at.isoformat()
+        return response
 
-    def perform_destroy(self, instance):
+    def get_export_queryset(self, since=None):
         """
-        Cache all books after a destroy operation.
+        Return the books to export, ordered by ``updated_at`` and ``id``.
         """
-        cache.delete("all_books")
-        cache.delete(f"book_{instance.pk}")
-        super().perform_destroy(instance)
+        queryset = Book.objects.order_by("updated_at", "id")
+        if since is None:
+            return queryset
+        try:
+            since = serializers.DateTimeField().run_validation(since)
+        except ValidationError as exc:
+            raise ValidationError({"since": exc.detail})
+        return queryset.filter(
+            Q(updated_at__gte=since)
+            | Q(author__in=Author.objects.filter(updated_at__gte=since))
+        )
+
+
+class ChangeViewSet(ReplicaReadMixin, mixins.ListModelMixin, viewsets.GenericViewSet):
+    """
+    Change log of authors and books, oldest first, from ``?after=``, the id
+    of the last change the client has seen. See ``changes.py``.
+
+    Always read from the primary: on a lagging replica, a page could skip
+    changes that are already on the primary, and clients would move past
+    them with ``?after=``.
+    """
+
+    replica_actions = set()
+    serializer_class = ChangeSerializer
+    pagination_class = ChangePagination
+
+    def get_queryset(self):
+        queryset = Change.objects.all()
+        settle = settings.CHANGE_LOG_SETTLE_SECONDS
+        if settle > 0:
+            cutoff = timezone.now() - timedelta(seconds=settle)
+            queryset = queryset.filter(created_at__lte=cutoff)
+        return queryset
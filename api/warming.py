@@ -0,0 +1,148 @@
+"""
+Cache warming.
+
+With ``CACHE_HIT_TRACKING`` enabled, successful cacheable reads (list pages,
+detail entries, an author's books) count a hit for their path. Hits are
+buffered in each process and added to a Redis sorted set at most every
+``CACHE_HIT_FLUSH_INTERVAL`` seconds, which keeps the ``CACHE_HIT_MAX_KEYS``
+most requested paths.
+
+``warm()`` replays the first page of each list and the most requested paths
+through the whole request stack inside ``cache.refreshing()``, so entries
+that are missing or about to expire are rebuilt exactly as a user request
+would rebuild them. It is run by the ``warm_cache`` command, once or on a
+schedule.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.urls import reverse
+from django_redis import get_redis_connection
+from redis.exceptions import RedisError
+
+from .cache import is_refreshing, refreshing
+
+# Factor applied to every hit count after a warming run, so that paths that
+# stopped being requested fall out of the top
+DECAY = 0.5
+
+_pending = {}
+_pending_lock = threading.Lock()
+_last_flush = 0.0
+
+
+def _hits_key():
+    return cache.make_key("hits")
+
+
+def record_hit(request):
+    """
+    Count a hit for the path of the request, unless it is made by the
+    warmer itself.
+    """
+    if not settings.CACHE_HIT_TRACKING or is_refreshing():
+        return
+    global _last_flush
+    path = request.get_full_path()
+    with _pending_lock:
+        _pending[path] = _pending.get(path, 0) + 1
+        now = time.monotonic()
+        if now - _last_flush < settings.CACHE_HIT_FLUSH_INTERVAL:
+            return
+        _last_flush = now
+        hits = dict(_pending)
+        _pending.clear()
+    flush_hits(hits)
+
+
+def flush_hits(hits=None):
+    """
+    Add the buffered hits, or the given ones, to the Redis sorted set and
+    trim it to ``CACHE_HIT_MAX_KEYS`` paths.
+    """
+    if hits is None:
+        with _pending_lock:
+            hits = dict(_pending)
+            _pending.clear()
+    if not hits:
+        return
+    key = _hits_key()
+    pipeline = get_redis_connection("default").pipeline(transaction=False)
+    for path, count in hits.items():
+        pipeline.zincrby(key, count, path)
+    pipeline.zremrangebyrank(key, 0, -settings.CACHE_HIT_MAX_KEYS - 1)
+    try:
+        pipeline.execute()
+    except RedisError:
+        # Hit counts are best effort; never fail a request over them.
+        pass
+
+
+def hot_paths(count):
+    """
+    Return the ``count`` most requested paths, most requested first.
+    """
+    if count <= 0:
+        return []
+    paths = get_redis_connection("default").zrevrange(_hits_key(), 0, count - 1)
+    return [path.decode() for path in paths]
+
+
+def decay_hits():
+    key = _hits_key()
+    get_redis_connection("default").zunionstore(key, {key: DECAY})
+
+
+def forget(paths):
+    if paths:
+        get_redis_connection("default").zrem(_hits_key(), *paths)
+
+
+def default_host():
+    """
+    Return the first host of ``ALLOWED_HOSTS`` that is not a pattern, or
+    ``localhost``.
+    """
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*" and not host.startswith("."):
+            return host
+    return "localhost"
+
+
+def warm(top=None, ahead=None, host=None, secure=False):
+    """
+    Refresh the entries of the first list pages and of the ``top`` most
+    requested paths that are missing or expire within ``ahead`` seconds.
+    Requests are made to ``host``, over HTTPS if ``secure`` is true.
+
+    Returns the paths that were refreshed, those that no longer exist,
+    which are dropped from the hit counts, and ``(path, status)`` for the
+    requests that failed.
+    """
+    if top is None:
+        top = settings.CACHE_WARM_TOP_K
+    if ahead is None:
+        ahead = settings.CACHE_WARM_AHEAD
+    paths = [reverse("api:books-list"), reverse("api:authors-list")]
+    paths += [path for path in hot_paths(top) if path not in paths]
+
+    # Imported here so that serving requests does not load the test tools.
+    from django.test import Client
+
+    client = Client(SERVER_NAME=host or default_host(), raise_request_exception=False)
+    warmed, missing, failed = [], [], []
+    with refreshing(ahead):
+        for path in paths:
+            status = client.get(path, secure=secure).status_code
+            if status == 200:
+                warmed.append(path)
+            elif status == 404:
+                missing.append(path)
+            else:
+                failed.append((path, status))
+    forget(missing)
+    decay_hits()
+    return warmed, missing, failed
@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 from pathlib import Path
 
 import os
+import sys
 import environ
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -55,6 +56,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "api.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "corsheaders.middleware.CorsMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -67,6 +69,17 @@ MIDDLEWARE = [
 
 ROOT_URLCONF = "library_management.urls"
 
+# Record per-request query, cache and rendering metrics, returned in the
+# Server-Timing header and served to Prometheus at /metrics
+METRICS_ENABLED = env.bool("METRICS_ENABLED", default=False)
+
+# Seconds each process buffers its metrics before adding them to Redis
+METRICS_FLUSH_INTERVAL = env.float("METRICS_FLUSH_INTERVAL", default=1.0)
+
+# Serve book and author list and detail reads with native async views. Only
+# useful when the project runs under ASGI (see api/async_views.py).
+ASYNC_READS = env.bool("ASYNC_READS", default=False)
+
 TEMPLATES = [
     {
         "BACKEND": "django.template.backends.django.DjangoTemplates",
@@ -89,6 +102,10 @@ WSGI_APPLICATION = "library_management.wsgi.application"
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Seconds a connection is kept open between requests; 0 closes it at the
+# end of each request, "none" keeps it open with no limit
+conn_max_age = env.str("DB_CONN_MAX_AGE", default="0")
+
 DATABASES = {
     "default": {
         "ENGINE": env("DB_ENGINE", default="django.db.backends.sqlite3"),
@@ -97,29 +114,157 @@ DATABASES = {
         "PASSWORD": env("DB_PASSWORD", default=""),
         "HOST": env("DB_HOST", default=""),
         "PORT": env("DB_PORT", default=""),
+        "CONN_MAX_AGE": None if conn_max_age.lower() == "none" else int(conn_max_age),
+        # Check persistent connections before reusing them for a new request
+        "CONN_HEALTH_CHECKS": env.bool("DB_CONN_HEALTH_CHECKS", default=False),
+        "OPTIONS": {},
     }
 }
 
+# Connection pool of the psycopg backend (requires ``psycopg[pool]``). It
+# replaces persistent connections, so DB_CONN_MAX_AGE must stay at 0.
+if env.bool("DB_POOL", default=False):
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": env.int("DB_POOL_MIN_SIZE", default=2),
+        "max_size": env.int("DB_POOL_MAX_SIZE", default=10),
+        # Seconds a request waits for a free connection
+        "timeout": env.float("DB_POOL_TIMEOUT", default=10),
+    }
+
+# Read replicas, one per host (or per database name, e.g. SQLite files).
+# Reads of the list and detail endpoints are spread over them; see
+# api/replicas.py.
+DB_REPLICA_HOSTS = env.list("DB_REPLICA_HOSTS", default=[])
+DB_REPLICA_NAMES = env.list("DB_REPLICA_NAMES", default=[])
+
+
+def replica_setting(values, index, default):
+    # A shorter list repeats its last value for the remaining replicas.
+    return values[min(index, len(values) - 1)] if values else default
+
+
+DATABASE_REPLICAS = []
+for index in range(max(len(DB_REPLICA_HOSTS), len(DB_REPLICA_NAMES))):
+    primary = DATABASES["default"]
+    alias = f"replica_{index + 1}"
+    DATABASES[alias] = {
+        **primary,
+        "NAME": replica_setting(DB_REPLICA_NAMES, index, primary["NAME"]),
+        "HOST": replica_setting(DB_REPLICA_HOSTS, index, primary["HOST"]),
+        "USER": env("DB_REPLICA_USER", default=primary["USER"]),
+        "PASSWORD": env("DB_REPLICA_PASSWORD", default=primary["PASSWORD"]),
+        "PORT": env("DB_REPLICA_PORT", default=primary["PORT"]),
+        "TEST": {"MIRROR": "default"},
+    }
+    DATABASE_REPLICAS.append(alias)
+
+DATABASE_ROUTERS = ["api.replicas.ReplicaRouter"]
+
+# Seconds the reads of a client stay on the primary after it writes
+DB_REPLICA_STICKY_SECONDS = env.int("DB_REPLICA_STICKY_SECONDS", default=5)
+
+# Seconds an unreachable replica is left out of the rotation
+DB_REPLICA_RETRY_SECONDS = env.int("DB_REPLICA_RETRY_SECONDS", default=30)
+
 # CACHES
 
 REDIS_HOST = os.getenv("REDIS_HOST", "127.0.0.1")
 REDIS_PORT = os.getenv("REDIS_PORT", "6379")
 REDIS_DB = os.getenv("REDIS_DB", "1")
 
+# The test suite uses its own Redis database and key prefix, so that
+# clearing the cache between tests leaves development data alone
+TESTING = sys.argv[1:2] == ["test"]
+if TESTING:
+    REDIS_DB = os.getenv("REDIS_TEST_DB", "15")
+
+# Connection pool of each process, and timeouts in seconds
+REDIS_MAX_CONNECTIONS = env.int("REDIS_MAX_CONNECTIONS", default=100)
+REDIS_SOCKET_CONNECT_TIMEOUT = env.float("REDIS_SOCKET_CONNECT_TIMEOUT", default=5)
+REDIS_SOCKET_TIMEOUT = env.float("REDIS_SOCKET_TIMEOUT", default=5)
+# Ping connections that were idle for this many seconds before reusing them
+# (0 disables)
+REDIS_HEALTH_CHECK_INTERVAL = env.int("REDIS_HEALTH_CHECK_INTERVAL", default=30)
+# Retry a command once on a fresh connection when it times out
+REDIS_RETRY_ON_TIMEOUT = env.bool("REDIS_RETRY_ON_TIMEOUT", default=False)
+
 CACHES = {
     "default": {
         "BACKEND": "django_redis.cache.RedisCache",
         "LOCATION": f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DB}",
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-            "CONNECTION_POOL_KWARGS": {"max_connections": 100},
-            "SOCKET_CONNECT_TIMEOUT": 5,  # seconds
-            "SOCKET_TIMEOUT": 5,  # seconds
+            "CONNECTION_POOL_KWARGS": {
+                "max_connections": REDIS_MAX_CONNECTIONS,
+                "health_check_interval": REDIS_HEALTH_CHECK_INTERVAL,
+                "retry_on_timeout": REDIS_RETRY_ON_TIMEOUT,
+            },
+            "SOCKET_CONNECT_TIMEOUT": REDIS_SOCKET_CONNECT_TIMEOUT,
+            "SOCKET_TIMEOUT": REDIS_SOCKET_TIMEOUT,
         },
+        "KEY_PREFIX": "test" if TESTING else "",
+        # Bump when the format of cached values changes
+        "VERSION": 2,
     }
 }
 
-CACHE_TIMEOUT = env("CACHE_TIMEOUT", default=60 * 15)  # 15 minutes
+CACHE_TIMEOUT = env.int("CACHE_TIMEOUT", default=60 * 15)  # 15 minutes
+CACHE_NEGATIVE_TIMEOUT = env.int("CACHE_NEGATIVE_TIMEOUT", default=30)  # seconds
+CACHE_STALE_GRACE = env.int("CACHE_STALE_GRACE", default=30)  # seconds
+CACHE_LOCK_TIMEOUT = env.int("CACHE_LOCK_TIMEOUT", default=10)  # seconds
+CACHE_EARLY_REFRESH_BETA = env.float("CACHE_EARLY_REFRESH_BETA", default=0.0)
+CACHE_COMPRESS_MIN_SIZE = env.int("CACHE_COMPRESS_MIN_SIZE", default=4096)  # bytes
+
+# Optional per-process LRU in front of Redis, kept coherent via pub/sub
+CACHE_L1_ENABLED = env.bool("CACHE_L1_ENABLED", default=False)
+CACHE_L1_MAX_ENTRIES = env.int("CACHE_L1_MAX_ENTRIES", default=1024)
+CACHE_L1_TIMEOUT = env.int("CACHE_L1_TIMEOUT", default=5)  # seconds
+CACHE_INVALIDATION_CHANNEL = env(
+    "CACHE_INVALIDATION_CHANNEL", default="api:cache:invalidate"
+)
+
+# Hit counts of cacheable reads, and the warm_cache command that uses them
+CACHE_HIT_TRACKING = env.bool("CACHE_HIT_TRACKING", default=False)
+CACHE_HIT_FLUSH_INTERVAL = env.float("CACHE_HIT_FLUSH_INTERVAL", default=5.0)
+CACHE_HIT_MAX_KEYS = env.int("CACHE_HIT_MAX_KEYS", default=10000)
+CACHE_WARM_TOP_K = env.int("CACHE_WARM_TOP_K", default=100)
+CACHE_WARM_AHEAD = env.int("CACHE_WARM_AHEAD", default=120)  # seconds
+
+
+# REST FRAMEWORK
+
+REST_FRAMEWORK = {
+    "DEFAULT_PAGINATION_CLASS": "api.pagination.KeysetPagination",
+    "PAGE_SIZE": env.int("PAGE_SIZE", default=50),
+}
+
+MAX_PAGE_SIZE = env.int("MAX_PAGE_SIZE", default=500)
+
+# Version of new author and book ids: 4 (random) or 7 (time-ordered)
+ID_VERSION = env.int("ID_VERSION", default=4)
+
+# Changes are served once this old; write transactions that take longer can
+# commit changes behind clients' cursors. See api/changes.py
+CHANGE_LOG_SETTLE_SECONDS = env.float("CHANGE_LOG_SETTLE_SECONDS", default=30.0)
+
+# Deepest page of search results that can be requested, which bounds the
+# OFFSET of search queries
+SEARCH_MAX_PAGE = env.int("SEARCH_MAX_PAGE", default=100)
+
+# Dotted path of the full-text search backend. By default it is chosen from
+# the database engine: SQLite FTS5 or PostgreSQL tsvector.
+SEARCH_BACKEND = env("SEARCH_BACKEND", default=None)
+
+# Maximum number of items accepted by the bulk endpoints in one request
+BULK_MAX_ITEMS = env.int("BULK_MAX_ITEMS", default=1000)
+
+# Number of rows fetched from the database and written out at a time by
+# the streaming export
+EXPORT_CHUNK_SIZE = env.int("EXPORT_CHUNK_SIZE", default=2000)
+
+# Seconds the X-Export-Timestamp watermark is set back by, so that writes
+# still in flight when an export starts are picked up by the next one
+EXPORT_SETTLE_SECONDS = env.float("EXPORT_SETTLE_SECONDS", default=60.0)
 
 
 # Password validation